@@ -1,6 +1,8 @@
 from user import User
 
 class Admin(User):
+    __slots__ = ("__admin_id",)
+
     def __init__(self, name, email, password):
         super().__init__(name, email, password)
         self.__admin_id = "ADM-" + self.get_user_id()[:8]  # Custom ID for UI clarity
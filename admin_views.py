@@ -3,31 +3,52 @@ import tkinter as tk
 from tkinter import messagebox
 
 # Import shared function to reset screen
-from shared_gui_utils import clear_screen
+from shared_gui_utils import clear_screen, logout
+from money import format_aed
 
 # ----------------------------------------
 # ADMIN DASHBOARD MENU
 # ----------------------------------------
-def show_admin_menu(admin, root, tm, dm):
+def show_admin_menu(admin, root, svc):
     clear_screen(root)
     tk.Label(root, text=f"Admin Panel – {admin.get_name()}", font=("Arial", 14)).pack(pady=10)
 
     # Admin options: view sales or manage discounts
-    tk.Button(root, text="View Sales", command=lambda: view_sales(root, tm)).pack(pady=5)
-    tk.Button(root, text="Manage Discounts", command=lambda: manage_discounts(admin, root, tm, dm)).pack(pady=5)
-    tk.Button(root, text="Logout", command=lambda: root.quit()).pack(pady=20)
+    tk.Button(root, text="View Sales", command=lambda: view_sales(root, svc)).pack(pady=5)
+    tk.Button(root, text="Manage Discounts", command=lambda: manage_discounts(admin, root, svc)).pack(pady=5)
+    tk.Button(root, text="Logout", command=lambda: logout(root, svc)).pack(pady=20)
 
 # ----------------------------------------
 # VIEW SALES REPORT
 # ----------------------------------------
-def view_sales(root, tm):
+def view_sales(root, svc):
+    # The report is built on the background writer (it reads storage) and shown
+    # from its callback on the Tk thread; repeated clicks collapse into one
+    svc.get_writer().submit(
+        "sales-report",
+        svc.sales_report,
+        on_done=show_sales_report,
+        on_error=lambda e: messagebox.showerror("Error", f"Unable to load sales report: {str(e)}"))
+
+def show_sales_report(report):
     try:
-        sales = tm.get_sales_report()
+        sales = report["daily_tickets"]
         if not sales:
             raise ValueError("No sales data available.")
 
         # Format each sales entry into a readable string
         formatted = "\n".join([f"{k}: {v} tickets" for k, v in sales.items()])
+
+        # Revenue from the analytics aggregates (no order scan)
+        months = report["monthly"]
+        if months:
+            formatted += "\n\nRevenue by month:\n" + "\n".join(
+                f"{m}: {t['count']} tickets, net {format_aed(t['net_fils'])}, "
+                f"discounts {format_aed(t['discount_fils'])}" for m, t in months.items())
+            for by, title in (("ticket_type", "ticket type"), ("payment_method", "payment method")):
+                formatted += f"\n\nBy {title}:\n" + "\n".join(
+                    f"{name}: {t['count']} tickets, net {format_aed(t['net_fils'])}"
+                    for name, t in report["by_" + by].items())
         messagebox.showinfo("Sales Report", formatted)
 
     except ValueError as ve:
@@ -38,41 +59,47 @@ def view_sales(root, tm):
 # ----------------------------------------
 # DISCOUNT MANAGEMENT INTERFACE
 # ----------------------------------------
-def manage_discounts(admin, root, tm, dm):
+def manage_discounts(admin, root, svc):
     try:
         clear_screen(root)
         tk.Label(root, text="Manage Discounts", font=("Arial", 14)).pack(pady=10)
 
         # Combine active and inactive discounts for display
-        discounts = tm.get_active_discounts() + [d for d in tm._TicketManager__discounts if not d.is_active()]
+        all_discounts = svc.get_discounts()
+        discounts = [d for d in all_discounts if d.is_active()] + [d for d in all_discounts if not d.is_active()]
 
         # Display each discount with a toggle button
         for discount in discounts:
             frame = tk.Frame(root)
             frame.pack(pady=5, padx=10, fill="x")
 
-            status = "Active" if discount.is_active() else "Inactive"
+            # Active / Inactive (the toggle) or Scheduled / Expired / Used up (its window and cap)
+            status = discount.get_status()
             text = f"{discount.get_name()} ({discount.get_percentage()}% off for {discount.get_ticket_type()}) – {status}"
+            if discount.get_ends_at():
+                text += f", ends {discount.get_ends_at():%Y-%m-%d %H:%M}"
             tk.Label(frame, text=text).pack(side="left")
 
             # Button to activate/deactivate the discount
             def toggle(d=discount):
-                try:
-                    if d.is_active():
-                        d.deactivate()
-                    else:
-                        d.activate()
-                    messagebox.showinfo("Updated", f"{d.get_name()} is now {'Active' if d.is_active() else 'Inactive'}")
+                def toggled(updated):
+                    messagebox.showinfo("Updated", f"{updated.get_name()} is now {'Active' if updated.is_active() else 'Inactive'}")
 
                     # Refresh screen
-                    manage_discounts(root, tm)
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to toggle discount: {str(e)}")
+                    manage_discounts(admin, root, svc)
+
+                # Saved on the background writer; quick repeated toggles collapse into one save
+                active = not d.is_active()
+                svc.get_writer().submit(
+                    ("discount", d.get_name()),
+                    lambda: svc.set_discount_active(d.get_name(), active),
+                    on_done=toggled,
+                    on_error=lambda e: messagebox.showerror("Error", f"Failed to toggle discount: {str(e)}"))
 
             tk.Button(frame, text="Toggle", command=toggle).pack(side="right")
 
         # Back to admin menu
-        tk.Button(root, text="Back", command=lambda: show_admin_menu(admin, root, tm, dm)).pack(pady=20)
+        tk.Button(root, text="Back", command=lambda: show_admin_menu(admin, root, svc)).pack(pady=20)
 
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load discounts: {str(e)}")
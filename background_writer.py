@@ -0,0 +1,109 @@
+# background_writer.py
+# Runs slow work (saving to disk) on one background thread so Tkinter button
+# handlers return immediately. Completion callbacks are handed back to the
+# GUI thread through run_callbacks(), which the window polls with root.after.
+
+import threading
+from collections import OrderedDict
+
+
+class BackgroundWriter:
+    """
+    FIFO queue of jobs run one at a time on a writer thread. A job submitted
+    with a key replaces any job with the same key that has not started yet
+    (keeping its place in the queue), so a burst of saves of the same record
+    collapses into one write. Jobs with key=None always run.
+    """
+
+    def __init__(self):
+        self.__jobs = OrderedDict()  # key -> (job, on_done, on_error), oldest first
+        self.__next_anonymous = 0
+        self.__callbacks = []  # finished callbacks waiting for the GUI thread
+        self.__running = False  # a job is executing right now
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__submitted = 0
+        self.__completed = 0
+        self.__errors = []  # failures of jobs submitted without on_error
+
+    # ---------- Submitting ----------
+    def submit(self, key, job, on_done=None, on_error=None):
+        # on_done(result) / on_error(exception) run later, inside run_callbacks()
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("Writer is closed.")
+            if key is None:
+                key = ("__anonymous__", self.__next_anonymous)
+                self.__next_anonymous += 1
+            self.__jobs[key] = (job, on_done, on_error)  # same key: replaced in place
+            self.__submitted += 1
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="background-writer", daemon=True)
+                self.__thread.start()
+            self.__condition.notify_all()
+
+    def get_pending(self):
+        with self.__condition:
+            return len(self.__jobs) + (1 if self.__running else 0)
+
+    def get_coalesced(self):
+        # Submissions that were replaced by a newer one before they ran
+        with self.__condition:
+            return self.__submitted - self.__completed - len(self.__jobs) - (1 if self.__running else 0)
+
+    def get_errors(self):
+        with self.__condition:
+            return list(self.__errors)
+
+    # ---------- Waiting ----------
+    def flush(self, timeout=None):
+        # Blocks until every submitted job has run; False if the timeout expired
+        with self.__condition:
+            return self.__condition.wait_for(lambda: not self.__jobs and not self.__running, timeout)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    # ---------- Callbacks (GUI thread) ----------
+    def run_callbacks(self):
+        with self.__condition:
+            callbacks, self.__callbacks = self.__callbacks, []
+        for callback, arg in callbacks:
+            callback(arg)
+        return len(callbacks)
+
+    # ---------- Writer thread ----------
+    def __run(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__jobs or self.__closed)
+                if not self.__jobs:
+                    return  # closed and drained
+                _, (job, on_done, on_error) = self.__jobs.popitem(last=False)
+                self.__running = True
+            failed = False
+            try:
+                result = job()
+            except Exception as e:
+                result, failed = e, True
+            callback = on_error if failed else on_done
+            with self.__condition:
+                if callback is not None:
+                    self.__callbacks.append((callback, result))
+                elif failed:
+                    self.__errors.append(result)
+                self.__running = False
+                self.__completed += 1
+                self.__condition.notify_all()
+
+
+def poll_callbacks(root, writer, interval_ms=50):
+    # Deliver finished jobs' callbacks on the Tk thread for as long as the window lives
+    writer.run_callbacks()
+    root.after(interval_ms, poll_callbacks, root, writer, interval_ms)
@@ -0,0 +1,168 @@
+# checkout.py
+# Purchase flow on top of Inventory: reserve -> price -> commit -> persist.
+
+import uuid
+
+from money import from_fils
+from purchase_order import PurchaseOrder
+
+
+class CheckoutService:
+    """
+    Sells tickets without overselling. Capacity is taken in the Inventory
+    transaction before anything is written, and given back if saving the
+    order fails, so a sale is either fully recorded or not at all. Ticket
+    types with assigned seating also hold their seats under the same hold id.
+    Only registered ticket types are sold: a group size that only the pricing
+    rules cover has no capacity or seats behind it, so it is quote-only.
+    """
+
+    def __init__(self, tm, dm):
+        self.__tm = tm
+        self.__dm = dm
+
+    def __inventory(self):
+        return self.__tm.get_inventory()
+
+    def __seats_for(self, ticket_name):
+        # SeatMap if this ticket type has assigned seating, else None
+        seat_map = self.__tm.get_seat_map()
+        if seat_map and seat_map.get_assignment(ticket_name):
+            return seat_map
+        return None
+
+    def __ticket_for_sale(self, ticket_name):
+        ticket = self.__tm.get_ticket_by_name(ticket_name)
+        if ticket is None:
+            raise ValueError("Invalid ticket selected.")
+        if not self.__tm.is_registered(ticket_name):
+            raise ValueError(f"{ticket_name} can be quoted but is not on sale.")
+        return ticket
+
+    # ---------- Two-step flow (hold while the customer confirms) ----------
+    def reserve(self, ticket_name, quantity=1):
+        self.__ticket_for_sale(ticket_name)
+        inventory = self.__inventory()
+        hold_id = inventory.reserve(ticket_name, quantity) if inventory else None
+        seat_map = self.__seats_for(ticket_name)
+        if seat_map:
+            hold_id = hold_id or str(uuid.uuid4())
+            try:
+                seat_map.hold(hold_id, ticket_name, quantity)
+            except Exception:
+                if inventory:
+                    inventory.release(hold_id)
+                raise
+        return hold_id
+
+    def release(self, hold_id):
+        inventory = self.__inventory()
+        if inventory and hold_id:
+            inventory.release(hold_id)
+        seat_map = self.__tm.get_seat_map()
+        if seat_map and hold_id:
+            seat_map.release(hold_id)
+
+    def commit(self, hold_id, customer, ticket_name, payment_method, quantity=1):
+        ticket = self.__ticket_for_sale(ticket_name)
+        inventory = self.__inventory()
+        seat_map = self.__seats_for(ticket_name)
+        if seat_map and not (hold_id and seat_map.is_held(hold_id)):
+            raise ValueError("Seat reservation expired. Please try again.")
+        if inventory and hold_id:
+            inventory.commit(hold_id)
+        seats = None
+        discount = None
+        order = None
+        user_saved = False
+        try:
+            if seat_map:
+                seats = seat_map.commit(hold_id)
+            # Priced at the moment of sale, within the discount's usage caps
+            discount = self.__claim_discount(ticket_name, customer, quantity)
+            list_fils = self.__tm.get_list_price_fils(ticket)  # demand-based when a pricing engine is set
+            unit_fils = discount.apply_discount_fils(list_fils) if discount else list_fils
+            order = PurchaseOrder(customer.get_user_id(), [ticket] * quantity,
+                                  from_fils(unit_fils * quantity), payment_method, seat_ids=seats,
+                                  list_prices_fils=[list_fils] * quantity)
+            self.__dm.upsert_order(order)
+            customer.add_purchase(order)
+            self.__dm.upsert_user(customer)
+            user_saved = True
+        except Exception:
+            if order is not None and not self.__unstore(customer, order, user_saved):
+                raise  # the order may still be stored, so its tickets stay sold
+            if discount is not None:
+                self.__release_discount(discount, customer, quantity)
+            if inventory and hold_id:
+                inventory.return_units(ticket_name, quantity)
+            if seats:
+                seat_map.release_seats([seat for block in seats for seat in block])
+            raise
+        self.__tm.record_order(order)
+        self.__tm.record_sale(quantity)
+        self.__tm.record_price_change(ticket)
+        return order
+
+    def __unstore(self, customer, order, user_saved):
+        # Undoes a failed sale's writes; True once no stored copy of the order is left
+        try:
+            self.__dm.remove_order(order.get_order_id())
+            customer.delete_purchase(order.get_order_id())
+            if user_saved:
+                self.__dm.upsert_user(customer)  # user records may embed the history
+        except Exception:
+            return False
+        return True
+
+    def __claim_discount(self, ticket_name, customer, quantity):
+        # Best discount for this sale. A capped one is claimed in storage first,
+        # so processes sharing it can't both take its last uses; if it is full
+        # there, its counts are now the stored ones and the next best is tried.
+        customer_id = customer.get_user_id()
+        while True:
+            discount = self.__tm.find_discount_for_ticket(ticket_name, customer_id=customer_id, quantity=quantity)
+            if discount is None or not discount.is_limited():
+                if discount is not None:
+                    discount.record_use(customer_id, quantity)
+                return discount
+            if self.__dm.claim_discount_use(discount, customer_id, quantity):
+                return discount
+
+    def __release_discount(self, discount, customer, quantity):
+        if not discount.is_limited():
+            discount.record_use(customer.get_user_id(), -quantity)
+            return
+        try:
+            self.__dm.release_discount_use(discount, customer.get_user_id(), quantity)
+        except Exception:
+            pass  # the uses stay taken: the cap errs on the safe side
+
+    # ---------- One-step purchase ----------
+    def purchase(self, customer, ticket_name, payment_method, quantity=1):
+        hold_id = self.reserve(ticket_name, quantity)
+        try:
+            return self.commit(hold_id, customer, ticket_name, payment_method, quantity)
+        except Exception:
+            self.release(hold_id)  # no-op if the hold was already committed
+            raise
+
+    # ---------- Cancellation ----------
+    def cancel_order(self, customer, order):
+        # Deletes the order and puts its tickets (and seats) back on sale
+        self.__dm.remove_order(order.get_order_id())
+        customer.delete_purchase(order.get_order_id())
+        self.__dm.upsert_user(customer)
+        self.__tm.remove_order(order)
+        inventory = self.__inventory()
+        if inventory:
+            for line in order.get_tickets():
+                inventory.return_units(line.get_name(), 1)
+            for name in {line.get_name() for line in order.get_tickets()}:
+                ticket = self.__tm.get_ticket_by_name(name)
+                if ticket is not None:
+                    self.__tm.record_price_change(ticket)
+        seat_map = self.__tm.get_seat_map()
+        seats = order.get_seat_ids()
+        if seat_map and seats:
+            seat_map.release_seats(seats)
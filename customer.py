@@ -1,28 +1,63 @@
 from user import User
 
 class Customer(User):
+    __slots__ = ("__purchase_history", "__history_source")
+
     def __init__(self, name, email, password):
         super().__init__(name, email, password)
         self.__purchase_history = []  # list of PurchaseOrder objects
+        self.__history_source = None  # HistoryCache once orders are stored separately
+
+    # Orders live in the orders collection and are loaded on first access
+    # (see history_cache.py); unattached customers keep their own list
+    def set_history_source(self, source):
+        embedded = self.__purchase_history
+        self.__history_source = source
+        self.__purchase_history = []
+        return embedded  # orders that were pickled inside this user, for migration
+
+    def get_history_source(self):
+        return self.__history_source
 
     # Get purchase history
     def get_purchase_history(self):
+        if self.__history_source is not None:
+            return self.__history_source.get(self.get_user_id())
         return self.__purchase_history
 
     # Add a purchase
     def add_purchase(self, purchase_order):
-        self.__purchase_history.append(purchase_order)
+        if self.__history_source is not None:
+            self.__history_source.add_order(self.get_user_id(), purchase_order)
+        else:
+            self.__purchase_history.append(purchase_order)
 
     # Delete a purchase by ID
     def delete_purchase(self, purchase_id):
+        if self.__history_source is not None:
+            self.__history_source.remove_order(self.get_user_id(), purchase_id)
+            return
         self.__purchase_history = [
             p for p in self.__purchase_history if p.get_order_id() != purchase_id
         ]
 
     # Display all purchases
     def display_purchases(self):
-        if not self.__purchase_history:
+        history = self.get_purchase_history()
+        if not history:
             print("No purchases found.")
         else:
-            for purchase in self.__purchase_history:
+            for purchase in history:
                 print(purchase)
+
+    # The history source is runtime wiring; attached customers store no orders
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop("_Customer__history_source", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.__history_source = None
+        if not hasattr(self, "_Customer__purchase_history"):
+            self.__purchase_history = []
@@ -2,14 +2,14 @@
 # Handles all customer-facing GUI: main menu, profile editing, ticket purchase, and purchase history (view/edit/delete)
 
 import tkinter as tk
-from tkinter import messagebox
-from purchase_order import PurchaseOrder
-from shared_gui_utils import clear_screen
+from tkinter import messagebox, ttk
+from money import format_aed
+from shared_gui_utils import clear_screen, logout
 
 # ----------------------------------------
 # CUSTOMER MAIN MENU
 # ----------------------------------------
-def show_customer_menu(customer, root, tm, dm):
+def show_customer_menu(customer, root, svc):
     clear_screen(root)
     tk.Label(root, text=f"Welcome, {customer.get_name()}", font=("Arial", 14)).pack(pady=10)
 
@@ -17,26 +17,26 @@ def show_customer_menu(customer, root, tm, dm):
     tk.Button(
         root,
         text="Edit Profile",
-        command=lambda: show_edit_profile(customer, root, tm, dm)
+        command=lambda: show_edit_profile(customer, root, svc)
     ).pack(pady=5)
 
     tk.Button(
         root,
         text="View Purchases",
-        command=lambda: view_purchases(customer, root, tm, dm)
+        command=lambda: view_purchases(customer, root, svc)
     ).pack(pady=5)
     tk.Button(
         root,
         text="Buy Tickets",
-        command=lambda: buy_ticket(customer, root, tm, dm)
+        command=lambda: buy_ticket(customer, root, svc)
     ).pack(pady=5)
-    tk.Button(root, text="Logout", command=lambda: root.quit()).pack(pady=20)
+    tk.Button(root, text="Logout", command=lambda: logout(root, svc)).pack(pady=20)
 
 
 # ----------------------------------------
 # PROFILE EDITING
 # ----------------------------------------
-def show_edit_profile(customer, root, tm, dm):
+def show_edit_profile(customer, root, svc):
     clear_screen(root)
     tk.Label(root, text="Edit Profile", font=("Arial", 14)).pack(pady=10)
 
@@ -60,147 +60,220 @@ def show_edit_profile(customer, root, tm, dm):
         new_email = email_entry.get().strip()
         new_pass = pass_entry.get()
 
-        if not new_name or not new_email:
-            messagebox.showerror("Error", "Name and email cannot be empty.")
-            return
-
-        try:
-            customer.set_name(new_name)
-            customer.set_email(new_email)
-            if new_pass:
-                customer.set_password(new_pass)
-            dm.save_users([customer])
+        def saved(_):
             messagebox.showinfo("Success", "Profile updated.")
-            show_customer_menu(customer, root, tm, dm)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to update profile: {e}")
+            show_customer_menu(customer, root, svc)
+
+        # Saved on the background writer; repeated saves of this profile collapse into one.
+        # Raises ValueError for empty fields or an email another account uses
+        svc.get_writer().submit(
+            ("user", customer.get_user_id()),
+            lambda: svc.update_profile(customer, new_name, new_email, new_pass),
+            on_done=saved,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to update profile: {e}"))
 
     tk.Button(root, text="Save", command=save_profile).pack(pady=10)
-    tk.Button(root, text="Cancel", command=lambda: show_customer_menu(customer, root, tm, dm)).pack(pady=5)
+    tk.Button(root, text="Cancel", command=lambda: show_customer_menu(customer, root, svc)).pack(pady=5)
 
 
 # ----------------------------------------
 # TICKET PURCHASING INTERFACE
 # ----------------------------------------
-def buy_ticket(customer, root, tm, dm):
+def buy_ticket(customer, root, svc):
     clear_screen(root)
     tk.Label(root, text="Buy Ticket", font=("Arial", 14)).pack(pady=10)
 
     tk.Label(root, text="Select Ticket Type").pack()
-    tickets = tm.get_available_ticket_types()
+    tickets = svc.get_ticket_types()
     ticket_var = tk.StringVar(value=tickets[0] if tickets else "")
     tk.OptionMenu(root, ticket_var, *tickets).pack()
 
     tk.Label(root, text="Payment Method").pack()
-    payment_var = tk.StringVar(value="Credit Card")
-    tk.OptionMenu(root, payment_var, "Credit Card", "Debit Card", "Apple Pay", "Google Pay").pack()
+    methods = svc.get_payment_methods()
+    payment_var = tk.StringVar(value=methods[0])
+    tk.OptionMenu(root, payment_var, *methods).pack()
 
     def confirm_purchase():
-        try:
-            name = ticket_var.get()
-            ticket = tm.get_ticket_by_name(name)
-            if ticket is None:
-                raise ValueError("Invalid ticket selected.")
-            price = tm.calculate_final_price(ticket)
-            method = payment_var.get()
-
-            order = PurchaseOrder(customer.get_user_id(), [ticket], price, method)
-            customer.add_purchase(order)
-
-            # Merge and save sales
-            prev_sales = dm.load_sales()
-            from datetime import datetime
-            today = datetime.now().strftime("%Y-%m-%d")
-            prev_sales[today] = prev_sales.get(today, 0) + 1
-            dm.save_sales(prev_sales)
-
-            dm.save_users([customer])
-            dm.save_orders(customer.get_purchase_history())
-
-            messagebox.showinfo("Success", f"Purchased {ticket.get_name()} for AED {price}")
-            show_customer_menu(customer, root, tm, dm)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        name = ticket_var.get()
+        method = payment_var.get()
+
+        def purchased(order):
+            seats = order.get_seat_ids()
+            seating = f"\nSeats: {seats[0]} to {seats[-1]}" if seats else ""
+            messagebox.showinfo("Success", f"Purchased {name} for AED {order.get_total_price()}{seating}")
+            show_customer_menu(customer, root, svc)
+
+        # Reserves capacity, prices, saves the order and counts the sale on the
+        # background writer; fails with ValueError if the ticket type is sold out
+        svc.get_writer().submit(
+            None,  # every purchase is its own order, never coalesced
+            lambda: svc.purchase(customer, name, method),
+            on_done=purchased,
+            on_error=lambda e: messagebox.showerror("Error", str(e)))
 
     tk.Button(root, text="Confirm Purchase", command=confirm_purchase).pack(pady=10)
-    tk.Button(root, text="Back", command=lambda: show_customer_menu(customer, root, tm, dm)).pack(pady=5)
+    tk.Button(root, text="Back", command=lambda: show_customer_menu(customer, root, svc)).pack(pady=5)
 
 
 # ----------------------------------------
 # VIEW, EDIT & DELETE PURCHASES
 # ----------------------------------------
-def view_purchases(customer, root, tm, dm):
+PAGE_SIZE = 50  # rows in the table at any time, however long the history is
+ALL = "All"
+
+# Table column -> sort key understood by TicketingService.get_orders_page
+_COLUMNS = (("date", "Date", 120), ("ticket_type", "Tickets", 150),
+            ("total", "Total", 90), ("payment_method", "Payment", 90))
+
+
+def view_purchases(customer, root, svc):
     clear_screen(root)
-    tk.Label(root, text="Your Purchases", font=("Arial", 14)).pack(pady=10)
-
-    purchases = customer.get_purchase_history()
-    if not purchases:
-        tk.Label(root, text="No purchases found.").pack(pady=10)
-    else:
-        for order in purchases:
-            frame = tk.Frame(root)
-            frame.pack(pady=3, padx=10, fill="x")
-
-            tk.Label(
-                frame,
-                text=str(order),
-                anchor="w",
-                justify="left"
-            ).pack(side="left", fill="x", expand=True)
-
-            # Edit button
-            tk.Button(
-                frame,
-                text="Edit",
-                command=lambda o=order: show_edit_order(o, customer, root, tm, dm)
-            ).pack(side="right", padx=(0,5))
-
-            # Delete button
-            tk.Button(
-                frame,
-                text="Delete",
-                command=lambda o=order: delete_order(o, customer, root, tm, dm)
-            ).pack(side="right")
-
-    tk.Button(root, text="Back", command=lambda: show_customer_menu(customer, root, tm, dm)).pack(pady=20)
-
-
-def delete_order(order, customer, root, tm, dm):
-    try:
-        customer.delete_purchase(order.get_order_id())
-        dm.save_users([customer])
-        dm.save_orders(customer.get_purchase_history())
+    tk.Label(root, text="Your Purchases", font=("Arial", 14)).pack(pady=5)
+
+    # Current view: page number, sort column/direction and filters
+    state = {"page": 0, "sort_by": "date", "descending": True}
+    page_orders = {}  # Treeview row id -> order, for the rows on screen only
+
+    # Filters
+    filters = tk.Frame(root)
+    filters.pack(fill="x", padx=10)
+    type_var = tk.StringVar(value=ALL)
+    method_var = tk.StringVar(value=ALL)
+    tk.Label(filters, text="Type").pack(side="left")
+    type_combo = ttk.Combobox(filters, textvariable=type_var, state="readonly", width=14,
+                              values=[ALL] + svc.get_ticket_types())
+    type_combo.pack(side="left", padx=(2, 8))
+    tk.Label(filters, text="Payment").pack(side="left")
+    method_combo = ttk.Combobox(filters, textvariable=method_var, state="readonly", width=11,
+                                values=[ALL] + svc.get_payment_methods())
+    method_combo.pack(side="left", padx=2)
+
+    # One Treeview holding a single page of rows (no widgets per order)
+    table_frame = tk.Frame(root)
+    table_frame.pack(fill="both", expand=True, padx=10, pady=5)
+    table = ttk.Treeview(table_frame, columns=[c[0] for c in _COLUMNS], show="headings",
+                         height=8, selectmode="browse")
+    scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=table.yview)
+    table.configure(yscrollcommand=scrollbar.set)
+    scrollbar.pack(side="right", fill="y")
+    table.pack(side="left", fill="both", expand=True)
+
+    def sort_by(column):
+        if state["sort_by"] == column:
+            state["descending"] = not state["descending"]
+        else:
+            state["sort_by"], state["descending"] = column, column in ("date", "total")
+        state["page"] = 0
+        load_page()
+
+    for column, heading, width in _COLUMNS:
+        table.heading(column, text=heading, command=lambda c=column: sort_by(c))
+        table.column(column, width=width, anchor="w")
+
+    # Paging controls
+    nav = tk.Frame(root)
+    nav.pack(fill="x", padx=10)
+    page_label = tk.Label(nav)
+    prev_button = tk.Button(nav, text="< Prev", command=lambda: change_page(-1))
+    next_button = tk.Button(nav, text="Next >", command=lambda: change_page(1))
+    prev_button.pack(side="left")
+    page_label.pack(side="left", expand=True)
+    next_button.pack(side="right")
+
+    def load_page():
+        ticket_type = type_var.get()
+        method = method_var.get()
+        orders, total = svc.get_orders_page(
+            customer, state["page"], PAGE_SIZE, state["sort_by"], state["descending"],
+            ticket_type=None if ticket_type == ALL else ticket_type,
+            payment_method=None if method == ALL else method)
+        table.delete(*table.get_children())
+        page_orders.clear()
+        for order in orders:
+            names = [t.get_name() for t in order.get_tickets()]
+            tickets = names[0] if len(set(names)) == 1 else ", ".join(sorted(set(names)))
+            if len(names) > 1:
+                tickets = f"{len(names)} x {tickets}"
+            row = table.insert("", "end", values=(
+                order.get_purchase_time().strftime("%Y-%m-%d %H:%M"), tickets,
+                format_aed(order.get_total_fils()), order.get_payment_method()))
+            page_orders[row] = order
+        pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+        page_label.config(text=f"Page {state['page'] + 1} of {pages} ({total} orders)")
+        prev_button.config(state="normal" if state["page"] > 0 else "disabled")
+        next_button.config(state="normal" if state["page"] + 1 < pages else "disabled")
+
+    def change_page(step):
+        state["page"] += step
+        load_page()
+
+    def apply_filters(_event=None):
+        state["page"] = 0
+        load_page()
+
+    for combo in (type_combo, method_combo):
+        combo.bind("<<ComboboxSelected>>", apply_filters)
+
+    def selected_order():
+        selection = table.selection()
+        if not selection:
+            messagebox.showwarning("No Selection", "Select an order first.")
+            return None
+        return page_orders[selection[0]]
+
+    def edit_selected():
+        order = selected_order()
+        if order is not None:
+            show_edit_order(order, customer, root, svc)
+
+    def delete_selected():
+        order = selected_order()
+        if order is not None:
+            delete_order(order, customer, root, svc)
+
+    actions = tk.Frame(root)
+    actions.pack(pady=5)
+    tk.Button(actions, text="Edit", command=edit_selected).pack(side="left", padx=5)
+    tk.Button(actions, text="Delete", command=delete_selected).pack(side="left", padx=5)
+    tk.Button(actions, text="Back", command=lambda: show_customer_menu(customer, root, svc)).pack(side="left", padx=5)
+
+    load_page()
+
+
+def delete_order(order, customer, root, svc):
+    def deleted(_):
         messagebox.showinfo("Deleted", "Order deleted.")
-        view_purchases(customer, root, tm, dm)
-    except Exception as e:
-        messagebox.showerror("Error", f"Delete failed: {e}")
+        view_purchases(customer, root, svc)
 
+    # Also frees the capacity; runs on the background writer
+    svc.get_writer().submit(
+        ("order", order.get_order_id()),
+        lambda: svc.delete_order(customer, order.get_order_id()),
+        on_done=deleted,
+        on_error=lambda e: messagebox.showerror("Error", f"Delete failed: {e}"))
 
-def show_edit_order(order, customer, root, tm, dm):
+
+def show_edit_order(order, customer, root, svc):
     clear_screen(root)
     tk.Label(root, text="Modify Order", font=("Arial", 14)).pack(pady=10)
 
     tk.Label(root, text="Payment Method").pack()
     method_var = tk.StringVar(value=order.get_payment_method())
-    tk.OptionMenu(root, method_var, "Credit Card", "Debit Card", "Apple Pay", "Google Pay").pack()
+    tk.OptionMenu(root, method_var, *svc.get_payment_methods()).pack()
 
     def save_edit():
-        try:
-            new_method = method_var.get()
-            tickets = order.get_tickets()
-            total = order.get_total_price()
-            new_order = PurchaseOrder(customer.get_user_id(), tickets, total, new_method)
-
-            customer.delete_purchase(order.get_order_id())
-            customer.add_purchase(new_order)
-
-            dm.save_users([customer])
-            dm.save_orders(customer.get_purchase_history())
+        new_method = method_var.get()
 
+        def updated(_):
             messagebox.showinfo("Success", "Order updated.")
-            view_purchases(customer, root, tm, dm)
-        except Exception as e:
-            messagebox.showerror("Error", f"Update failed: {e}")
+            view_purchases(customer, root, svc)
+
+        # Orders are finalized records, so the service replaces the order
+        svc.get_writer().submit(
+            ("order", order.get_order_id()),
+            lambda: svc.edit_order(customer, order.get_order_id(), new_method),
+            on_done=updated,
+            on_error=lambda e: messagebox.showerror("Error", f"Update failed: {e}"))
 
     tk.Button(root, text="Save Changes", command=save_edit).pack(pady=10)
-    tk.Button(root, text="Cancel", command=lambda: view_purchases(customer, root, tm, dm)).pack(pady=5)
+    tk.Button(root, text="Cancel", command=lambda: view_purchases(customer, root, svc)).pack(pady=5)
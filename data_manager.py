@@ -1,48 +1,435 @@
 import pickle
 import os
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from log_store import LogStore
+from file_lock import FileLock
+from purchase_order import page_orders
+
+BACKENDS = ("pickle", "log", "sqlite")
+_PAGE_VIEWS = 16  # sorted/filtered history views kept by the log backend
 
 class DataManager:
-    def __init__(self):
+    # backend: "pickle" rewrites whole files, "log" appends changed records only,
+    # "sqlite" keeps everything in an indexed database (db_file).
+    # Several processes may share "pickle" (file locks) or "sqlite" (transactions);
+    # "log" keeps an in-memory view and must have a single writer process.
+    # The log and sqlite backends only decode record_codec data; migrate_legacy=True
+    # converts a log or SQLite rows pickled by an older version, or imports the
+    # .pkl files into a new log, once. Only use it on trusted files.
+    def __init__(self, backend="pickle", db_file="tickets.db", migrate_legacy=False):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown storage backend: {backend}")
+        self.__backend = backend
         self.__user_file = "users.pkl"
         self.__order_file = "orders.pkl"
         self.__discount_file = "discounts.pkl"
         self.__sales_file = "sales.pkl"
+        self.__db_file = db_file
+        self.__migrate_legacy = migrate_legacy
+        self.__logs = {}  # pickle filename -> LogStore
+        self.__locks = {}  # pickle filename -> FileLock
+        self.__db = None  # SQLiteStore, opened on first use
+        self.__orders_by_customer = None  # log backend: customer_id -> [(purchase_time, order_id)], sorted
+        self.__page_views = OrderedDict()  # log backend: (customer_id, sort, filters) -> sorted order ids
+
+    def get_backend(self):
+        return self.__backend
 
     # ---------- Generic Helpers ----------
     def __load_data(self, filename):
+        if self.__backend == "log":
+            return self.__log_for(filename).values()
         if not os.path.exists(filename):
             return []
         with open(filename, "rb") as f:
             return pickle.load(f)
 
     def __save_data(self, filename, data):
-        with open(filename, "wb") as f:
-            pickle.dump(data, f)
+        if self.__backend == "log":
+            self.__log_for(filename).replace_all(self.__keyed(data))
+            return
+        # Write to a temp file and rename so a crash never leaves a half-written file
+        with self.__lock_for(filename):
+            tmp_name = filename + ".tmp"
+            with open(tmp_name, "wb") as f:
+                pickle.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, filename)
+
+    def __lock_for(self, filename):
+        lock = self.__locks.get(filename)
+        if lock is None:
+            lock = self.__locks.setdefault(filename, FileLock(filename + ".lock"))  # atomic under threads
+        return lock
+
+    def __upsert(self, filename, item):
+        if self.__backend == "log":
+            self.__log_for(filename).put(self.__key_of(item), item)
+            return
+        with self.__lock_for(filename):  # load + save must not interleave with another writer
+            data = self.__load_data(filename)
+            key = self.__key_of(item)
+            data = [d for d in data if self.__key_of(d) != key] + [item]
+            self.__save_data(filename, data)
+
+    def __remove(self, filename, key):
+        if self.__backend == "log":
+            self.__log_for(filename).delete(key)
+            return
+        with self.__lock_for(filename):
+            data = self.__load_data(filename)
+            self.__save_data(filename, [d for d in data if self.__key_of(d) != key])
+
+    def __log_for(self, filename):
+        store = self.__logs.get(filename)
+        if store is None:
+            log_name = os.path.splitext(filename)[0] + ".log"
+            seed = not os.path.exists(log_name) and os.path.exists(filename)
+            if seed and not self.__migrate_legacy:
+                # Unpickling it could run code; only an explicit migration may
+                raise ValueError(f"{filename} is a pickle file from an older version; open the "
+                                 f"store once with migrate_legacy=True to import it")
+            store = LogStore(log_name, migrate_legacy=self.__migrate_legacy)
+            if seed:
+                # First run on the log backend: import the existing pickle file
+                with open(filename, "rb") as f:
+                    store.replace_all(self.__keyed(pickle.load(f)))
+            self.__logs[filename] = store
+        return store
+
+    @staticmethod
+    def __key_of(item):
+        if hasattr(item, "get_user_id"):
+            return item.get_user_id()
+        if hasattr(item, "get_order_id"):
+            return item.get_order_id()
+        return item.get_name()  # discounts are identified by name
+
+    def __keyed(self, data):
+        if isinstance(data, dict):
+            return [(k, (k, v)) for k, v in data.items()]
+        return [(self.__key_of(item), item) for item in data]
+
+    def __sqlite(self):
+        if self.__backend != "sqlite":
+            return None
+        if self.__db is None:
+            from sqlite_store import SQLiteStore  # imported on first use; most runs never need it
+            self.__db = SQLiteStore(self.__db_file, self.__migrate_legacy)
+        return self.__db
+
+    def get_storage_files(self, collections=("users", "orders", "discounts", "sales")):
+        # Files whose size/mtime change whenever those collections change
+        # (used to tell whether a startup snapshot is still current)
+        if self.__backend == "sqlite":
+            return [self.__db_file, self.__db_file + "-wal"]
+        names = {"users": self.__user_file, "orders": self.__order_file,
+                 "discounts": self.__discount_file, "sales": self.__sales_file}
+        files = []
+        for collection in collections:
+            filename = names[collection]
+            files.append(filename)
+            if self.__backend == "log":
+                files.append(os.path.splitext(filename)[0] + ".log")
+        return files
+
+    def compact(self):
+        for store in self.__logs.values():
+            store.compact()
+
+    def close(self):
+        for store in self.__logs.values():
+            store.close()
+        self.__logs = {}
+        self.__orders_by_customer = None
+        self.__page_views.clear()
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
+
+    # Copy every collection into another DataManager (e.g. pickle -> sqlite),
+    # so the new backend can be filled while the old one keeps serving
+    def migrate_to(self, target):
+        target.save_users(self.load_users())
+        target.save_orders(self.load_orders())
+        target.save_discounts(self.load_discounts())
+        target.save_sales(self.load_sales() or {})
+
+    # Re-save every collection in place, e.g. after loading records written by an
+    # older version (float prices are converted to fils as they are unpickled).
+    # DataManager(backend, migrate_legacy=True).upgrade_records() is the one-time
+    # upgrade of pickled data for the log and sqlite backends.
+    def upgrade_records(self):
+        self.migrate_to(self)
 
     # ---------- User ----------
     def load_users(self):
+        if self.__sqlite():
+            return self.__db.load_users()
         return self.__load_data(self.__user_file)
 
     def save_users(self, users):
+        if self.__sqlite():
+            return self.__db.save_users(users)
         self.__save_data(self.__user_file, users)
 
+    def upsert_user(self, user):
+        if self.__sqlite():
+            return self.__db.upsert_user(user)
+        self.__upsert(self.__user_file, user)
+
+    def get_user_by_email(self, email):
+        if self.__sqlite():
+            return self.__db.get_user_by_email(email)
+        key = email.strip().lower()  # as UserRegistry.normalize_email and the SQLite index
+        return next((u for u in self.load_users() if u.get_email().strip().lower() == key), None)
+
+    def get_user_by_id(self, user_id):
+        if self.__sqlite():
+            return self.__db.get_user_by_id(user_id)
+        return next((u for u in self.load_users() if u.get_user_id() == user_id), None)
+
     # ---------- Orders ----------
     def load_orders(self):
+        if self.__sqlite():
+            return self.__db.load_orders()
         return self.__load_data(self.__order_file)
 
+    def iter_orders(self):
+        # Every stored order, decoded as it is reached (a pickle file is one list,
+        # so that backend still loads it whole)
+        if self.__sqlite():
+            return self.__db.iter_orders()
+        if self.__backend == "log":
+            return self.__log_for(self.__order_file).iter_values()
+        return iter(self.__load_data(self.__order_file))
+
     def save_orders(self, orders):
+        if self.__sqlite():
+            return self.__db.save_orders(orders)
         self.__save_data(self.__order_file, orders)
+        self.__orders_by_customer = None  # rebuilt on next use
+        self.__page_views.clear()
+
+    def upsert_order(self, order):
+        if self.__sqlite():
+            return self.__db.upsert_order(order)
+        self.__upsert(self.__order_file, order)
+        self.__index_orders([order])
+
+    # Batch upsert: one transaction / one append / one file rewrite for all of them
+    def upsert_orders(self, orders):
+        if self.__sqlite():
+            return self.__db.upsert_orders(orders)
+        if self.__backend == "log":
+            self.__log_for(self.__order_file).put_many(self.__keyed(orders))
+            return self.__index_orders(orders)
+        by_id = {o.get_order_id(): o for o in orders}
+        with self.__lock_for(self.__order_file):
+            kept = [o for o in self.__load_data(self.__order_file) if o.get_order_id() not in by_id]
+            self.__save_data(self.__order_file, kept + list(by_id.values()))
+
+    def remove_order(self, order_id):
+        if self.__sqlite():
+            return self.__db.remove_order(order_id)
+        if self.__backend == "log" and self.__orders_by_customer is not None:
+            order = self.__log_for(self.__order_file).get(order_id)
+            if order is not None:
+                self.__unindex_order(order)
+        self.__remove(self.__order_file, order_id)
+
+    def get_order_by_id(self, order_id):
+        if self.__sqlite():
+            return self.__db.get_order_by_id(order_id)
+        if self.__backend == "log":
+            return self.__log_for(self.__order_file).get(order_id)
+        return next((o for o in self.load_orders() if o.get_order_id() == order_id), None)
+
+    def get_orders_for_customer(self, customer_id):
+        if self.__sqlite():
+            return self.__db.get_orders_for_customer(customer_id)
+        if self.__backend == "log":
+            store = self.__log_for(self.__order_file)
+            return [store.get(order_id) for _, order_id in self.__customer_index().get(customer_id, ())]
+        orders = [o for o in self.load_orders() if o.get_customer_id() == customer_id]
+        return sorted(orders, key=lambda o: o.get_purchase_time())
+
+    # One page of a customer's orders: (orders, total matching), like page_orders.
+    # SQLite sorts, filters and pages in SQL; the log backend slices its per-customer
+    # id index for the default newest/oldest-first view, and for other views the
+    # ids sorted on the first page (until that customer's orders change), and
+    # decodes only the orders on the page.
+    def get_orders_page(self, customer_id, page=0, page_size=50, sort_by="date", descending=True,
+                        ticket_type=None, payment_method=None):
+        if self.__sqlite():
+            return self.__db.get_orders_page(customer_id, page, page_size, sort_by, descending,
+                                             ticket_type, payment_method)
+        if self.__backend != "log":
+            return page_orders(self.get_orders_for_customer(customer_id), page, page_size, sort_by,
+                               descending, ticket_type, payment_method)
+        store = self.__log_for(self.__order_file)
+        if sort_by == "date" and ticket_type is None and payment_method is None:
+            entries, total = page_orders(self.__customer_index().get(customer_id, []), page, page_size,
+                                         descending=descending)
+            return [store.get(order_id) for _, order_id in entries], total
+        # Other views sort the whole history once; later pages slice the cached ids
+        view = (customer_id, sort_by, descending, ticket_type, payment_method)
+        ids = self.__page_views.get(view)
+        if ids is None:
+            orders = self.get_orders_for_customer(customer_id)
+            matching, _ = page_orders(orders, 0, max(len(orders), 1), sort_by, descending,
+                                      ticket_type, payment_method)
+            ids = self.__page_views[view] = [o.get_order_id() for o in matching]
+            if len(self.__page_views) > _PAGE_VIEWS:
+                self.__page_views.popitem(last=False)
+        else:
+            self.__page_views.move_to_end(view)
+        start = page * page_size
+        return [store.get(order_id) for order_id in ids[start:start + page_size]], len(ids)
+
+    def __customer_index(self):
+        # One pass over the orders log, then kept up to date by the writes above
+        if self.__orders_by_customer is None:
+            index = {}
+            for order in self.__log_for(self.__order_file).values():
+                index.setdefault(order.get_customer_id(), []).append(
+                    (order.get_purchase_time(), order.get_order_id()))
+            for entries in index.values():
+                entries.sort()
+            self.__orders_by_customer = index
+        return self.__orders_by_customer
+
+    def __index_orders(self, orders):
+        if self.__backend != "log" or self.__orders_by_customer is None:
+            return
+        for order in orders:
+            self.__drop_page_views(order.get_customer_id())
+            entries = self.__orders_by_customer.setdefault(order.get_customer_id(), [])
+            entry = (order.get_purchase_time(), order.get_order_id())
+            i = bisect_left(entries, entry)
+            if i == len(entries) or entries[i] != entry:  # re-saving an order keeps one entry
+                entries.insert(i, entry)
+
+    def __unindex_order(self, order):
+        self.__drop_page_views(order.get_customer_id())
+        entries = self.__orders_by_customer.get(order.get_customer_id(), [])
+        entry = (order.get_purchase_time(), order.get_order_id())
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def __drop_page_views(self, customer_id):
+        for view in [v for v in self.__page_views if v[0] == customer_id]:
+            del self.__page_views[view]
 
     # ---------- Discounts ----------
     def load_discounts(self):
+        if self.__sqlite():
+            return self.__db.load_discounts()
         return self.__load_data(self.__discount_file)
 
     def save_discounts(self, discounts):
+        if self.__sqlite():
+            return self.__db.save_discounts(discounts)
         self.__save_data(self.__discount_file, discounts)
 
+    def claim_discount_use(self, discount, customer_id, quantity=1):
+        # Takes quantity uses of a capped discount in storage, all or nothing, so
+        # processes sharing the storage enforce one cap. The discount's counts
+        # are updated to the stored ones; False if a cap was full.
+        if not self.__sqlite():
+            return self.__change_stored_uses(discount, customer_id, quantity)
+        caps, seeds = {"": discount.get_max_uses()}, {"": discount.get_uses()}
+        if discount.get_per_customer_limit() is not None:
+            caps[customer_id] = discount.get_per_customer_limit()
+            seeds[customer_id] = discount.get_customer_uses(customer_id)
+        claimed, counts = self.__db.claim_discount_use(discount.get_name(), quantity, caps, seeds)
+        discount.set_uses(counts.pop(""), counts)
+        return claimed
+
+    def release_discount_use(self, discount, customer_id, quantity=1):
+        # Gives back the uses claimed for a sale that then failed
+        if not self.__sqlite():
+            self.__change_stored_uses(discount, customer_id, -quantity)
+            return
+        keys = [""] + ([customer_id] if discount.get_per_customer_limit() is not None else [])
+        counts = self.__db.release_discount_use(discount.get_name(), quantity, keys)
+        discount.set_uses(counts.pop(""), counts)
+
+    def __change_stored_uses(self, discount, customer_id, quantity):
+        # pickle / log: read-modify-write of the stored discount (under its file lock for pickle)
+        lock = self.__lock_for(self.__discount_file) if self.__backend == "pickle" else nullcontext()
+        with lock:
+            discounts = self.load_discounts()
+            stored = next((d for d in discounts if d.get_name() == discount.get_name()), None)
+            if stored is None:  # never saved yet: this copy becomes the stored one
+                stored = discount
+                discounts.append(stored)
+            if quantity > 0 and not stored.has_uses_left(customer_id, quantity):
+                claimed = False
+            else:
+                stored.record_use(customer_id, quantity)  # a negative quantity gives uses back
+                self.__save_data(self.__discount_file, discounts)
+                claimed = True
+        if stored is not discount:
+            discount.set_uses(stored.get_uses(), {customer_id: stored.get_customer_uses(customer_id)})
+        return claimed
+
     # ---------- Sales Log ----------
     def load_sales(self):
-        return self.__load_data(self.__sales_file)
+        if self.__sqlite():
+            return self.__db.load_sales()
+        if self.__backend == "log":
+            return dict(self.__load_data(self.__sales_file))
+        return self.__load_data(self.__sales_file) or {}  # empty dict, not list, when no file yet
 
     def save_sales(self, sales):
+        if self.__sqlite():
+            return self.__db.save_sales(sales)
         self.__save_data(self.__sales_file, sales)
+
+    def add_sales(self, deltas):
+        # Adds {day: tickets} to the stored counts. On sqlite each day is one
+        # upsert, so processes sharing the database never overwrite each other.
+        if self.__sqlite():
+            return self.__db.add_sales(deltas)
+        self.__merge_sales(deltas, lambda stored, tickets: stored + tickets)
+
+    def raise_sales(self, counts):
+        # Raises each stored day to at least counts[day]; never lowers one
+        if self.__sqlite():
+            return self.__db.raise_sales(counts)
+        self.__merge_sales(counts, max)
+
+    def __merge_sales(self, changes, combine):
+        if self.__backend == "log":
+            store = self.__log_for(self.__sales_file)
+            store.put_many([(day, (day, combine(store.get(day, (day, 0))[1], tickets)))
+                            for day, tickets in changes.items()])
+            return
+        with self.__lock_for(self.__sales_file):  # load + save must not interleave with another writer
+            sales = self.load_sales()
+            for day, tickets in changes.items():
+                sales[day] = combine(sales.get(day, 0), tickets)
+            self.__save_data(self.__sales_file, sales)
+
+    def count_tickets_by_day(self):
+        # {day: tickets in the stored orders}, for SalesCounter.reconcile()
+        if self.__sqlite():
+            return self.__db.count_tickets_by_day()
+        counts = {}
+        for order in self.load_orders():
+            day = order.get_purchase_time().strftime("%Y-%m-%d")
+            counts[day] = counts.get(day, 0) + len(order.get_tickets())
+        return counts
+
+    def get_sales_between(self, start_date, end_date):
+        # Inclusive "YYYY-MM-DD" bounds
+        if self.__sqlite():
+            return self.__db.get_sales_between(start_date, end_date)
+        sales = self.load_sales() or {}
+        return {day: n for day, n in sorted(sales.items()) if start_date <= day <= end_date}
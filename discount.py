@@ -1,9 +1,35 @@
+from datetime import datetime
+
+from money import to_fils, from_fils, apply_percentage_off
+from slotted import get_slot_state, set_slot_state, state_as_dict
+
+
 class Discount:
-    def __init__(self, name, percentage, ticket_type):
+    """
+    A percentage off one ticket type. It applies while it is active (the
+    admin's on/off switch), inside its validity window and within its usage
+    caps; TicketManager picks the best one that applies at purchase time.
+    """
+    __slots__ = ("__name", "__percentage", "__ticket_type", "__active", "__listeners",
+                 "__starts_at", "__ends_at", "__max_uses", "__per_customer_limit",
+                 "__uses", "__customer_uses")
+
+    # starts_at / ends_at: naive datetimes like order times; None leaves that end open.
+    # max_uses / per_customer_limit: tickets that may get this discount; None means no cap
+    def __init__(self, name, percentage, ticket_type, starts_at=None, ends_at=None,
+                 max_uses=None, per_customer_limit=None):
         self.__name = name  # e.g., "Weekend Promo"
         self.__percentage = percentage  # e.g., 10 for 10%
         self.__ticket_type = ticket_type  # e.g., "WeekendPackage"
         self.__active = True
+        self.__listeners = []  # callbacks(discount) run after any pricing change, not persisted
+        self.__check_window(starts_at, ends_at)
+        self.__starts_at = starts_at
+        self.__ends_at = ends_at  # exclusive
+        self.__max_uses = max_uses
+        self.__per_customer_limit = per_customer_limit
+        self.__uses = 0  # discounted tickets sold
+        self.__customer_uses = {}  # customer id -> discounted tickets, kept when per_customer_limit is set
 
     # Getters
     def get_name(self):
@@ -18,28 +44,145 @@ class Discount:
     def is_active(self):
         return self.__active
 
+    def get_starts_at(self):
+        return self.__starts_at
+
+    def get_ends_at(self):
+        return self.__ends_at
+
+    def get_max_uses(self):
+        return self.__max_uses
+
+    def get_per_customer_limit(self):
+        return self.__per_customer_limit
+
+    def get_uses(self):
+        return self.__uses
+
+    def get_customer_uses(self, customer_id):
+        return self.__customer_uses.get(customer_id, 0)
+
+    def is_limited(self):
+        # Usage counts must be saved after each sale
+        return self.__max_uses is not None or self.__per_customer_limit is not None
+
+    def is_used_up(self):
+        return self.__max_uses is not None and self.__uses >= self.__max_uses
+
+    def covers(self, when):
+        return (self.__starts_at is None or self.__starts_at <= when) and \
+            (self.__ends_at is None or when < self.__ends_at)
+
+    def has_uses_left(self, customer_id=None, quantity=1):
+        if self.__max_uses is not None and self.__uses + quantity > self.__max_uses:
+            return False
+        if self.__per_customer_limit is not None and customer_id is not None:
+            return self.__customer_uses.get(customer_id, 0) + quantity <= self.__per_customer_limit
+        return True
+
+    def applies_at(self, when, customer_id=None, quantity=1):
+        return self.__active and self.covers(when) and self.has_uses_left(customer_id, quantity)
+
+    def get_status(self, when=None):
+        # "Active", "Inactive", "Scheduled", "Expired" or "Used up", for admin screens
+        when = when or datetime.now()
+        if not self.__active:
+            return "Inactive"
+        if self.__starts_at is not None and when < self.__starts_at:
+            return "Scheduled"
+        if self.__ends_at is not None and when >= self.__ends_at:
+            return "Expired"
+        return "Used up" if self.is_used_up() else "Active"
+
     # Setters
     def set_name(self, name):
         self.__name = name
 
     def set_percentage(self, percentage):
         self.__percentage = percentage
+        self.__notify()
 
     def set_ticket_type(self, ticket_type):
         self.__ticket_type = ticket_type
+        self.__notify()
+
+    def set_window(self, starts_at, ends_at):
+        self.__check_window(starts_at, ends_at)
+        self.__starts_at, self.__ends_at = starts_at, ends_at
+        self.__notify()
+
+    def set_max_uses(self, max_uses):
+        self.__max_uses = max_uses
+        self.__notify()
+
+    def set_per_customer_limit(self, limit):
+        self.__per_customer_limit = limit
+        self.__notify()
+
+    def record_use(self, customer_id, quantity=1):
+        # Called once per sale that got this discount
+        self.__uses += quantity
+        if self.__per_customer_limit is not None:
+            self.__customer_uses[customer_id] = self.__customer_uses.get(customer_id, 0) + quantity
+        if self.is_used_up():
+            self.__notify()  # no longer a candidate
+
+    def set_uses(self, uses, customer_uses=None):
+        # Counts as stored (storage claims the uses; see DataManager.claim_discount_use).
+        # customer_uses: {customer id: tickets} for the customers to update
+        self.__uses = uses
+        if customer_uses and self.__per_customer_limit is not None:
+            self.__customer_uses.update(customer_uses)
+        self.__notify()
+
+    @staticmethod
+    def __check_window(starts_at, ends_at):
+        if starts_at is not None and ends_at is not None and ends_at <= starts_at:
+            raise ValueError("Discount must end after it starts")
 
     def activate(self):
         self.__active = True
+        self.__notify()
 
     def deactivate(self):
         self.__active = False
+        self.__notify()
 
-    # Apply discount to a base price
+    # Change listeners (TicketManager uses these to keep its discount index fresh)
+    def add_listener(self, callback):
+        self.__listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.__listeners:
+            self.__listeners.remove(callback)
+
+    def __notify(self):
+        for listener in self.__listeners:
+            listener(self)
+
+    # Apply discount to a base price (AED)
     def apply_discount(self, base_price):
         if self.__active:
-            return round(base_price * (1 - self.__percentage / 100), 2)
+            return from_fils(self.apply_discount_fils(to_fils(base_price)))
         return base_price
 
+    # Same, on integer fils
+    def apply_discount_fils(self, base_fils):
+        if self.__active:
+            return apply_percentage_off(base_fils, self.__percentage)
+        return base_fils
+
+    # Pickling: listeners belong to the running app, not to the saved record
+    def __getstate__(self):
+        return get_slot_state(self, exclude=("_Discount__listeners",))
+
+    def __setstate__(self, state):
+        # Discounts saved before scheduling have no window, caps or usage counts
+        self.__starts_at = self.__ends_at = self.__max_uses = self.__per_customer_limit = None
+        self.__uses = 0
+        self.__customer_uses = {}
+        set_slot_state(self, state_as_dict(state))
+        self.__listeners = []
+
     def __str__(self):
-        status = "Active" if self.__active else "Inactive"
-        return f"{self.__name} ({self.__percentage}% off for {self.__ticket_type}) – {status}"
+        return f"{self.__name} ({self.__percentage}% off for {self.__ticket_type}) – {self.get_status()}"
@@ -0,0 +1,100 @@
+# discount_schedule.py
+# Which discount a ticket type gets at a given moment. Each type's discount
+# windows are cut into a timeline of sorted boundaries; between two boundaries
+# the set of running discounts never changes, so its best discount is worked
+# out once and a lookup is one binary search.
+
+import heapq
+from bisect import bisect_right
+from datetime import datetime
+
+_NEVER = datetime.min
+_FOREVER = datetime.max
+
+
+class DiscountSchedule:
+    """
+    Discounts per ticket type with a lazily built timeline for each type:
+    boundary times plus the best discount of every segment (highest
+    percentage; ties go to the discount added first). Only discounts that
+    are switched on and not used up are placed; a change to any of them
+    drops its type's timeline, which is rebuilt on the next lookup.
+    """
+
+    def __init__(self):
+        self.__by_type = {}  # ticket type -> discounts targeting it, in the order added
+        self.__indexed_type = {}  # id(discount) -> ticket type it is filed under
+        self.__rank = {}  # id(discount) -> add sequence, the tie-breaker
+        self.__next_rank = 0
+        self.__timelines = {}  # ticket type -> (boundaries, best discount per segment)
+
+    # ---------- Maintenance ----------
+    def add(self, discount):
+        ticket_type = discount.get_ticket_type()
+        self.__by_type.setdefault(ticket_type, []).append(discount)
+        self.__indexed_type[id(discount)] = ticket_type
+        self.__rank[id(discount)] = self.__next_rank
+        self.__next_rank += 1
+        self.__timelines.pop(ticket_type, None)
+
+    def remove(self, discount):
+        ticket_type = self.__indexed_type.pop(id(discount))
+        del self.__rank[id(discount)]
+        self.__by_type[ticket_type].remove(discount)
+        self.__timelines.pop(ticket_type, None)
+
+    def update(self, discount):
+        # After any change to a discount (percentage, window, type, switch, usage)
+        old_type = self.__indexed_type[id(discount)]
+        new_type = discount.get_ticket_type()
+        if new_type != old_type:
+            self.__by_type[old_type].remove(discount)
+            self.__by_type.setdefault(new_type, []).append(discount)
+            self.__by_type[new_type].sort(key=lambda d: self.__rank[id(d)])
+            self.__indexed_type[id(discount)] = new_type
+            self.__timelines.pop(old_type, None)
+        self.__timelines.pop(new_type, None)
+
+    # ---------- Lookups ----------
+    def best(self, ticket_type, when, customer_id=None, quantity=1):
+        # Best discount applying to quantity tickets of this type at when, or None
+        timeline = self.__timelines.get(ticket_type)
+        if timeline is None:
+            timeline = self.__timelines[ticket_type] = self.__build(ticket_type)
+        bounds, winners = timeline
+        discount = winners[bisect_right(bounds, when) - 1]
+        if discount is None or discount.has_uses_left(customer_id, quantity):
+            return discount
+        # Rare: the segment's winner is out of uses for this customer or
+        # quantity, so the runner-up is found by a scan of this type
+        best = None
+        for other in self.__by_type[ticket_type]:
+            if other.applies_at(when, customer_id, quantity) and \
+                    (best is None or other.get_percentage() > best.get_percentage()):
+                best = other
+        return best
+
+    def get_timeline(self, ticket_type):
+        # [(segment start, best discount or None)], mainly for admin screens and tests
+        timeline = self.__timelines.get(ticket_type) or self.__build(ticket_type)
+        return list(zip(*timeline))
+
+    def __build(self, ticket_type):
+        # Sweep the sorted window starts and ends, keeping the running
+        # discounts in a heap ordered by (-percentage, rank): O(n log n)
+        placed = [d for d in self.__by_type.get(ticket_type, ()) if d.is_active() and not d.is_used_up()]
+        starts = sorted(placed, key=lambda d: d.get_starts_at() or _NEVER)
+        bounds = sorted({_NEVER} | {d.get_starts_at() or _NEVER for d in placed}
+                        | {d.get_ends_at() or _FOREVER for d in placed})
+        running, winners = [], []
+        next_start = 0
+        for bound in bounds:
+            while next_start < len(starts) and (starts[next_start].get_starts_at() or _NEVER) <= bound:
+                discount = starts[next_start]
+                heapq.heappush(running, (-discount.get_percentage(), self.__rank[id(discount)],
+                                         discount.get_ends_at() or _FOREVER, discount))
+                next_start += 1
+            while running and running[0][2] <= bound:
+                heapq.heappop(running)  # top has ended; ended entries below it go when they surface
+            winners.append(running[0][3] if running else None)
+        return bounds, winners
@@ -0,0 +1,44 @@
+# file_lock.py
+# Cross-process exclusive lock on a side file (e.g. users.pkl.lock), used around
+# read-modify-write cycles on the pickle files so concurrent writers don't
+# overwrite each other.
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    def __init__(self, path):
+        self.__path = path
+        self.__thread_lock = threading.RLock()  # flock is per process, so also lock threads
+        self.__depth = 0
+        self.__fd = None
+
+    def __enter__(self):
+        self.__thread_lock.acquire()
+        self.__depth += 1
+        if self.__depth == 1:
+            self.__fd = os.open(self.__path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(self.__fd, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(self.__fd, msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.__depth -= 1
+        if self.__depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.__fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self.__fd, msvcrt.LK_UNLCK, 1)
+            os.close(self.__fd)
+            self.__fd = None
+        self.__thread_lock.release()
+        return False
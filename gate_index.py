@@ -0,0 +1,248 @@
+# gate_index.py
+# Ticket validation at the circuit gates. Every sold ticket id maps to a small
+# slot with its validity window, how many people it admits and how many of
+# them entered on the last entry day, so a scan is one dict lookup plus a few
+# array reads; no customer or order is loaded. Handheld scanners that lose the
+# network carry a Bloom filter of the valid ids instead.
+
+import hashlib
+import math
+import os
+import struct
+from array import array
+from datetime import datetime, timedelta
+
+from order_archive import epoch_seconds
+
+# Scan results
+VALID = "valid"
+UNKNOWN = "unknown"  # not a sold ticket (or its order was deleted)
+NOT_YET_VALID = "not_yet_valid"
+EXPIRED = "expired"
+ALREADY_ENTERED = "already_entered"  # everyone the ticket admits has entered today
+
+_OPEN_WINDOW = (-(1 << 62), 1 << 62)
+
+
+def default_windows(race_start=None):
+    # Validity label -> (starts_at, ends_at). Without a race date every ticket
+    # is valid on any day; with one, one-day tickets are for race day and
+    # three-day tickets for the race weekend (Friday to Sunday).
+    if race_start is None:
+        return {}
+    race_day = race_start.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {"One Day": (race_day, race_day + timedelta(days=1)),
+            "Three Days": (race_day - timedelta(days=2), race_day + timedelta(days=1))}
+
+
+class BloomFilter:
+    """
+    Fixed-size set of ticket ids with no false negatives and a tunable false
+    positive rate. to_bytes() is the compact form sent to offline scanners.
+    """
+    _HEADER = struct.Struct(">QB")  # bit count, hash count
+
+    def __init__(self, bit_count, hash_count):
+        self.__bit_count = max(8, bit_count)
+        self.__hash_count = max(1, hash_count)
+        self.__bits = bytearray((self.__bit_count + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, items, false_positive_rate=0.001):
+        items = max(1, items)
+        bits = math.ceil(-items * math.log(false_positive_rate) / math.log(2) ** 2)
+        return cls(bits, round(bits / items * math.log(2)))
+
+    @classmethod
+    def from_bytes(cls, data):
+        bit_count, hash_count = cls._HEADER.unpack_from(data)
+        bloom = cls(bit_count, hash_count)
+        bloom.__bits[:] = data[cls._HEADER.size:]
+        return bloom
+
+    def to_bytes(self):
+        return self._HEADER.pack(self.__bit_count, self.__hash_count) + bytes(self.__bits)
+
+    def __positions(self, ticket_id):
+        # Double hashing (Kirsch-Mitzenmacher) from one 128-bit digest
+        digest = hashlib.blake2b(ticket_id.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.__bit_count
+        return [(h1 + i * h2) % m for i in range(self.__hash_count)]
+
+    def add(self, ticket_id):
+        bits = self.__bits
+        for position in self.__positions(ticket_id):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, ticket_id):
+        bits = self.__bits
+        for position in self.__positions(ticket_id):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def get_size_bytes(self):
+        return len(self.__bits) + self._HEADER.size
+
+
+class GateIndex:
+    """
+    Ticket id -> slot, with per-slot arrays for the validity window (an index
+    into a small table of windows, one per validity label), the people it
+    admits per day (stored on the order line: a group's size, else 1), the
+    last entry day and the entries made that day. Kept in step with the orders
+    through record/remove/replace_order, like SalesAnalytics. With entry_log
+    set, entries are appended there and replayed on start, so a restart does
+    not forget who is already inside.
+    """
+
+    def __init__(self, windows=None, entry_log=None):
+        self.__windows = [_OPEN_WINDOW]  # window code -> (start, end) epoch seconds; 0 = always valid
+        self.__window_codes = {}  # validity label -> window code
+        for label, (starts_at, ends_at) in (windows or {}).items():
+            self.__window_codes[label] = len(self.__windows)
+            self.__windows.append((epoch_seconds(starts_at), epoch_seconds(ends_at)))
+        self.__slots = {}  # ticket id -> slot
+        self.__window_of = array("B")  # slot -> window code
+        self.__admits = array("H")  # slot -> entries allowed per day
+        self.__entry_day = array("H")  # slot -> 1 + day (since 1970) of the last entry; 0 = never
+        self.__entered = array("H")  # slot -> entries made on that day
+        self.__free_slots = []  # slots of removed tickets, reused first
+        self.__scans = 0
+        self.__rejected = 0
+        self.__logged_entries = {}  # ticket id -> (last entry day, entries that day) from the log
+        self.__log = None
+        if entry_log is not None:
+            self.__read_entry_log(entry_log)
+            # Line buffered: each entry reaches the file as it is recorded, so a
+            # killed process loses none (the OS still decides when it hits disk)
+            self.__log = open(entry_log, "a", encoding="utf-8", buffering=1)
+
+    # ---------- Index upkeep ----------
+    def add_orders(self, orders):
+        for order in orders:
+            self.record_order(order)
+
+    def record_order(self, order):
+        for line in order.get_tickets():
+            self.__add(line.get_ticket_id(), line.get_validity(), line.get_admits())
+
+    def remove_order(self, order):
+        for line in order.get_tickets():
+            self.__remove(line.get_ticket_id())
+
+    def replace_order(self, old_order, new_order):
+        # An edit keeps its ticket ids, and with them whether they entered today
+        kept = {line.get_ticket_id() for line in new_order.get_tickets()}
+        for line in old_order.get_tickets():
+            if line.get_ticket_id() not in kept:
+                self.__remove(line.get_ticket_id())
+        self.record_order(new_order)
+
+    def __add(self, ticket_id, validity, admits):
+        slot = self.__slots.get(ticket_id)
+        if slot is not None:
+            self.__admits[slot] = admits  # an edited order keeps its entries
+            return
+        code = self.__window_codes.get(validity, 0)
+        entry_day, entered = self.__logged_entries.pop(ticket_id, (0, 0)) if self.__logged_entries else (0, 0)
+        if self.__free_slots:
+            slot = self.__free_slots.pop()
+            self.__window_of[slot] = code
+            self.__admits[slot] = admits
+            self.__entry_day[slot] = entry_day
+            self.__entered[slot] = entered
+        else:
+            slot = len(self.__window_of)
+            self.__window_of.append(code)
+            self.__admits.append(admits)
+            self.__entry_day.append(entry_day)
+            self.__entered.append(entered)
+        self.__slots[ticket_id] = slot
+
+    def __remove(self, ticket_id):
+        slot = self.__slots.pop(ticket_id, None)
+        if slot is not None:
+            self.__free_slots.append(slot)
+
+    # ---------- Scanning ----------
+    def check(self, ticket_id, now=None):
+        # Result of a scan without recording an entry
+        return self.__scan(ticket_id, now, enter=False)
+
+    def validate(self, ticket_id, now=None):
+        # Result of a scan; VALID also records today's entry
+        return self.__scan(ticket_id, now, enter=True)
+
+    def __scan(self, ticket_id, now, enter):
+        self.__scans += 1
+        slot = self.__slots.get(ticket_id)
+        if slot is None:
+            self.__rejected += 1
+            return UNKNOWN
+        seconds = epoch_seconds(now or datetime.now())
+        starts, ends = self.__windows[self.__window_of[slot]]
+        if seconds < starts or seconds >= ends:
+            self.__rejected += 1
+            return NOT_YET_VALID if seconds < starts else EXPIRED
+        day = seconds // 86400 + 1
+        entered = self.__entered[slot] if self.__entry_day[slot] == day else 0
+        if entered >= self.__admits[slot]:
+            self.__rejected += 1
+            return ALREADY_ENTERED
+        if enter:
+            self.__entry_day[slot] = day
+            self.__entered[slot] = entered + 1
+            if self.__log is not None:
+                self.__log.write(f"{ticket_id} {day}\n")
+        return VALID
+
+    def __read_entry_log(self, path):
+        if not os.path.exists(path):
+            return
+        # One line per entry; a ticket's entries on its latest day are counted
+        logged = self.__logged_entries
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1].isdigit():  # a torn last line is skipped
+                    day = int(parts[1])
+                    last_day, entered = logged.get(parts[0], (0, 0))
+                    if day > last_day:
+                        logged[parts[0]] = (day, 1)
+                    elif day == last_day:
+                        logged[parts[0]] = (day, entered + 1)
+
+    def flush(self):
+        if self.__log is not None:
+            self.__log.flush()
+
+    def close(self):
+        if self.__log is not None:
+            self.__log.close()
+            self.__log = None
+
+    # ---------- Offline scanners ----------
+    def export_bloom(self, false_positive_rate=0.001):
+        # Bloom filter of every currently valid ticket id; rebuild it after deletions
+        bloom = BloomFilter.for_capacity(len(self.__slots), false_positive_rate)
+        for ticket_id in self.__slots:
+            bloom.add(ticket_id)
+        return bloom
+
+    # ---------- Metrics ----------
+    def get_stats(self):
+        return {"tickets": len(self.__slots), "scans": self.__scans, "rejected": self.__rejected,
+                "entered_today": self.__entered_on(datetime.now())}
+
+    def __entered_on(self, when):
+        day = epoch_seconds(when) // 86400 + 1
+        return sum(self.__entered[slot] for slot in self.__slots.values() if self.__entry_day[slot] == day)
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __contains__(self, ticket_id):
+        return ticket_id in self.__slots
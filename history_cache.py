@@ -0,0 +1,86 @@
+# history_cache.py
+# Purchase histories loaded per customer on first access, kept in a bounded LRU.
+
+import threading
+from collections import OrderedDict
+
+
+class HistoryCache:
+    """
+    Loads a customer's orders from the DataManager the first time they are
+    needed and keeps the most recently used max_customers histories in memory.
+    Memory therefore follows the number of active customers, not the number of
+    orders ever sold. Orders must be saved to storage before add_order() so an
+    evicted history reloads complete.
+    """
+
+    def __init__(self, dm, max_customers=256):
+        if max_customers < 1:
+            raise ValueError("max_customers must be at least 1")
+        self.__dm = dm
+        self.__max_customers = max_customers
+        self.__histories = OrderedDict()  # customer_id -> [orders], least recently used first
+        self.__lock = threading.RLock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    # ---------- Access ----------
+    def get(self, customer_id):
+        with self.__lock:
+            history = self.__histories.get(customer_id)
+            if history is not None:
+                self.__hits += 1
+                self.__histories.move_to_end(customer_id)
+                return history
+            self.__misses += 1
+            history = list(self.__dm.get_orders_for_customer(customer_id))
+            self.__histories[customer_id] = history
+            self.__evict()
+            return history
+
+    def add_order(self, customer_id, order):
+        # Only a loaded history needs the new order; otherwise storage already has it
+        with self.__lock:
+            history = self.__histories.get(customer_id)
+            if history is not None:
+                history.append(order)
+
+    def remove_order(self, customer_id, order_id):
+        with self.__lock:
+            history = self.__histories.get(customer_id)
+            if history is not None:
+                history[:] = [o for o in history if o.get_order_id() != order_id]
+
+    def invalidate(self, customer_id=None):
+        # Drop one customer's history (or all), e.g. after storage changed underneath
+        with self.__lock:
+            if customer_id is None:
+                self.__histories.clear()
+            else:
+                self.__histories.pop(customer_id, None)
+
+    def is_loaded(self, customer_id):
+        return customer_id in self.__histories
+
+    # ---------- Sizing / metrics ----------
+    def set_max_customers(self, max_customers):
+        if max_customers < 1:
+            raise ValueError("max_customers must be at least 1")
+        with self.__lock:
+            self.__max_customers = max_customers
+            self.__evict()
+
+    def get_max_customers(self):
+        return self.__max_customers
+
+    def get_stats(self):
+        with self.__lock:
+            return {"size": len(self.__histories), "max_customers": self.__max_customers,
+                    "hits": self.__hits, "misses": self.__misses, "evictions": self.__evictions,
+                    "orders_loaded": sum(len(h) for h in self.__histories.values())}
+
+    def __evict(self):
+        while len(self.__histories) > self.__max_customers:
+            self.__histories.popitem(last=False)
+            self.__evictions += 1
@@ -0,0 +1,348 @@
+# http_api.py
+# Small HTTP/JSON front end over TicketingService, built on asyncio streams
+# (no web framework needed). Blocking service calls run in a thread pool so
+# the event loop keeps accepting connections while a purchase is being saved.
+#
+#   python http_api.py --port 8080 --backend sqlite --workers 4
+#
+# Every request body and response is JSON. POST /login checks the password once
+# and returns a session token; calls that act for a user send it back as
+# "Authorization: Bearer <token>".
+
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import socket
+from datetime import datetime
+
+from customer import Customer
+from ticketing_service import create_default_service
+
+MAX_BODY = 64 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+            404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ----------------------------------------
+# JSON SHAPES
+# ----------------------------------------
+def user_to_json(user):
+    return {"user_id": user.get_user_id(), "name": user.get_name(), "email": user.get_email(),
+            "role": "customer" if isinstance(user, Customer) else "admin"}
+
+
+def order_to_json(order):
+    return {"order_id": order.get_order_id(),
+            "tickets": [ticket.get_name() for ticket in order.get_tickets()],
+            "seats": order.get_seat_ids(),
+            "total_fils": order.get_total_fils(),
+            "payment_method": order.get_payment_method(),
+            "purchase_time": order.get_purchase_time().isoformat(timespec="seconds")}
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+# ----------------------------------------
+# ROUTES (run in worker threads)
+# ----------------------------------------
+class ApiHandlers:
+    """Maps (method, path) to a service call taking the parsed JSON body."""
+
+    def __init__(self, svc):
+        self.__svc = svc
+        self.__routes = {
+            ("GET", "/ticket-types"): self.ticket_types,
+            ("POST", "/register"): self.register,
+            ("POST", "/login"): self.login,
+            ("POST", "/logout"): self.logout,
+            ("POST", "/quote"): self.quote,
+            ("POST", "/purchase"): self.purchase,
+            ("GET", "/orders"): self.orders,
+            ("POST", "/orders"): self.orders,
+            ("POST", "/orders/edit"): self.edit_order,
+            ("POST", "/orders/delete"): self.delete_order,
+            ("GET", "/sales-report"): self.sales_report,
+            ("POST", "/gate/validate"): self.validate_ticket,
+            ("GET", "/gate/bloom"): self.gate_bloom,
+        }
+
+    def dispatch(self, method, path, body, token=None):
+        # token: the request's bearer token, or None
+        handler = self.__routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.__routes):
+                raise HttpError(405, f"{method} not allowed on {path}")
+            raise HttpError(404, f"No route for {path}")
+        try:
+            return handler(body, token)
+        except ValueError as ve:
+            raise HttpError(400, str(ve))
+
+    # ---------- Helpers ----------
+    @staticmethod
+    def __field(body, name):
+        value = body.get(name)
+        if value in (None, ""):
+            raise HttpError(400, f"Missing field: {name}")
+        return value
+
+    @staticmethod
+    def __quantity(body):
+        # A number (or numeric string); anything else, null included, is the client's error
+        try:
+            return int(body.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise HttpError(400, "quantity must be a whole number")
+
+    def __user(self, token):
+        if not token:
+            raise HttpError(401, "Login required.")
+        try:
+            return self.__svc.get_session_user(token)
+        except ValueError as ve:
+            raise HttpError(401, str(ve))
+
+    def __admin(self, token):
+        user = self.__user(token)
+        if isinstance(user, Customer):
+            raise HttpError(403, "Admin account required.")
+        return user
+
+    def __customer(self, token):
+        user = self.__user(token)
+        if not isinstance(user, Customer):
+            raise HttpError(403, "Customer account required.")
+        return user
+
+    # ---------- Handlers ----------
+    def ticket_types(self, body, token):
+        return {"ticket_types": self.__svc.get_ticket_types(),
+                "payment_methods": self.__svc.get_payment_methods()}
+
+    def register(self, body, token):
+        customer = self.__svc.register(body.get("name"), body.get("email"), body.get("password"))
+        return user_to_json(customer)
+
+    def login(self, body, token):
+        try:
+            token, user = self.__svc.start_session(self.__field(body, "email"), self.__field(body, "password"))
+        except ValueError as ve:
+            raise HttpError(401, str(ve))
+        return dict(user_to_json(user), token=token)
+
+    def logout(self, body, token):
+        self.__user(token)
+        self.__svc.end_session(token)
+        return {"logged_out": True}
+
+    def quote(self, body, token):
+        quote = self.__svc.quote(self.__field(body, "ticket_type"), self.__quantity(body))
+        return {"lines": [list(line) for line in quote["lines"]], "total_fils": quote["total_fils"]}
+
+    def purchase(self, body, token):
+        customer = self.__customer(token)
+        order = self.__svc.purchase(customer, self.__field(body, "ticket_type"),
+                                    self.__field(body, "payment_method"), self.__quantity(body))
+        return order_to_json(order)
+
+    def orders(self, body, token):
+        return {"orders": [order_to_json(o) for o in self.__svc.get_orders(self.__customer(token))]}
+
+    def edit_order(self, body, token):
+        order = self.__svc.edit_order(self.__customer(token), self.__field(body, "order_id"),
+                                      self.__field(body, "payment_method"))
+        return order_to_json(order)
+
+    def delete_order(self, body, token):
+        self.__svc.delete_order(self.__customer(token), self.__field(body, "order_id"))
+        return {"deleted": body["order_id"]}
+
+    def sales_report(self, body, token):
+        self.__admin(token)
+        return self.__svc.sales_report()
+
+    def validate_ticket(self, body, token):
+        # Gate staff sign in with an admin account
+        self.__admin(token)
+        ticket_id = self.__field(body, "ticket_id")
+        return {"ticket_id": ticket_id,
+                "result": self.__svc.validate_ticket(ticket_id, bool(body.get("record_entry", True)))}
+
+    def gate_bloom(self, body, token):
+        self.__admin(token)
+        return {"bloom": base64.b64encode(self.__svc.export_gate_bloom()).decode("ascii")}
+
+
+# ----------------------------------------
+# HTTP/1.1 SERVER
+# ----------------------------------------
+class ApiServer:
+    """
+    Minimal HTTP/1.1 server: keep-alive connections, Content-Length bodies,
+    JSON in and out. One event loop per process; run several processes on the
+    same port (reuse_port) to use more cores.
+    """
+
+    def __init__(self, svc, host="127.0.0.1", port=8080, reuse_port=False):
+        self.__handlers = ApiHandlers(svc)
+        self.__host = host
+        self.__port = port
+        self.__reuse_port = reuse_port
+        self.__server = None
+
+    async def start(self):
+        self.__server = await asyncio.start_server(
+            self.__serve_connection, self.__host, self.__port, reuse_port=self.__reuse_port or None)
+        return self.__server.sockets[0].getsockname()[1]  # the real port when port=0
+
+    async def serve_forever(self):
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    async def stop(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+
+    async def __serve_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await self.__read_request(reader)
+                if request is None:
+                    break  # client closed the connection
+                method, path, headers, body = request
+                try:
+                    payload = json.loads(body) if body else {}
+                    if not isinstance(payload, dict):
+                        raise HttpError(400, "Body must be a JSON object.")
+                    result = await loop.run_in_executor(
+                        None, self.__handlers.dispatch, method, path, payload, self.__bearer(headers))
+                    status = 200
+                except HttpError as he:
+                    status, result = he.status, {"error": str(he)}
+                except json.JSONDecodeError:
+                    status, result = 400, {"error": "Invalid JSON."}
+                except Exception as e:
+                    status, result = 500, {"error": str(e)}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(self.__response(status, result, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HttpError as he:
+            writer.write(self.__response(he.status, {"error": str(he)}, False))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def __bearer(headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return token.strip() if scheme.lower() == "bearer" else None
+
+    @staticmethod
+    async def __read_request(reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY:
+            raise HttpError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    @staticmethod
+    def __response(status, result, keep_alive):
+        body = json.dumps(result, default=_jsonable).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode("latin-1") + body
+
+
+# ----------------------------------------
+# ENTRY POINT
+# ----------------------------------------
+def run_server(host, port, backend, reuse_port=False, migrate_legacy=False):
+    # Worker processes share the database and, through sessions.db, login
+    # sessions. The order archive and gate entry marks are per process, so
+    # several workers on one port run without them.
+    svc = create_default_service(backend=backend, archive_dir=None if reuse_port else "order_archive",
+                                 gate_log=None if reuse_port else "gate_entries.log",
+                                 sessions_db="sessions.db" if reuse_port else None,
+                                 migrate_legacy=migrate_legacy)
+    try:
+        asyncio.run(ApiServer(svc, host, port, reuse_port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        svc.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grand Prix ticketing HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--backend", default="log", help="storage backend: log, sqlite or pickle")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="server processes sharing the port (needs the sqlite backend)")
+    parser.add_argument("--migrate-legacy", action="store_true",
+                        help="import pickled data from an older version (trusted files only)")
+    args = parser.parse_args(argv)
+
+    if args.workers <= 1:
+        run_server(args.host, args.port, args.backend, migrate_legacy=args.migrate_legacy)
+        return
+    # Only SQLite is safe with several writer processes; the pickle and log
+    # backends keep state in each process's memory. A worker that gets a session
+    # for an account registered on another worker loads that account from the
+    # database; other changes to a loaded account reach it on restart.
+    if args.backend != "sqlite":
+        parser.error("--workers > 1 requires --backend sqlite")
+    if not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("--workers > 1 needs SO_REUSEPORT (not available on this platform)")
+    workers = [multiprocessing.Process(target=run_server,
+                                       args=(args.host, args.port, args.backend, True, args.migrate_legacy))
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
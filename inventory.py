@@ -0,0 +1,165 @@
+# inventory.py
+# Per-ticket-type capacity with reserve -> commit -> release semantics.
+# State lives in SQLite so threads and separate processes share it safely.
+
+import sqlite3
+import threading
+import time
+import uuid
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    ticket_type TEXT PRIMARY KEY,
+    capacity INTEGER NOT NULL,
+    sold INTEGER NOT NULL DEFAULT 0,
+    held INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS holds (
+    hold_id TEXT PRIMARY KEY,
+    ticket_type TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_holds_type_expiry ON holds(ticket_type, expires_at);
+"""
+
+
+class Inventory:
+    """
+    Capacity per ticket type (grandstand, VIP lounge, ...). Types without a
+    configured capacity are unlimited. Every change runs in a BEGIN IMMEDIATE
+    transaction, so concurrent buyers can never oversell.
+    """
+
+    def __init__(self, path="inventory.db", hold_seconds=600):
+        self.__path = path
+        self.__hold_seconds = hold_seconds
+        self.__local = threading.local()  # one connection per thread
+        self.__connections = []  # every thread's connection, closed together
+        self.__connections_lock = threading.Lock()
+        self.__connection().executescript(_SCHEMA)
+
+    def __connection(self):
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.__path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.__local.conn = conn
+            with self.__connections_lock:
+                self.__connections.append(conn)
+        return conn
+
+    def __transaction(self):
+        return ImmediateTransaction(self.__connection())
+
+    def close(self):
+        with self.__connections_lock:
+            for conn in self.__connections:
+                conn.close()
+            self.__connections = []
+        self.__local = threading.local()
+
+    # ---------- Configuration ----------
+    def set_capacity(self, ticket_type, capacity):
+        with self.__transaction() as conn:
+            conn.execute(
+                "INSERT INTO stock (ticket_type, capacity) VALUES (?, ?) "
+                "ON CONFLICT(ticket_type) DO UPDATE SET capacity = excluded.capacity",
+                (ticket_type, capacity))
+
+    def get_capacity(self, ticket_type):
+        row = self.__row(ticket_type)
+        return row[0] if row else None
+
+    def get_sold(self, ticket_type):
+        row = self.__row(ticket_type)
+        return row[1] if row else 0
+
+    def get_stock(self, ticket_type):
+        # (capacity, sold, held) in one read, or None for an unlimited type
+        return self.__row(ticket_type)
+
+    def get_remaining(self, ticket_type):
+        # None means unlimited; expired holds count as free
+        with self.__transaction() as conn:
+            self.__purge_expired(conn, ticket_type)
+            row = conn.execute("SELECT capacity - sold - held FROM stock WHERE ticket_type = ?",
+                               (ticket_type,)).fetchone()
+        return row[0] if row else None
+
+    def __row(self, ticket_type):
+        return self.__connection().execute(
+            "SELECT capacity, sold, held FROM stock WHERE ticket_type = ?", (ticket_type,)).fetchone()
+
+    # ---------- Reserve / Commit / Release ----------
+    def reserve(self, ticket_type, quantity=1):
+        # Returns a hold id; raises ValueError when not enough tickets are left
+        if quantity < 1:
+            raise ValueError(f"Invalid quantity: {quantity}")
+        hold_id = str(uuid.uuid4())
+        with self.__transaction() as conn:
+            self.__purge_expired(conn, ticket_type)
+            tracked = conn.execute("SELECT 1 FROM stock WHERE ticket_type = ?", (ticket_type,)).fetchone()
+            if tracked:
+                updated = conn.execute(
+                    "UPDATE stock SET held = held + ? WHERE ticket_type = ? AND capacity - sold - held >= ?",
+                    (quantity, ticket_type, quantity)).rowcount
+                if not updated:
+                    raise ValueError(f"{ticket_type} is sold out.")
+            conn.execute("INSERT INTO holds VALUES (?, ?, ?, ?)",
+                         (hold_id, ticket_type, quantity, time.time() + self.__hold_seconds))
+        return hold_id
+
+    def commit(self, hold_id):
+        # Turns a hold into sold tickets; raises ValueError if it expired or is unknown
+        with self.__transaction() as conn:
+            hold = conn.execute("SELECT ticket_type, quantity FROM holds WHERE hold_id = ?",
+                                (hold_id,)).fetchone()
+            if hold is None:
+                raise ValueError("Reservation expired. Please try again.")
+            conn.execute("DELETE FROM holds WHERE hold_id = ?", (hold_id,))
+            conn.execute("UPDATE stock SET held = held - ?, sold = sold + ? WHERE ticket_type = ?",
+                         (hold[1], hold[1], hold[0]))
+            return hold[0], hold[1]
+
+    def release(self, hold_id):
+        with self.__transaction() as conn:
+            hold = conn.execute("SELECT ticket_type, quantity FROM holds WHERE hold_id = ?",
+                                (hold_id,)).fetchone()
+            if hold is None:
+                return False
+            conn.execute("DELETE FROM holds WHERE hold_id = ?", (hold_id,))
+            conn.execute("UPDATE stock SET held = held - ? WHERE ticket_type = ?", (hold[1], hold[0]))
+            return True
+
+    def return_units(self, ticket_type, quantity=1):
+        # Put sold tickets back on sale (e.g. a deleted order)
+        with self.__transaction() as conn:
+            conn.execute("UPDATE stock SET sold = MAX(sold - ?, 0) WHERE ticket_type = ?",
+                         (quantity, ticket_type))
+
+    def __purge_expired(self, conn, ticket_type):
+        now = time.time()
+        expired = conn.execute(
+            "SELECT COALESCE(SUM(quantity), 0) FROM holds WHERE ticket_type = ? AND expires_at < ?",
+            (ticket_type, now)).fetchone()[0]
+        if expired:
+            conn.execute("DELETE FROM holds WHERE ticket_type = ? AND expires_at < ?", (ticket_type, now))
+            conn.execute("UPDATE stock SET held = held - ? WHERE ticket_type = ?", (expired, ticket_type))
+
+
+class ImmediateTransaction:
+    # BEGIN IMMEDIATE takes SQLite's write lock up front, so a read-then-update
+    # inside the block can't interleave with another writer
+    def __init__(self, conn):
+        self.__conn = conn
+
+    def __enter__(self):
+        self.__conn.execute("BEGIN IMMEDIATE")
+        return self.__conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.__conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,203 @@
+import os
+import struct
+import zlib
+
+import record_codec
+
+# The file starts with _FILE_MAGIC; each record after it is a 4-byte payload
+# length + 4-byte CRC32, then the payload (an encoded (op, key, value bytes) tuple).
+# Logs written before record_codec (no magic, pickled records) are refused unless
+# the store is opened with migrate_legacy=True, which converts them once.
+_FILE_MAGIC = b"GPLOG\x02\n"
+_HEADER = struct.Struct(">II")
+_PUT = "put"
+_DEL = "del"
+
+
+class LogStore:
+    """
+    Append-only key/value log for one collection (users, orders, ...).
+    Writes only append the records that changed, and the file is rewritten
+    (compacted) once dead records outnumber live ones by compact_ratio.
+    """
+
+    def __init__(self, path, compact_ratio=2.0, min_compact_records=1000, sync=True, migrate_legacy=False):
+        self.__path = path
+        self.__migrate_legacy = migrate_legacy
+        self.__compact_ratio = compact_ratio
+        self.__min_compact_records = min_compact_records
+        self.__sync = sync
+        self.__live = {}  # key -> encoded value bytes (insertion ordered)
+        self.__record_count = 0  # records in the file, live or dead
+        self.__file = None
+        legacy = self.__replay()
+        self.__file = open(self.__path, "ab")
+        if legacy:
+            self.compact()  # rewrite the old pickle log in the current format
+        elif self.__file.tell() == 0:
+            self.__file.write(_FILE_MAGIC)
+            self.__file.flush()
+
+    # ---------- Reading ----------
+    def keys(self):
+        return list(self.__live.keys())
+
+    def get(self, key, default=None):
+        raw = self.__live.get(key)
+        return record_codec.loads(raw) if raw is not None else default
+
+    def values(self):
+        return [record_codec.loads(raw) for raw in self.__live.values()]
+
+    def iter_values(self):
+        # Decodes one record at a time; the keys are fixed when iteration starts
+        # and records deleted meanwhile are skipped
+        for key in list(self.__live):
+            raw = self.__live.get(key)
+            if raw is not None:
+                yield record_codec.loads(raw)
+
+    def items(self):
+        return [(key, record_codec.loads(raw)) for key, raw in self.__live.items()]
+
+    def __len__(self):
+        return len(self.__live)
+
+    def __contains__(self, key):
+        return key in self.__live
+
+    def get_record_count(self):
+        return self.__record_count
+
+    # ---------- Writing ----------
+    def put(self, key, value):
+        raw = record_codec.dumps(value)
+        if self.__live.get(key) == raw:
+            return  # unchanged, nothing to write
+        self.__append([(_PUT, key, raw)])
+
+    def put_many(self, pairs):
+        # Several puts in one append (and one fsync)
+        ops = []
+        for key, value in pairs:
+            raw = record_codec.dumps(value)
+            if self.__live.get(key) != raw:
+                ops.append((_PUT, key, raw))
+        if ops:
+            self.__append(ops)
+
+    def delete(self, key):
+        if key in self.__live:
+            self.__append([(_DEL, key, None)])
+
+    def replace_all(self, pairs):
+        # Make the store hold exactly `pairs`, writing only the differences
+        ops = []
+        seen = set()
+        for key, value in pairs:
+            seen.add(key)
+            raw = record_codec.dumps(value)
+            if self.__live.get(key) != raw:
+                ops.append((_PUT, key, raw))
+        for key in self.__live:
+            if key not in seen:
+                ops.append((_DEL, key, None))
+        if ops:
+            self.__append(ops)
+
+    # ---------- Compaction ----------
+    def compact(self):
+        # Rewrite only the live records into a temp file, then atomically swap it in
+        tmp_path = self.__path + ".tmp"
+        with open(tmp_path, "wb") as tmp:
+            tmp.write(_FILE_MAGIC)
+            for key, raw in self.__live.items():
+                tmp.write(self.__encode(_PUT, key, raw))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        self.__file.close()
+        os.replace(tmp_path, self.__path)
+        self.__fsync_dir()
+        self.__file = open(self.__path, "ab")
+        self.__record_count = len(self.__live)
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    # ---------- Internals ----------
+    def __append(self, ops):
+        self.__file.write(b"".join(self.__encode(op, key, raw) for op, key, raw in ops))
+        self.__file.flush()
+        if self.__sync:
+            os.fsync(self.__file.fileno())
+        for op, key, raw in ops:
+            self.__apply(op, key, raw)
+        self.__record_count += len(ops)
+        self.__maybe_compact()
+
+    def __maybe_compact(self):
+        if self.__record_count < self.__min_compact_records:
+            return
+        if self.__record_count > self.__compact_ratio * max(len(self.__live), 1):
+            self.compact()
+
+    def __apply(self, op, key, raw):
+        if op == _PUT:
+            self.__live[key] = raw
+        else:
+            self.__live.pop(key, None)
+
+    @staticmethod
+    def __encode(op, key, raw):
+        payload = record_codec.dumps((op, key, raw))
+        return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def __replay(self):
+        # Returns True if the file is a legacy pickle log that must be rewritten
+        if not os.path.exists(self.__path) or os.path.getsize(self.__path) == 0:
+            return False
+        with open(self.__path, "rb") as f:
+            legacy = f.read(len(_FILE_MAGIC)) != _FILE_MAGIC
+            if legacy:
+                if not self.__migrate_legacy:
+                    # Unpickling it could run code; only an explicit migration may
+                    raise ValueError(f"{self.__path} is not a record log (a pickle log from an older "
+                                     f"version?); open it once with migrate_legacy=True to convert it")
+                f.seek(0)
+            good_end = f.tell()
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break  # torn write from a crash, drop the tail
+                op, key, raw = self.__legacy_record(payload) if legacy else record_codec.loads(payload)
+                self.__apply(op, key, raw)
+                self.__record_count += 1
+                good_end = f.tell()
+        if not legacy and good_end < os.path.getsize(self.__path):
+            with open(self.__path, "r+b") as f:
+                f.truncate(good_end)
+        return legacy
+
+    @staticmethod
+    def __legacy_record(payload):
+        # Pickled records from before record_codec; reached only with migrate_legacy=True
+        import pickle
+        op, key, raw = pickle.loads(payload)
+        return op, key, record_codec.dumps(pickle.loads(raw)) if raw is not None else None
+
+    def __fsync_dir(self):
+        directory = os.path.dirname(os.path.abspath(self.__path))
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return  # not supported on this platform (e.g. Windows)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
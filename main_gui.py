@@ -1,58 +1,26 @@
 # Import tkinter for GUI components and messagebox for pop-up alerts
+import os
 import tkinter as tk
 from tkinter import messagebox
 
 # Import core logic and shared GUI utilities
-from ticket_manager import TicketManager
+from ticketing_service import create_default_service
 from customer import Customer
-from admin import Admin
-from data_manager import DataManager
-from ticket_types import SingleRaceTicket, WeekendPackage, SeasonPass, GroupDiscountTicket
-from discount import Discount
-from shared_gui_utils import clear_screen
-from customer_views import show_customer_menu
-from admin_views import show_admin_menu
-
-# Initialize TicketManager and DataManager
-tm = TicketManager()
-dm = DataManager()
-
-# Register available ticket types at app start
-tm.register_ticket_type(SingleRaceTicket())
-tm.register_ticket_type(WeekendPackage())
-tm.register_ticket_type(SeasonPass())
-tm.register_ticket_type(GroupDiscountTicket(5))
-tm.register_ticket_type(GroupDiscountTicket(10))  # Optional larger group
-
-tm._TicketManager__sales_log = dm.load_sales()
-
-# Add discounts
-disc1 = Discount("Weekend Promo", 10, "Weekend Package")
-disc2 = Discount("Season Special", 15, "Season Pass")
-disc3 = Discount("Expired Offer", 50, "Single Race Pass")
-disc3.deactivate()  # Simulate expired discount
-
-tm.add_discount(disc1)
-tm.add_discount(disc2)
-tm.add_discount(disc3)
-
-
-# Load all users from storage
-users = dm.load_users()
-
-# Create and add a new admin
-new_admin = Admin("Dr. Andrew", "admin@example.com", "admin123")
-users.append(new_admin)
-dm.save_users(users)
-
-# Separate loaded users by role
-customers = [u for u in users if isinstance(u, Customer)]
-admins = [u for u in users if isinstance(u, Admin)]
+from shared_gui_utils import clear_screen, when_done
+from background_writer import poll_callbacks
+# customer_views / admin_views are imported after login, keeping them off the startup path
+
+# Build the service (ticket types, discounts, inventory, storage, users).
+# Storage backend: "log" (default), "sqlite" or "pickle". Run once with GP_MIGRATE_LEGACY=1
+# to import the .pkl files into a new log (or convert an older SQLite database).
+service = create_default_service(backend=os.environ.get("GP_STORAGE_BACKEND", "log"),
+                                 migrate_legacy=os.environ.get("GP_MIGRATE_LEGACY") == "1")
 
 # Initialize the main application window
 root = tk.Tk()
 root.title("Grand Prix Ticketing System")
-root.geometry("400x300")  # Set fixed window size
+root.geometry("500x400")  # Set fixed window size (fits the purchase history table)
+poll_callbacks(root, service.get_writer())  # finished background saves report back here
 
 # -------------------------
 # Registration Screen
@@ -82,29 +50,19 @@ def show_registration():
         email = email_entry.get()
         password = pass_entry.get()
 
-        # Validate input fields
-        if not name or not email or not password:
-            messagebox.showerror("Error", "All fields are required.")
-            return
-
-        try:
-            # Check if email already exists
-            for user in customers + admins:
-                if user.get_email() == email:
-                    raise ValueError("Email already exists.")
-
-            # Create new customer and save
-            new_customer = Customer(name, email, password)
-            customers.append(new_customer)
-            users.append(new_customer)
-            dm.save_users(users)
-
+        def registered(_):
             messagebox.showinfo("Success", "Account created. Please login.")
             show_login()
-        except ValueError as ve:
-            messagebox.showerror("Error", str(ve))
-        except Exception as e:
-            messagebox.showerror("Error", f"Unexpected error: {str(e)}")
+
+        def failed(e):
+            if isinstance(e, ValueError):
+                messagebox.showerror("Error", str(e))
+            else:
+                messagebox.showerror("Error", f"Unexpected error: {str(e)}")
+
+        # Validates fields, rejects taken emails and saves the new customer (off the Tk thread)
+        service.get_writer().submit(None, lambda: service.register(name, email, password),
+                                    on_done=registered, on_error=failed)
 
     # Buttons for registration and back
     tk.Button(root, text="Register", command=register_action).pack(pady=10)
@@ -131,28 +89,40 @@ def show_login():
     def login_action():
         email = email_entry.get()
         password = pass_entry.get()
-        try:
-            # Check if credentials match any user
-            for user in customers + admins:
-                if user.get_email() == email and user.check_password(password):
-                    messagebox.showinfo("Success", f"Welcome, {user.get_name()}")
-                    if isinstance(user, Customer):
-                        show_customer_menu(user, root, tm, dm)
-                    else:
-                        show_admin_menu(user, root, tm, dm)
-                    return
-            raise ValueError("Invalid email or password.")
-        except ValueError as ve:
-            messagebox.showerror("Login Failed", str(ve))
-        except Exception as e:
-            messagebox.showerror("Error", f"Unexpected error during login: {str(e)}")
+
+        def logged_in(user):
+            messagebox.showinfo("Success", f"Welcome, {user.get_name()}")
+            if isinstance(user, Customer):
+                from customer_views import show_customer_menu
+                show_customer_menu(user, root, service)
+            else:
+                from admin_views import show_admin_menu
+                show_admin_menu(user, root, service)
+
+        def failed(e):
+            login_button.config(state="normal")
+            if isinstance(e, ValueError):  # bad email or password
+                messagebox.showerror("Login Failed", str(e))
+            else:
+                messagebox.showerror("Error", f"Unexpected error during login: {str(e)}")
+
+        # The password check is slow on purpose, so it runs off the Tk thread
+        login_button.config(state="disabled")
+        when_done(root, service.login_async(email, password), logged_in, failed)
 
     # Buttons for login and switch to register screen
-    tk.Button(root, text="Login", command=login_action).pack(pady=10)
+    login_button = tk.Button(root, text="Login", command=login_action)
+    login_button.pack(pady=10)
     tk.Button(root, text="Register", command=lambda: show_registration()).pack(pady=5)
 
 # -------------------------
 # Launch Application
 # -------------------------
 show_login()  # Start at the login screen
-root.mainloop()  # Enter tkinter main loop
+if os.environ.get("GP_STARTUP_PROBE"):
+    # Startup benchmark: draw the first frame, then exit (see benchmarks.py)
+    root.update()
+    root.destroy()
+else:
+    root.mainloop()  # Enter tkinter main loop
+service.close()  # Finish queued saves and write any unsaved sales
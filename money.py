@@ -0,0 +1,34 @@
+# money.py
+# Prices are kept as integer fils (1 AED = 100 fils) so totals add up exactly.
+# The get_price()/get_total_price() getters still return AED for display.
+
+from decimal import Decimal, ROUND_HALF_UP
+
+FILS_PER_AED = 100
+
+
+def to_fils(amount):
+    # AED (int, float, str or Decimal) -> integer fils, rounding half up
+    if isinstance(amount, int):
+        return amount * FILS_PER_AED
+    fils = Decimal(str(amount)) * FILS_PER_AED
+    return int(fils.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_fils(fils):
+    return fils / FILS_PER_AED
+
+
+def format_aed(fils):
+    sign = "-" if fils < 0 else ""
+    whole, part = divmod(abs(fils), FILS_PER_AED)
+    return f"AED {sign}{whole}.{part:02d}"
+
+
+def apply_percentage_off(fils, percentage):
+    # Price after `percentage`% off, in fils, rounded half up.
+    # The percentage is scaled to hundredths of a percent so 12.5% stays exact.
+    basis_points = to_fils(percentage)  # same x100 scaling as AED -> fils
+    numerator = fils * (100 * FILS_PER_AED - basis_points)
+    whole, rest = divmod(numerator, 100 * FILS_PER_AED)
+    return whole + (1 if 2 * rest >= 100 * FILS_PER_AED else 0)
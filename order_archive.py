@@ -0,0 +1,288 @@
+# order_archive.py
+# Columnar, append-only copy of every sold ticket for report scans. Each field
+# is its own fixed-width file, memory-mapped and read in place (as NumPy
+# arrays when NumPy is installed, memoryviews otherwise), so building the
+# sales aggregates never unpickles an order and keeps almost nothing on the heap.
+#
+#   time.col            int64   purchase time, seconds since 1970-01-01 (naive, like the orders)
+#   qty.col             int8    +1 for a sale, -1 when that sale is deleted or edited away
+#   gross.col / net.col int64   list price and price paid, in fils (-ve on reversal rows)
+#   ticket_type.col     uint16  index into meta.json "ticket_type"
+#   payment_method.col  uint16  index into meta.json "payment_method"
+#
+# Rows are only ever appended, so an edit is a reversal row plus a new sale and
+# every measure stays a plain sum over the columns.
+
+import json
+import mmap
+import os
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from sales_analytics import SalesAnalytics
+
+ARCHIVE_VERSION = 1
+
+_COLUMNS = (("time", "q"), ("qty", "b"), ("gross", "q"), ("net", "q"),
+            ("ticket_type", "H"), ("payment_method", "H"))
+_ITEMSIZE = {fmt: array(fmt).itemsize for fmt in "qbH"}
+_NUMPY_TYPES = {"q": "int64", "b": "int8", "H": "uint16"}
+_DICTIONARIES = ("ticket_type", "payment_method")
+_CHUNK_ROWS = 65536  # rows buffered per write in append_orders()
+_UNIX_EPOCH = datetime(1970, 1, 1)
+_UNIX_DAY = date(1970, 1, 1)
+
+
+def epoch_seconds(value):
+    # Whole seconds since 1970-01-01 for a naive datetime (also used by gate_index)
+    return (value - _UNIX_EPOCH) // timedelta(seconds=1)
+
+
+class OrderArchive:
+    """
+    Append-only column files for sold ticket lines, kept in step with the
+    orders through the same record/remove/replace calls as SalesAnalytics.
+    cells() sums the columns per (day, ticket type, payment method).
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta = self.__read_meta()
+        if meta.get("byteorder", sys.byteorder) != sys.byteorder:
+            raise ValueError(f"Order archive {directory} was written on a {meta['byteorder']}-endian machine")
+        self.__names = {kind: list(meta.get(kind, [])) for kind in _DICTIONARIES}
+        self.__codes = {kind: {name: i for i, name in enumerate(names)}
+                        for kind, names in self.__names.items()}
+        # Signature of the order storage at the last clean close. It is dropped
+        # from disk straight away, so a crash leaves the archive marked stale.
+        self.__source = meta.get("source")
+        self.__rows = self.__complete_rows()
+        self.__write_meta()
+        self.__files = {name: open(self.__path(name), "ab") for name, _ in _COLUMNS}
+        self.__maps = []  # mmaps handed out by columns(), closed on the next remap / close()
+        self.__mapped_rows = -1
+        self.__views = None
+
+    # ---------- Files ----------
+    def __path(self, name):
+        return os.path.join(self.__directory, name + ".col")
+
+    def __read_meta(self):
+        try:
+            with open(os.path.join(self.__directory, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return meta if meta.get("version") == ARCHIVE_VERSION else {}
+
+    def __write_meta(self, source=None):
+        meta = {"version": ARCHIVE_VERSION, "byteorder": sys.byteorder, **self.__names}
+        self.__saved_names = {kind: len(names) for kind, names in self.__names.items()}
+        if source is not None:
+            meta["source"] = source
+        path = os.path.join(self.__directory, "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def __complete_rows(self):
+        # A crash can leave some columns one append ahead; cut them back to the shortest
+        rows = min(os.path.getsize(self.__path(name)) // _ITEMSIZE[fmt]
+                   if os.path.exists(self.__path(name)) else 0 for name, fmt in _COLUMNS)
+        for name, fmt in _COLUMNS:
+            with open(self.__path(name), "ab") as f:
+                if f.tell() != rows * _ITEMSIZE[fmt]:
+                    f.truncate(rows * _ITEMSIZE[fmt])
+        return rows
+
+    # ---------- State ----------
+    def get_directory(self):
+        return self.__directory
+
+    def get_row_count(self):
+        return self.__rows
+
+    def get_names(self, kind):
+        # Dictionary for "ticket_type" or "payment_method": code -> name
+        return list(self.__names[kind])
+
+    def get_source(self):
+        # Order storage signature recorded by the last close(), or None
+        return self.__source
+
+    def matches_source(self, source):
+        # True if the archive was closed cleanly against exactly this storage state
+        return self.__source is not None and self.__source == json.loads(json.dumps(source))
+
+    def close(self, source=None):
+        # source: signature of the order storage this archive now matches
+        for f in self.__files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        self.__files = {}
+        self.__release_maps()
+        self.__write_meta(source)
+
+    # ---------- Appending ----------
+    def record_order(self, order):
+        self.append_orders([order])
+
+    def remove_order(self, order):
+        self.append_orders([order], sign=-1)
+
+    def replace_order(self, old_order, new_order):
+        self.append_orders([old_order], sign=-1)
+        self.append_orders([new_order])
+
+    def append_orders(self, orders, sign=1):
+        # One row per ticket line; sign=-1 writes reversal rows. Returns rows added.
+        # Rows are buffered in chunks, so orders may be a generator of any length.
+        added = 0
+        columns = self.__new_chunk()
+        times, qtys, grosses, nets, types, methods = columns
+        for order in orders:
+            seconds = epoch_seconds(order.get_purchase_time())
+            method = self.__code("payment_method", order.get_payment_method())
+            for line in order.get_tickets():
+                times.append(seconds)
+                qtys.append(sign)
+                grosses.append(sign * line.get_type_entry().get_list_price_fils())
+                nets.append(sign * line.get_price_fils())
+                types.append(self.__code("ticket_type", line.get_name()))
+                methods.append(method)
+            if len(times) >= _CHUNK_ROWS:
+                added += self.__write_chunk(columns)
+                columns = self.__new_chunk()
+                times, qtys, grosses, nets, types, methods = columns
+        return added + self.__write_chunk(columns)
+
+    @staticmethod
+    def __new_chunk():
+        return [array(fmt) for _, fmt in _COLUMNS]
+
+    def __write_chunk(self, columns):
+        if not columns[0]:
+            return 0
+        if any(len(names) != self.__saved_names[kind] for kind, names in self.__names.items()):
+            self.__write_meta()  # names must be on disk before rows that use their codes
+        for (name, _), values in zip(_COLUMNS, columns):
+            values.tofile(self.__files[name])
+        for f in self.__files.values():
+            f.flush()
+        self.__rows += len(columns[0])
+        return len(columns[0])
+
+    def rebuild(self, orders):
+        # Replace the whole archive with these orders (all live, one row per line)
+        self.__release_maps()
+        for name, _ in _COLUMNS:
+            self.__files[name].close()
+            self.__files[name] = open(self.__path(name), "w+b")
+        self.__names = {kind: [] for kind in _DICTIONARIES}
+        self.__codes = {kind: {} for kind in _DICTIONARIES}
+        self.__rows = 0
+        self.__write_meta()
+        self.append_orders(orders)
+
+    def __code(self, kind, name):
+        code = self.__codes[kind].get(name)
+        if code is None:
+            code = len(self.__names[kind])
+            if code > 0xFFFF:
+                raise ValueError(f"Too many distinct {kind} values for the order archive")
+            self.__names[kind].append(name)
+            self.__codes[kind][name] = code
+        return code
+
+    # ---------- Reading ----------
+    def columns(self):
+        # {column: zero-copy view of the first get_row_count() values}, NumPy
+        # arrays when available. Views stay valid until the next append + columns() or close().
+        if self.__mapped_rows == self.__rows:
+            return self.__views
+        self.__release_maps()
+        views = {}
+        for name, fmt in _COLUMNS:
+            size = self.__rows * _ITEMSIZE[fmt]
+            if size == 0:
+                views[name] = np.zeros(0, _NUMPY_TYPES[fmt]) if np is not None else memoryview(b"").cast(fmt)
+                continue
+            with open(self.__path(name), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self.__maps.append(mapped)
+            if np is not None:
+                views[name] = np.frombuffer(mapped, dtype=_NUMPY_TYPES[fmt], count=self.__rows)
+            else:
+                views[name] = memoryview(mapped)[:size].cast(fmt)
+        self.__views, self.__mapped_rows = views, self.__rows
+        return views
+
+    def __release_maps(self):
+        if self.__views is not None and np is None:
+            for view in self.__views.values():
+                view.release()
+        self.__views, self.__mapped_rows = None, -1
+        for mapped in self.__maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # a caller still holds a view; the map closes when it is dropped
+        self.__maps = []
+
+    def cells(self):
+        # {(date, ticket_type, payment_method): [count, gross, discount, net]} over all rows
+        cols = self.columns()
+        totals = self.__numpy_cells(cols) if np is not None else self.__python_cells(cols)
+        types, methods = self.__names["ticket_type"], self.__names["payment_method"]
+        cells = {}
+        for (day, ticket_type, method), (count, gross, net) in totals.items():
+            if count:
+                cells[(_UNIX_DAY + timedelta(days=day), types[ticket_type], methods[method])] = \
+                    [count, gross, gross - net, net]
+        return cells
+
+    @staticmethod
+    def __python_cells(cols):
+        totals = {}
+        for seconds, qty, gross, net, ticket_type, method in zip(
+                cols["time"], cols["qty"], cols["gross"], cols["net"],
+                cols["ticket_type"], cols["payment_method"]):
+            key = (seconds // 86400, ticket_type, method)
+            cell = totals.get(key)
+            if cell is None:
+                totals[key] = [qty, gross, net]
+            else:
+                cell[0] += qty
+                cell[1] += gross
+                cell[2] += net
+        return totals
+
+    @staticmethod
+    def __numpy_cells(cols):
+        if not len(cols["time"]):
+            return {}
+        # One int64 key per row, sorted so each cell is a contiguous run to reduce
+        key = ((cols["time"] // 86400) << 32) | (cols["ticket_type"].astype("int64") << 16) \
+            | cols["payment_method"]
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        sums = [np.add.reduceat(cols[name][order].astype("int64"), starts) for name in ("qty", "gross", "net")]
+        return {(int(k >> 32), int((k >> 16) & 0xFFFF), int(k & 0xFFFF)): [int(s[i]) for s in sums]
+                for i, k in enumerate(key[starts])}
+
+    def to_analytics(self):
+        analytics = SalesAnalytics()
+        for (day, ticket_type, method), cell in self.cells().items():
+            analytics.add_cell(day, ticket_type, method, cell)
+        return analytics
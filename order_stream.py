@@ -0,0 +1,125 @@
+# order_stream.py
+# Streaming export/import of orders as JSON Lines (one order per line), so large
+# order histories can be scanned, filtered and copied with bounded memory.
+
+import json
+import pickle
+from datetime import datetime
+
+from purchase_order import PurchaseOrder, OrderLine
+from ticket_catalog import catalog_entry
+
+
+# ----------------------------------------
+# RECORD CONVERSION
+# ----------------------------------------
+def order_to_dict(order):
+    return {
+        "order_id": order.get_order_id(),
+        "customer_id": order.get_customer_id(),
+        "total_fils": order.get_total_fils(),
+        "payment_method": order.get_payment_method(),
+        "purchase_time": order.get_purchase_time().isoformat(),
+        "lines": [
+            {
+                "ticket_id": line.get_ticket_id(),
+                "price_fils": line.get_price_fils(),
+                "name": line.get_name(),
+                "validity": line.get_validity(),
+                "features": line.get_features(),
+                "list_price_fils": line.get_type_entry().get_list_price_fils(),
+                "admits": line.get_admits(),
+                "seat_ids": list(line.get_seat_ids()),
+            }
+            for line in order.get_tickets()
+        ],
+    }
+
+
+def order_from_dict(record):
+    lines = [
+        OrderLine(catalog_entry(l["name"], l["validity"], l["features"], l["list_price_fils"], l.get("admits")),
+                  l["price_fils"], l["ticket_id"], l.get("seat_ids", ()))
+        for l in record["lines"]
+    ]
+    return PurchaseOrder.restore(
+        record["order_id"], record["customer_id"], lines, record["total_fils"],
+        record["payment_method"], datetime.fromisoformat(record["purchase_time"]))
+
+
+# ----------------------------------------
+# FILTERING
+# ----------------------------------------
+def _matches(day, customer, start_date, end_date, customer_id):
+    # Dates are inclusive "YYYY-MM-DD" strings, like DataManager.get_sales_between
+    if start_date is not None and day < start_date:
+        return False
+    if end_date is not None and day > end_date:
+        return False
+    return customer_id is None or customer == customer_id
+
+
+# ----------------------------------------
+# READ / WRITE
+# ----------------------------------------
+def write_orders(path, orders, append=False):
+    # orders can be any iterable (e.g. a generator); returns the number written
+    count = 0
+    with open(path, "a" if append else "w", encoding="utf-8") as f:
+        for order in orders:
+            f.write(json.dumps(order_to_dict(order), separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def read_orders(path, start_date=None, end_date=None, customer_id=None):
+    # Yields PurchaseOrders one line at a time; filters are checked on the raw
+    # record so skipped orders are never turned into objects
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if _matches(record["purchase_time"][:10], record["customer_id"],
+                        start_date, end_date, customer_id):
+                yield order_from_dict(record)
+
+
+def iter_batches(orders, size):
+    batch = []
+    for order in orders:
+        batch.append(order)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ----------------------------------------
+# PICKLE FILES / DATAMANAGER
+# ----------------------------------------
+def export_pickle(pickle_path, jsonl_path, start_date=None, end_date=None, customer_id=None):
+    # orders.pkl is a single pickled list, so it has to be loaded whole once;
+    # everything after that (and every later read) streams
+    with open(pickle_path, "rb") as f:
+        orders = pickle.load(f)
+    selected = (o for o in orders
+                if _matches(o.get_purchase_time().strftime("%Y-%m-%d"), o.get_customer_id(),
+                            start_date, end_date, customer_id))
+    return write_orders(jsonl_path, selected)
+
+
+def export_orders(dm, jsonl_path):
+    # One order in memory at a time on the log and sqlite backends
+    return write_orders(jsonl_path, dm.iter_orders())
+
+
+def import_orders(jsonl_path, dm, batch_size=1000, **filters):
+    # Streams the file into any DataManager backend in batches; returns the count
+    count = 0
+    for batch in iter_batches(read_orders(jsonl_path, **filters), batch_size):
+        dm.upsert_orders(batch)
+        count += len(batch)
+    return count
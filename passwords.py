@@ -0,0 +1,111 @@
+# passwords.py
+# Salted password hashes for User records. Stored form:
+#   scrypt$n=16384,r=8,p=1$<salt b64>$<key b64>
+#   pbkdf2_sha256$i=600000$<salt b64>$<key b64>
+# The parameters travel with each hash, so raising the cost only affects new
+# hashes; older ones keep verifying and are re-hashed at the next login.
+
+import base64
+import hashlib
+import hmac
+import os
+
+ALGORITHMS = ("scrypt", "pbkdf2_sha256")
+_PARAM_NAMES = {"scrypt": {"n", "r", "p"}, "pbkdf2_sha256": {"i"}}
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _parse(stored):
+    # (algorithm, {param: int}, salt, key), or None for anything that is not one of our hashes
+    if not isinstance(stored, str) or stored.count("$") != 3:
+        return None
+    algorithm, params, salt, key = stored.split("$")
+    if algorithm not in ALGORITHMS:
+        return None
+    try:
+        values = {name: int(value) for name, value in (item.split("=") for item in params.split(","))}
+        if set(values) != _PARAM_NAMES[algorithm]:
+            return None
+        return algorithm, values, base64.b64decode(salt, validate=True), base64.b64decode(key, validate=True)
+    except ValueError:
+        return None
+
+
+def is_hashed(stored):
+    return _parse(stored) is not None
+
+
+def _derive(algorithm, params, password, salt, length):
+    secret = password.encode("utf-8")
+    if algorithm == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, dklen=length,
+                              maxmem=128 * r * (n + p + 2) + (1 << 20))  # OpenSSL's need plus slack
+    return hashlib.pbkdf2_hmac("sha256", secret, salt, params["i"], dklen=length)
+
+
+class PasswordHasher:
+    """
+    Work factor for new password hashes. scrypt's cost is n (CPU and memory,
+    a power of two) with block size r and parallelism p; pbkdf2_sha256's is
+    the iteration count. verify() reads the parameters from the stored hash.
+    """
+
+    def __init__(self, algorithm="scrypt", n=2 ** 14, r=8, p=1, iterations=600_000):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+        if algorithm == "scrypt" and not hasattr(hashlib, "scrypt"):
+            raise ValueError("hashlib.scrypt needs Python built with OpenSSL 1.1+; use pbkdf2_sha256")
+        if algorithm == "scrypt" and (n < 2 or n & (n - 1)):
+            raise ValueError("scrypt n must be a power of two greater than 1")
+        self.__algorithm = algorithm
+        self.__params = {"n": n, "r": r, "p": p} if algorithm == "scrypt" else {"i": iterations}
+
+    def get_algorithm(self):
+        return self.__algorithm
+
+    def get_params(self):
+        return dict(self.__params)
+
+    def describe(self):
+        return f"{self.__algorithm} " + ",".join(f"{k}={v}" for k, v in self.__params.items())
+
+    def hash(self, password):
+        salt = os.urandom(16)
+        key = _derive(self.__algorithm, self.__params, password, salt, 32)
+        params = ",".join(f"{k}={v}" for k, v in self.__params.items())
+        return f"{self.__algorithm}${params}${_b64(salt)}${_b64(key)}"
+
+    @staticmethod
+    def verify(stored, password):
+        parsed = _parse(stored)
+        if parsed is None:
+            return False
+        algorithm, params, salt, key = parsed
+        return hmac.compare_digest(_derive(algorithm, params, password, salt, len(key)), key)
+
+    def needs_rehash(self, stored):
+        # Plaintext (legacy) records and hashes made with other settings
+        parsed = _parse(stored)
+        return parsed is None or parsed[0] != self.__algorithm or parsed[1] != self.__params
+
+    def dummy_verify(self, password):
+        # Same work as a real check, so unknown emails answer no faster than wrong passwords
+        _derive(self.__algorithm, self.__params, password, b"\0" * 16, 32)
+        return False
+
+
+_default_hasher = PasswordHasher()
+
+
+def get_default_hasher():
+    return _default_hasher
+
+
+def set_default_hasher(hasher):
+    # Used for every new hash (registration, password change, login upgrade)
+    global _default_hasher
+    _default_hasher = hasher
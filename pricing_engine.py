@@ -0,0 +1,116 @@
+# pricing_engine.py
+# Demand-based prices per ticket type. The price in ticket_types.py is the base;
+# one curve over the share of capacity still unsold and one over days left to
+# the race give multipliers. Prices are cached per type and worked out again
+# only when that type sells or its cache entry ages out, never per quote.
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+
+class PriceCurve:
+    """
+    Piecewise-linear multiplier: sorted (x, multiplier) points, interpolated
+    between them and flat beyond the first and last point.
+    """
+
+    def __init__(self, points):
+        points = sorted(points)
+        if not points or any(multiplier <= 0 for _, multiplier in points):
+            raise ValueError("A price curve needs at least one point with a positive multiplier")
+        self.__xs = [x for x, _ in points]
+        self.__ys = [multiplier for _, multiplier in points]
+
+    def get_points(self):
+        return list(zip(self.__xs, self.__ys))
+
+    def at(self, x):
+        i = bisect_right(self.__xs, x)
+        if i == 0:
+            return self.__ys[0]
+        if i == len(self.__xs):
+            return self.__ys[-1]
+        x0, x1, y0, y1 = self.__xs[i - 1], self.__xs[i], self.__ys[i - 1], self.__ys[i]
+        return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+# Up to +50% as the last quarter sells; +25% in the final week before the race
+DEFAULT_DEMAND_CURVE = PriceCurve([(0.0, 1.5), (0.25, 1.2), (0.5, 1.0)])  # x: share of capacity unsold
+DEFAULT_TIME_CURVE = PriceCurve([(0, 1.25), (7, 1.1), (30, 1.0)])  # x: days to the race
+
+
+class PricingEngine:
+    """
+    Current list price (in fils, before discounts) per ticket type. Stock
+    levels come from the Inventory; types without a capacity only follow the
+    time curve, and with no race_start only the demand curve applies.
+    A cached price is refreshed by on_sale(), and otherwise re-read after
+    refresh_seconds (sales in other processes) or when days-to-race moves
+    to the next time_step.
+    """
+
+    def __init__(self, inventory=None, race_start=None, demand_curve=DEFAULT_DEMAND_CURVE,
+                 time_curve=DEFAULT_TIME_CURVE, time_step=timedelta(hours=1), refresh_seconds=60,
+                 round_to_fils=100, clock=datetime.now):
+        self.__inventory = inventory
+        self.__race_start = race_start  # naive datetime, like order times
+        self.__curves = {None: (demand_curve, time_curve)}  # ticket type (None = default) -> curves
+        self.__time_step = time_step
+        self.__max_age = timedelta(seconds=refresh_seconds)
+        self.__round_to = round_to_fils  # prices move in whole dirhams by default
+        self.__clock = clock
+        self.__prices = {}  # ticket type -> (price_fils, valid_until, base price_fils)
+        self.__refreshes = 0
+
+    # ---------- Configuration ----------
+    def set_curves(self, ticket_type, demand_curve=None, time_curve=None):
+        # Curves for one ticket type; None keeps the default for that curve
+        default_demand, default_time = self.__curves[None]
+        self.__curves[ticket_type] = (demand_curve or default_demand, time_curve or default_time)
+        self.__prices.pop(ticket_type, None)
+
+    def get_curves(self, ticket_type):
+        return self.__curves.get(ticket_type, self.__curves[None])
+
+    def get_race_start(self):
+        return self.__race_start
+
+    # ---------- Prices ----------
+    def get_price_fils(self, ticket):
+        # A dictionary lookup and a clock read while the cached price is fresh
+        cached = self.__prices.get(ticket.get_name())
+        now = self.__clock()
+        if cached is not None and now < cached[1] and cached[2] == ticket.get_price_fils():
+            return cached[0]  # (a new base price, e.g. reloaded pricing rules, misses)
+        return self.__refresh(ticket, now)
+
+    def on_sale(self, ticket):
+        # After a sale (or a cancellation) of this type: re-read its stock now
+        return self.__refresh(ticket, self.__clock())
+
+    def __refresh(self, ticket, now):
+        name = ticket.get_name()
+        demand_curve, time_curve = self.get_curves(name)
+        multiplier = 1.0
+        valid_until = now + self.__max_age
+        stock = self.__inventory.get_stock(name) if self.__inventory is not None else None
+        if stock is not None:
+            capacity, sold, _ = stock
+            if capacity > 0:
+                multiplier *= demand_curve.at(max(capacity - sold, 0) / capacity)
+        if self.__race_start is not None:
+            # Time to race is rounded down to whole steps, so the price
+            # holds still until the next step boundary
+            steps_left = (self.__race_start - now) // self.__time_step
+            multiplier *= time_curve.at(steps_left * self.__time_step / timedelta(days=1))
+            valid_until = min(valid_until, self.__race_start - steps_left * self.__time_step)
+        base_fils = price_fils = ticket.get_price_fils()
+        if multiplier != 1.0:
+            price_fils = int(base_fils * multiplier / self.__round_to + 0.5) * self.__round_to
+        self.__prices[name] = (price_fils, valid_until, base_fils)
+        self.__refreshes += 1
+        return price_fils
+
+    # ---------- Metrics ----------
+    def get_refresh_count(self):
+        return self.__refreshes
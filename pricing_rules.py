@@ -0,0 +1,195 @@
+# pricing_rules.py
+# Declarative prices for parametric ticket families (a group ticket for any
+# number of people). Rules are plain data, by default read from a JSON file:
+#
+#   {"Group Ticket": {"unit_price": 300, "step_off": 5, "floor": 250,
+#                     "min_quantity": 4, "max_quantity": 50,
+#                     "tiers": [[20, 280]], "bundles": {"10": 2600}, "max_total": 12000}}
+#
+# Per quantity q: the unit price is the tier price for the largest tier start
+# <= q (else unit_price), less step_off per person, but never below floor.
+# The total is unit x q, unless a bundle fixes the total for exactly q,
+# capped at max_total. Each rule is compiled once into a table indexed by q,
+# so any quantity is quoted with one list index.
+
+import json
+import os
+import threading
+import time
+
+from money import to_fils
+from ticket_types import GroupDiscountTicket
+
+# Matches GroupDiscountTicket's built-in formula: 300 AED less 5 per person, at least 250
+DEFAULT_RULES = {"Group Ticket": {"unit_price": 300, "step_off": 5, "floor": 250,
+                                  "min_quantity": 4, "max_quantity": 50}}
+
+_RULE_KEYS = {"unit_price", "step_off", "floor", "min_quantity", "max_quantity",
+              "tiers", "bundles", "max_total"}
+
+
+class PricingRule:
+    """
+    Price of one ticket family for min_quantity..max_quantity people, with
+    prices in AED as in ticket_types.py. compile() gives the total in fils
+    for every quantity.
+    """
+
+    def __init__(self, family, unit_price, min_quantity=1, max_quantity=100, step_off=0, floor=0,
+                 tiers=(), bundles=None, max_total=None):
+        if not 1 <= min_quantity <= max_quantity:
+            raise ValueError(f"{family}: quantities must satisfy 1 <= min_quantity <= max_quantity")
+        self.__family = family
+        self.__unit_fils = to_fils(unit_price)
+        self.__min_quantity = min_quantity
+        self.__max_quantity = max_quantity
+        self.__step_fils = to_fils(step_off)
+        self.__floor_fils = to_fils(floor)
+        self.__tiers = sorted((int(start), to_fils(price)) for start, price in tiers)  # (from quantity, unit fils)
+        self.__bundles = {int(q): to_fils(total) for q, total in (bundles or {}).items()}
+        self.__max_total_fils = None if max_total is None else to_fils(max_total)
+
+    @classmethod
+    def from_dict(cls, family, data):
+        unknown = set(data) - _RULE_KEYS
+        if unknown:
+            raise ValueError(f"{family}: unknown pricing rule keys {sorted(unknown)}")
+        return cls(family, **data)
+
+    def get_family(self):
+        return self.__family
+
+    def get_range(self):
+        return self.__min_quantity, self.__max_quantity
+
+    def price_fils(self, quantity):
+        # Total for quantity people, worked out from the rule (compile() tabulates this)
+        if quantity in self.__bundles:
+            total = self.__bundles[quantity]
+        else:
+            unit = self.__unit_fils
+            for start, tier_unit in self.__tiers:
+                if start <= quantity:
+                    unit = tier_unit
+            total = max(self.__floor_fils, unit - self.__step_fils * quantity) * quantity
+        if self.__max_total_fils is not None:
+            total = min(total, self.__max_total_fils)
+        return total
+
+    def compile(self):
+        return [self.price_fils(q) for q in range(self.__min_quantity, self.__max_quantity + 1)]
+
+
+def ticket_name(family, quantity):
+    # Same naming as GroupDiscountTicket
+    return f"{family} ({quantity} people)"
+
+
+class _CompiledRules:
+    # One immutable generation of compiled tables; swapped whole on reload
+    def __init__(self, rules):
+        self.rules = rules  # family -> PricingRule
+        self.tables = {}  # family -> (min_quantity, [total fils per quantity])
+        self.by_name = {}  # ticket name -> (family, quantity), for every quotable size
+        for family, rule in rules.items():
+            low, high = rule.get_range()
+            self.tables[family] = (low, rule.compile())
+            for quantity in range(low, high + 1):
+                self.by_name[ticket_name(family, quantity)] = (family, quantity)
+        self.tickets = {}  # ticket name -> ticket, built on first use
+
+
+class PricingRules:
+    """
+    Compiled pricing rules, reloaded when their file changes (checked at most
+    every check_interval seconds, from whichever call comes next), so new
+    rules apply without a restart. A file that fails to parse is reported
+    and the previous rules stay in force.
+    """
+
+    def __init__(self, path=None, rules=None, check_interval=2.0, clock=time.monotonic):
+        self.__path = path
+        self.__check_interval = check_interval
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__mtime = None
+        self.__next_check = 0.0
+        self.__generation = 0
+        self.__last_error = None
+        self.__compiled = _CompiledRules(self.__parse(rules if rules is not None else DEFAULT_RULES))
+        if path is not None:
+            self.refresh(force=True)
+
+    @staticmethod
+    def __parse(data):
+        return {family: PricingRule.from_dict(family, rule) for family, rule in data.items()}
+
+    # ---------- Reloading ----------
+    def refresh(self, force=False):
+        # Recompiles if the rule file changed; returns True when new rules were loaded
+        now = self.__clock()
+        if self.__path is None or (not force and now < self.__next_check):
+            return False
+        with self.__lock:
+            self.__next_check = now + self.__check_interval
+            try:
+                mtime = os.stat(self.__path).st_mtime_ns
+            except OSError:
+                return False  # no file (yet): keep the current rules
+            if mtime == self.__mtime and not force:
+                return False
+            self.__mtime = mtime
+            try:
+                with open(self.__path, encoding="utf-8") as f:
+                    compiled = _CompiledRules(self.__parse(json.load(f)))
+            except (OSError, ValueError, TypeError, ArithmeticError) as e:  # bad JSON or rule values
+                self.__last_error = f"{self.__path}: {e}"
+                return False
+            self.__compiled = compiled
+            self.__generation += 1
+            self.__last_error = None
+            return True
+
+    def get_generation(self):
+        # Bumped on every successful reload
+        return self.__generation
+
+    def get_last_error(self):
+        return self.__last_error
+
+    # ---------- Lookups ----------
+    def get_families(self):
+        return list(self.__compiled.rules)
+
+    def get_range(self, family):
+        return self.__compiled.rules[family].get_range()
+
+    def quote_fils(self, family, quantity):
+        # O(1): total list price in fils for quantity people
+        self.refresh()
+        table = self.__compiled.tables.get(family)
+        if table is None:
+            raise ValueError(f"Unknown ticket family: {family}")
+        low, totals = table
+        if not low <= quantity < low + len(totals):
+            raise ValueError(f"{family} is sold for {low} to {low + len(totals) - 1} people")
+        return totals[quantity - low]
+
+    def covers(self, name):
+        return name in self.__compiled.by_name
+
+    def ticket_for(self, name):
+        # Ticket priced by the rules for a name like "Group Ticket (7 people)", or None.
+        # Built on first request for that size and kept until the rules change.
+        self.refresh()
+        compiled = self.__compiled
+        ticket = compiled.tickets.get(name)
+        if ticket is None:
+            family_quantity = compiled.by_name.get(name)
+            if family_quantity is None:
+                return None
+            family, quantity = family_quantity
+            low, totals = compiled.tables[family]
+            ticket = compiled.tickets[name] = GroupDiscountTicket(
+                quantity, family=family, price_fils=totals[quantity - low])
+        return ticket
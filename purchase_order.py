@@ -1,15 +1,95 @@
+import sys
 import uuid
 from datetime import datetime
 
+from money import to_fils, from_fils, format_aed
+from slotted import set_slot_state, state_as_dict
+from ticket_catalog import entry_for_ticket
+
+# Orders and lines pickle as a short tuple of values (tagged with this version)
+# rather than a dict of mangled attribute names, which roughly halves a record
+_STATE_VERSION = 1
+
+class OrderLine:
+    """
+    One sold ticket inside an order: a shared catalog entry for the ticket type,
+    the price paid, this ticket's own id and its seats (if the type has
+    assigned seating). Has the same getters as Ticket.
+    """
+    __slots__ = ("__entry", "__price_fils", "__ticket_id", "__seat_ids")
+
+    def __init__(self, entry, price_fils, ticket_id=None, seat_ids=()):
+        self.__entry = entry  # CatalogEntry (interned)
+        self.__price_fils = price_fils
+        self.__ticket_id = ticket_id or str(uuid.uuid4())
+        self.__seat_ids = tuple(seat_ids)  # e.g. ("Group Stand:R3:S1", ...), see seat_map.py
+
+    def get_ticket_id(self):
+        return self.__ticket_id
+
+    def get_seat_ids(self):
+        return self.__seat_ids
+
+    def get_type_entry(self):
+        return self.__entry
+
+    def get_name(self):
+        return self.__entry.get_name()
+
+    def get_validity(self):
+        return self.__entry.get_validity()
+
+    def get_features(self):
+        return self.__entry.get_features()
+
+    def get_admits(self):
+        return self.__entry.get_admits()
+
+    def get_price(self):
+        return from_fils(self.__price_fils)
+
+    def get_price_fils(self):
+        return self.__price_fils
+
+    def __getstate__(self):
+        return (_STATE_VERSION, self.__entry, self.__price_fils, self.__ticket_id, self.__seat_ids)
+
+    def __setstate__(self, state):
+        # Lines pickled before seating have no seat ids
+        _, self.__entry, self.__price_fils, self.__ticket_id = state[:4]
+        self.__seat_ids = state[4] if len(state) > 4 else ()
+
+    def __str__(self):
+        return f"{self.get_name()} ({self.get_validity()}) - AED {self.get_price()}"
+
+
 class PurchaseOrder:
-    def __init__(self, customer_id, tickets, total_price, payment_method):
+    __slots__ = ("__order_id", "__customer_id", "__tickets", "__total_fils",
+                 "__payment_method", "__purchase_time")
+
+    # tickets: Ticket objects (each becomes a new OrderLine with its own ticket id)
+    # or OrderLines from an existing order (kept as they are).
+    # seat_ids: optional seat ids per new ticket, in the same order.
+    # list_prices_fils: optional list price per new ticket when it was not the
+    # ticket's fixed price (demand pricing, see pricing_engine.py)
+    def __init__(self, customer_id, tickets, total_price, payment_method, seat_ids=None,
+                 list_prices_fils=None):
         self.__order_id = str(uuid.uuid4())
-        self.__customer_id = customer_id
-        self.__tickets = tickets  # list of Ticket objects
-        self.__total_price = total_price
-        self.__payment_method = payment_method  # e.g., "Credit Card", "Apple Pay"
+        self.__customer_id = sys.intern(customer_id)
+        self.__total_fils = to_fils(total_price)  # integer fils, see money.py
+        self.__tickets = _to_lines(tickets, self.__total_fils, seat_ids=seat_ids,
+                                   list_prices_fils=list_prices_fils)  # list of OrderLine objects
+        self.__payment_method = sys.intern(payment_method)  # e.g., "Credit Card", "Apple Pay"
         self.__purchase_time = datetime.now()
 
+    # Rebuild a stored order with its original id and time (used by importers)
+    @classmethod
+    def restore(cls, order_id, customer_id, lines, total_fils, payment_method, purchase_time):
+        order = cls.__new__(cls)
+        order.__setstate__((_STATE_VERSION, order_id, customer_id, list(lines),
+                            total_fils, payment_method, purchase_time))
+        return order
+
     # Getters only – no setters because this is a finalized record
     def get_order_id(self):
         return self.__order_id
@@ -21,7 +101,10 @@ class PurchaseOrder:
         return self.__tickets
 
     def get_total_price(self):
-        return self.__total_price
+        return from_fils(self.__total_fils)
+
+    def get_total_fils(self):
+        return self.__total_fils
 
     def get_payment_method(self):
         return self.__payment_method
@@ -29,11 +112,112 @@ class PurchaseOrder:
     def get_purchase_time(self):
         return self.__purchase_time
 
+    def get_seat_ids(self):
+        return [seat for line in self.__tickets for seat in line.get_seat_ids()]
+
+    # Pickling (slots). Older pickles stored a float AED total and full Ticket objects.
+    def __getstate__(self):
+        return (_STATE_VERSION, self.__order_id, self.__customer_id, self.__tickets,
+                self.__total_fils, self.__payment_method, self.__purchase_time)
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple) and state[0] == _STATE_VERSION:
+            (_, self.__order_id, customer_id, self.__tickets, self.__total_fils,
+             payment_method, self.__purchase_time) = state
+            self.__customer_id = sys.intern(customer_id)
+            self.__payment_method = sys.intern(payment_method)
+            return
+        state = state_as_dict(state)
+        if "_PurchaseOrder__total_price" in state:
+            state["_PurchaseOrder__total_fils"] = to_fils(state.pop("_PurchaseOrder__total_price"))
+        state["_PurchaseOrder__tickets"] = _to_lines(
+            state.get("_PurchaseOrder__tickets", []), state["_PurchaseOrder__total_fils"],
+            legacy_order_id=state["_PurchaseOrder__order_id"])
+        state["_PurchaseOrder__customer_id"] = sys.intern(state["_PurchaseOrder__customer_id"])
+        state["_PurchaseOrder__payment_method"] = sys.intern(state["_PurchaseOrder__payment_method"])
+        set_slot_state(self, state)
+
     # String version for summaries
     def __str__(self):
         ticket_names = ', '.join([ticket.get_name() for ticket in self.__tickets])
+        # One block per ticket, shown as its first and last seat: "Stand:R3:S1-S5"
+        seats = ', '.join(f"{ids[0]}-{ids[-1].rsplit(':', 1)[1]}"
+                          for ids in (line.get_seat_ids() for line in self.__tickets) if ids)
         return (f"Order ID: {self.__order_id[:8]} | "
                 f"Tickets: {ticket_names} | "
-                f"Total: AED {self.__total_price} | "
+                + (f"Seats: {seats} | " if seats else "") +
+                f"Total: {format_aed(self.__total_fils)} | "
                 f"Payment: {self.__payment_method} | "
                 f"Time: {self.__purchase_time.strftime('%Y-%m-%d %H:%M')}")
+
+
+def _to_lines(tickets, total_fils, legacy_order_id=None, seat_ids=None, list_prices_fils=None):
+    # Full Ticket objects are replaced by OrderLines. The order total is split
+    # over them in proportion to list price so line prices add up to the total.
+    # Legacy orders embedded the shared catalog Ticket, whose id is not unique per
+    # sale, so their lines get a stable id derived from the order id instead.
+    if all(isinstance(t, OrderLine) for t in tickets):
+        return list(tickets)
+    list_prices = list_prices_fils or [t.get_price_fils() for t in tickets]
+    paid = _split_fils(total_fils, list_prices)
+    lines = []
+    for position, (ticket, price_fils) in enumerate(zip(tickets, paid)):
+        if isinstance(ticket, OrderLine):
+            lines.append(ticket)
+            continue
+        ticket_id = None
+        if legacy_order_id is not None:
+            ticket_id = str(uuid.uuid5(uuid.UUID(legacy_order_id), str(position)))
+        seats = seat_ids[position] if seat_ids else ()
+        entry = entry_for_ticket(ticket, None if list_prices_fils is None else list_prices[position])
+        lines.append(OrderLine(entry, price_fils, ticket_id, seats))
+    return lines
+
+
+def _split_fils(total_fils, weights):
+    if not weights:
+        return []
+    weight_sum = sum(weights)
+    if weight_sum == 0:
+        weights, weight_sum = [1] * len(weights), len(weights)
+    shares = [total_fils * w // weight_sum for w in weights]
+    shares[-1] += total_fils - sum(shares)  # rounding remainder goes to the last line
+    return shares
+
+
+# Exact revenue across any number of orders, in fils
+def total_revenue_fils(orders):
+    return sum(order.get_total_fils() for order in orders)
+
+
+# ----------------------------------------
+# PAGING (purchase history views)
+# ----------------------------------------
+ORDER_SORT_KEYS = {
+    "date": lambda o: o.get_purchase_time(),
+    "total": lambda o: o.get_total_fils(),
+    "payment_method": lambda o: o.get_payment_method(),
+    "ticket_type": lambda o: o.get_tickets()[0].get_name() if o.get_tickets() else "",
+}
+
+
+def page_orders(orders, page=0, page_size=50, sort_by="date", descending=True,
+                ticket_type=None, payment_method=None):
+    # Returns (orders on that page, total matching orders). `orders` must be in
+    # purchase order (as histories are), so the default newest-first view is a
+    # plain slice and costs O(page_size) however long the history is.
+    if sort_by not in ORDER_SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort_by}")
+    start = page * page_size
+    if ticket_type is None and payment_method is None and sort_by == "date":
+        total = len(orders)
+        if descending:
+            end = total - start
+            return list(reversed(orders[max(end - page_size, 0):max(end, 0)])), total
+        return list(orders[start:start + page_size]), total
+
+    matching = [o for o in orders
+                if (payment_method is None or o.get_payment_method() == payment_method)
+                and (ticket_type is None or any(t.get_name() == ticket_type for t in o.get_tickets()))]
+    matching.sort(key=ORDER_SORT_KEYS[sort_by], reverse=descending)
+    return matching[start:start + page_size], len(matching)
@@ -0,0 +1,388 @@
+# record_codec.py
+# Schema-versioned binary encoding for stored records (users, orders, discounts,
+# tickets), used instead of pickle. Decoding only ever builds the classes
+# registered below, so a tampered data file cannot run code the way a pickle can.
+#
+# Every value starts with a one-byte tag. Model objects are written as
+#   RECORD, schema code (u16), schema version (u16), tuple of field values
+# and older versions are upgraded through the schema's migrations on load.
+
+import struct
+from datetime import datetime, timedelta
+
+from customer import Customer
+from admin import Admin
+from discount import Discount
+from ticket import Ticket
+from ticket_types import SingleRaceTicket, WeekendPackage, SeasonPass, GroupDiscountTicket
+from ticket_catalog import CatalogEntry, catalog_entry
+from purchase_order import PurchaseOrder, OrderLine
+
+MAGIC = b"\xc1\x01"  # first bytes of every dumps() result (format 1)
+
+(_NONE, _TRUE, _FALSE, _INT, _BIGINT, _FLOAT, _STR, _SHORT_STR, _BYTES,
+ _LIST, _TUPLE, _DICT, _DATETIME, _RECORD, _REF, _SHARED_RECORD) = range(16)
+
+_I64 = struct.Struct(">q")
+_F64 = struct.Struct(">d")
+_U32 = struct.Struct(">I")
+_RECORD_HEAD = struct.Struct(">BHH")  # tag, schema code, schema version
+_CODE_VERSION = struct.Struct(">HH")
+_SHARED_HEAD = struct.Struct(">HHI")  # schema code, schema version, body length
+_I64_MIN, _I64_MAX = -(1 << 63), (1 << 63) - 1
+_EPOCH = datetime(1, 1, 1)
+_SHARED_CACHE_SIZE = 4096
+_shared_values = {}  # (code, version, encoded body) -> decoded shared object
+_shared_bodies = {}  # shared object -> its encoded head + body
+
+
+# ----------------------------------------
+# SCHEMAS
+# ----------------------------------------
+# Field kinds in a record layout:
+#   "s" str (or None)   "i" int (64-bit)   "b" bool   "t" naive datetime
+#   "v" any value (tagged, may hold other records)
+# Numbers and string lengths of a record are packed into one struct, followed
+# by the string bytes, then the "v" fields.
+_FIXED_CODES = {"s": "i", "i": "q", "b": "?", "t": "q"}
+
+
+class _Layout:
+    def __init__(self, kinds):
+        self.kinds = kinds
+        self.fixed = struct.Struct(">" + "".join(_FIXED_CODES[k] for k in kinds if k != "v"))
+        self.any_positions = [i for i, k in enumerate(kinds) if k == "v"]
+        self.__encoder = None
+        self.__decoder = None
+
+    def encode(self, values, out, shared):
+        if self.__encoder is None:
+            self.__encoder = self.__compile_encoder()
+        self.__encoder(values, out, shared)
+
+    def decode(self, data, pos, shared):
+        if self.__decoder is None:
+            self.__decoder = self.__compile_decoder()
+        return self.__decoder(data, pos, shared)
+
+    def __compile_encoder(self):
+        # Straight-line encoder for this layout (generated once, see __compile_decoder)
+        names = [f"v{i}" for i in range(len(self.kinds))]
+        lines = ["def encode(values, out, shared):",
+                 f"    {', '.join(names)}, = values"]
+        fixed, strings = [], []
+        for i, kind in enumerate(self.kinds):
+            if kind == "s":
+                lines.append(f"    b{i} = None if v{i} is None else v{i}.encode('utf-8')")
+                fixed.append(f"-1 if b{i} is None else len(b{i})")
+                strings.append(i)
+            elif kind == "t":
+                fixed.append(f"micros(v{i})")
+            elif kind != "v":
+                fixed.append(f"v{i}")
+        lines.append(f"    out += pack({', '.join(fixed)})")
+        for i in strings:
+            lines.append(f"    if b{i} is not None:")
+            lines.append(f"        out += b{i}")
+        for i in self.any_positions:
+            lines.append(f"    encode_any(v{i}, out, shared)")
+        namespace = {"pack": self.fixed.pack, "micros": _micros, "encode_any": _encode}
+        exec("\n".join(lines), namespace)
+        return namespace["encode"]
+
+    def __compile_decoder(self):
+        # Straight-line decoder for this layout (like collections.namedtuple,
+        # generated once): one struct unpack, then each field without a loop
+        fixed_names = [f"f{i}" for i, k in enumerate(self.kinds) if k != "v"]
+        lines = ["def decode(data, pos, shared):"]
+        if fixed_names:
+            lines.append(f"    {', '.join(fixed_names)}, = unpack_from(data, pos)")
+            lines.append(f"    pos += {self.fixed.size}")
+        for i, kind in enumerate(self.kinds):
+            if kind == "s":
+                lines.append(f"    if f{i} < 0:")
+                lines.append(f"        v{i} = None")
+                lines.append("    else:")
+                lines.append(f"        v{i} = str(data[pos:pos + f{i}], 'utf-8')")
+                lines.append(f"        pos += f{i}")
+            elif kind == "t":
+                lines.append(f"    v{i} = EPOCH + timedelta(microseconds=f{i})")
+            elif kind != "v":
+                lines.append(f"    v{i} = f{i}")
+        for i in self.any_positions:
+            lines.append(f"    v{i}, pos = decode_any(data, pos, shared)")
+        lines.append(f"    return [{', '.join(f'v{i}' for i in range(len(self.kinds)))}], pos")
+        namespace = {"unpack_from": self.fixed.unpack_from, "EPOCH": _EPOCH,
+                     "timedelta": timedelta, "decode_any": _decode}
+        exec("\n".join(lines), namespace)
+        return namespace["decode"]
+
+
+class Schema:
+    """
+    How one model class is stored: a fixed tuple of typed field values.
+    To change the fields, bump version, give the new layout, and register the
+    old layout with a migration (old fields tuple in, next version's out).
+    """
+
+    def __init__(self, code, cls, version, kinds, fields, build, shared=False):
+        self.code = code
+        self.cls = cls
+        self.version = version
+        self.layout = _Layout(kinds)
+        self.fields = fields  # obj -> tuple of values matching kinds
+        self.build = build  # tuple of values -> obj
+        self.shared = shared  # few distinct values (catalog entries): referenced within a
+                              # dumps() call, and decoded once per distinct body
+        self.__old_layouts = {}  # version -> _Layout
+        self.__migrations = {}  # version -> function(fields) -> fields of version + 1
+
+    def add_migration(self, old_version, old_kinds, migrate):
+        self.__old_layouts[old_version] = _Layout(old_kinds)
+        self.__migrations[old_version] = migrate
+
+    def layout_for(self, version):
+        if version == self.version:
+            return self.layout
+        layout = self.__old_layouts.get(version)
+        if layout is None:
+            raise ValueError(f"Unknown {self.cls.__name__} schema v{version}")
+        return layout
+
+    def upgrade(self, fields, version):
+        while version < self.version:
+            fields = self.__migrations[version](fields)
+            version += 1
+        return fields
+
+
+_SCHEMAS_BY_TYPE = {}
+_SCHEMAS_BY_CODE = {}
+
+
+def register_schema(schema):
+    _SCHEMAS_BY_TYPE[schema.cls] = schema
+    _SCHEMAS_BY_CODE[schema.code] = schema
+    return schema
+
+
+def get_schema(cls):
+    return _SCHEMAS_BY_TYPE[cls]
+
+
+def _slot_schema(code, cls, names, kinds, version=1):
+    # Classes persisted through their slot state (__setstate__ rebuilds runtime fields)
+    def fields(obj):
+        return tuple(getattr(obj, name) for name in names)
+
+    def build(values):
+        obj = cls.__new__(cls)
+        obj.__setstate__(dict(zip(names, values)))
+        return obj
+
+    return register_schema(Schema(code, cls, version, kinds, fields, build))
+
+
+_USER_FIELDS = ("_User__user_id", "_User__name", "_User__email", "_User__password", "_User__created_at")
+_TICKET_FIELDS = ("_Ticket__ticket_id", "_Ticket__name", "_Ticket__price_fils",
+                  "_Ticket__validity", "_Ticket__features")
+
+register_schema(Schema(
+    1, CatalogEntry, 2, "ssvii",
+    lambda e: (e.get_name(), e.get_validity(), e.get_features(), e.get_list_price_fils(), e.get_admits()),
+    lambda v: catalog_entry(*v), shared=True)).add_migration(1, "ssvi", lambda v: v + (None,))  # v1: no admits
+register_schema(Schema(
+    2, OrderLine, 2, "visv",
+    lambda line: line.__getstate__()[1:],  # (entry, price_fils, ticket_id, seat_ids)
+    lambda v: OrderLine(*v))).add_migration(1, "vis", lambda v: v + ((),))  # v1: before seating
+register_schema(Schema(
+    3, PurchaseOrder, 1, "ssvist",
+    lambda order: order.__getstate__()[1:],  # (order_id, customer_id, lines, total_fils, method, time)
+    lambda v: PurchaseOrder.restore(*v)))
+_slot_schema(4, Customer, _USER_FIELDS + ("_Customer__purchase_history",), "ssssvv")
+_slot_schema(5, Admin, _USER_FIELDS + ("_Admin__admin_id",), "ssssvs")
+_slot_schema(6, Discount, ("_Discount__name", "_Discount__percentage", "_Discount__ticket_type",
+                           "_Discount__active", "_Discount__starts_at", "_Discount__ends_at",
+                           "_Discount__max_uses", "_Discount__per_customer_limit",
+                           "_Discount__uses", "_Discount__customer_uses"), "svsbvvvviv", version=2) \
+    .add_migration(1, "svsb", lambda v: v + (None, None, None, None, 0, {}))  # v1: no schedule or caps
+_slot_schema(7, Ticket, _TICKET_FIELDS, "ssisv")
+_slot_schema(8, SingleRaceTicket, _TICKET_FIELDS, "ssisv")
+_slot_schema(9, WeekendPackage, _TICKET_FIELDS, "ssisv")
+_slot_schema(10, SeasonPass, _TICKET_FIELDS, "ssisv")
+_slot_schema(11, GroupDiscountTicket, _TICKET_FIELDS + ("_GroupDiscountTicket__group_size",), "ssisvi")
+
+
+# ----------------------------------------
+# ENCODING
+# ----------------------------------------
+def dumps(value):
+    out = bytearray(MAGIC)
+    _encode(value, out, {})
+    return bytes(out)
+
+
+def _encode(value, out, shared):
+    kind = type(value)
+    if kind is str:
+        data = value.encode("utf-8")
+        if len(data) < 256:
+            out.append(_SHORT_STR)
+            out.append(len(data))
+        else:
+            out.append(_STR)
+            out += _U32.pack(len(data))
+        out += data
+    elif kind is int:
+        if _I64_MIN <= value <= _I64_MAX:
+            out.append(_INT)
+            out += _I64.pack(value)
+        else:
+            out.append(_BIGINT)
+            _encode(str(value), out, shared)
+    elif value is None:
+        out.append(_NONE)
+    elif kind is bool:
+        out.append(_TRUE if value else _FALSE)
+    elif kind is list or kind is tuple:
+        out.append(_LIST if kind is list else _TUPLE)
+        out += _U32.pack(len(value))
+        for item in value:
+            _encode(item, out, shared)
+    elif kind is dict:
+        out.append(_DICT)
+        out += _U32.pack(len(value))
+        for key, item in value.items():
+            _encode(key, out, shared)
+            _encode(item, out, shared)
+    elif kind is float:
+        out.append(_FLOAT)
+        out += _F64.pack(value)
+    elif kind is datetime:
+        out.append(_DATETIME)
+        out += _I64.pack(_micros(value))
+    elif kind is bytes:
+        out.append(_BYTES)
+        out += _U32.pack(len(value))
+        out += value
+    else:
+        schema = _SCHEMAS_BY_TYPE.get(kind)
+        if schema is None:
+            raise TypeError(f"No storage schema for {kind.__name__}")
+        if schema.shared:
+            index = shared.get(id(value))
+            if index is not None:
+                out.append(_REF)
+                out += _U32.pack(index)
+                return
+            shared[id(value)] = len(shared)
+            encoded = _shared_bodies.get(value)
+            if encoded is None:
+                body = bytearray()
+                schema.layout.encode(schema.fields(value), body, [])
+                encoded = _SHARED_HEAD.pack(schema.code, schema.version, len(body)) + body
+                if len(_shared_bodies) >= _SHARED_CACHE_SIZE:
+                    _shared_bodies.clear()
+                _shared_bodies[value] = encoded
+            out.append(_SHARED_RECORD)
+            out += encoded
+            return
+        out += _RECORD_HEAD.pack(_RECORD, schema.code, schema.version)
+        schema.layout.encode(schema.fields(value), out, shared)
+
+
+def _micros(value):
+    if value.tzinfo is not None:
+        raise TypeError("Only naive datetimes are stored")
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+# ----------------------------------------
+# DECODING
+# ----------------------------------------
+def is_encoded(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def loads(data):
+    # Raises ValueError for anything that is not a well-formed encoded value
+    if not is_encoded(data):
+        raise ValueError("Not an encoded record")
+    try:
+        value, end = _decode(data, len(MAGIC), [])
+    except (IndexError, KeyError, TypeError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Corrupt record: {e}") from e
+    if end != len(data):
+        raise ValueError("Corrupt record: trailing bytes")
+    return value
+
+
+def _decode(data, pos, shared):
+    tag = data[pos]
+    pos += 1
+    if tag == _SHORT_STR:
+        end = pos + 1 + data[pos]
+        return str(data[pos + 1:end], "utf-8"), end
+    if tag == _INT:
+        return _I64.unpack_from(data, pos)[0], pos + 8
+    if tag == _LIST or tag == _TUPLE:
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(count):
+            item, pos = _decode(data, pos, shared)
+            items.append(item)
+        return (items if tag == _LIST else tuple(items)), pos
+    if tag == _RECORD:
+        code, version = _CODE_VERSION.unpack_from(data, pos)
+        return _decode_record(_SCHEMAS_BY_CODE[code], version, data, pos + 4, shared)
+    if tag == _SHARED_RECORD:
+        code, version, length = _SHARED_HEAD.unpack_from(data, pos)
+        pos += _SHARED_HEAD.size
+        key = (code, version, data[pos:pos + length])
+        obj = _shared_values.get(key)
+        if obj is None:
+            obj = _decode_record(_SCHEMAS_BY_CODE[code], version, data, pos, [])[0]
+            if len(_shared_values) >= _SHARED_CACHE_SIZE:
+                _shared_values.clear()
+            _shared_values[key] = obj
+        shared.append(obj)
+        return obj, pos + length
+    if tag == _REF:
+        return shared[_U32.unpack_from(data, pos)[0]], pos + 4
+    if tag == _DATETIME:
+        return _EPOCH + timedelta(microseconds=_I64.unpack_from(data, pos)[0]), pos + 8
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _FLOAT:
+        return _F64.unpack_from(data, pos)[0], pos + 8
+    if tag == _STR:
+        end = pos + 4 + _U32.unpack_from(data, pos)[0]
+        return str(data[pos + 4:end], "utf-8"), end
+    if tag == _BYTES:
+        end = pos + 4 + _U32.unpack_from(data, pos)[0]
+        return bytes(data[pos + 4:end]), end
+    if tag == _DICT:
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        result = {}
+        for _ in range(count):
+            key, pos = _decode(data, pos, shared)
+            result[key], pos = _decode(data, pos, shared)
+        return result, pos
+    if tag == _BIGINT:
+        text, pos = _decode(data, pos, shared)
+        return int(text), pos
+    raise ValueError(f"Unknown tag {tag}")
+
+
+def _decode_record(schema, version, data, pos, shared):
+    fields, pos = schema.layout_for(version).decode(data, pos, shared)
+    if version != schema.version:
+        fields = schema.upgrade(tuple(fields), version)
+    return schema.build(fields), pos
@@ -0,0 +1,137 @@
+# sales_analytics.py
+# Incrementally maintained sales aggregates: per day x ticket type x payment method,
+# plus week / month / season rollups, so reports never rescan raw orders.
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+PERIODS = ("day", "week", "month", "season")
+
+# Position of each measure inside a cell
+COUNT, GROSS, DISCOUNT, NET = range(4)
+
+
+def period_key(day, period):
+    # day: datetime.date; returns the bucket label for that period
+    if period == "day":
+        return day.isoformat()
+    if period == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "month":
+        return f"{day.year}-{day.month:02d}"
+    if period == "season":
+        return str(day.year)  # one championship season per calendar year
+    raise ValueError(f"Unknown period: {period}")
+
+
+def _as_totals(cell):
+    return {"count": cell[COUNT], "gross_fils": cell[GROSS],
+            "discount_fils": cell[DISCOUNT], "net_fils": cell[NET]}
+
+
+class SalesAnalytics:
+    """
+    Aggregate store updated on every purchase, edit and deletion. Each cell
+    holds [count, gross, discount given, net] in integer fils.
+    """
+
+    def __init__(self):
+        # key: period name, value: {period label: {(ticket_type, payment_method): cell}}
+        self.__buckets = {period: {} for period in PERIODS}
+        self.__labels = {period: [] for period in PERIODS}  # sorted labels, for range queries
+
+    @classmethod
+    def from_orders(cls, orders):
+        analytics = cls()
+        for order in orders:
+            analytics.record_order(order)
+        return analytics
+
+    # ---------- Updates ----------
+    def record_order(self, order):
+        self.__apply(order, 1)
+
+    def remove_order(self, order):
+        self.__apply(order, -1)
+
+    def replace_order(self, old_order, new_order):
+        self.__apply(old_order, -1)
+        self.__apply(new_order, 1)
+
+    def add_cell(self, day, ticket_type, payment_method, cell):
+        # Add pre-summed [count, gross, discount, net] for one day (e.g. from order_archive)
+        for period in PERIODS:
+            self.__add(period, period_key(day, period), (ticket_type, payment_method), tuple(cell))
+
+    def __apply(self, order, sign):
+        day = order.get_purchase_time().date()
+        method = order.get_payment_method()
+        for line in order.get_tickets():
+            net = line.get_price_fils()
+            gross = line.get_type_entry().get_list_price_fils()
+            delta = (sign, sign * gross, sign * (gross - net), sign * net)
+            for period in PERIODS:
+                self.__add(period, period_key(day, period), (line.get_name(), method), delta)
+
+    def __add(self, period, label, key, delta):
+        cells = self.__buckets[period].get(label)
+        if cells is None:
+            cells = self.__buckets[period][label] = {}
+            insort(self.__labels[period], label)
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, 0, 0, 0]
+        for i in range(4):
+            cell[i] += delta[i]
+        if cell[COUNT] == 0:
+            del cells[key]
+            if not cells:
+                del self.__buckets[period][label]
+                labels = self.__labels[period]
+                labels.pop(bisect_left(labels, label))
+
+    # ---------- Queries ----------
+    def __labels_between(self, period, start, end):
+        labels = self.__labels[period]
+        lo = 0 if start is None else bisect_left(labels, start)
+        hi = len(labels) if end is None else bisect_right(labels, end)
+        return labels[lo:hi]
+
+    def rollup(self, period="day", start=None, end=None, ticket_type=None, payment_method=None):
+        # {period label: totals} for labels in [start, end] (inclusive, same label format)
+        result = {}
+        for label in self.__labels_between(period, start, end):
+            total = [0, 0, 0, 0]
+            for (t_type, method), cell in self.__buckets[period][label].items():
+                if ticket_type is not None and t_type != ticket_type:
+                    continue
+                if payment_method is not None and method != payment_method:
+                    continue
+                for i in range(4):
+                    total[i] += cell[i]
+            if total[COUNT]:
+                result[label] = _as_totals(total)
+        return result
+
+    def breakdown(self, start=None, end=None, by="ticket_type"):
+        # Totals per ticket type (or per payment method) over days [start, end]
+        index = 0 if by == "ticket_type" else 1
+        totals = {}
+        for label in self.__labels_between("day", start, end):
+            for key, cell in self.__buckets["day"][label].items():
+                total = totals.setdefault(key[index], [0, 0, 0, 0])
+                for i in range(4):
+                    total[i] += cell[i]
+        return {name: _as_totals(total) for name, total in totals.items()}
+
+    def totals(self, start=None, end=None, ticket_type=None, payment_method=None):
+        total = {"count": 0, "gross_fils": 0, "discount_fils": 0, "net_fils": 0}
+        for day_totals in self.rollup("day", start, end, ticket_type, payment_method).values():
+            for name in total:
+                total[name] += day_totals[name]
+        return total
+
+    def season_totals(self, season=None):
+        label = str(season if season is not None else date.today().year)
+        return self.rollup("season", label, label).get(label, _as_totals([0, 0, 0, 0]))
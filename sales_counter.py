@@ -0,0 +1,116 @@
+# sales_counter.py
+# Daily ticket-sale counters kept in memory and written behind to storage in batches.
+
+import threading
+from datetime import datetime
+
+
+class SalesCounter:
+    """
+    The single source of truth for "tickets sold per day". record() only adds
+    to an in-memory delta per day; the deltas are added to the stored counts
+    (DataManager.add_sales) when flush_size sales are pending or flush_interval
+    seconds have passed (and on flush()/close()). Adding instead of rewriting
+    the counts lets several processes share one database. With a writer
+    (BackgroundWriter) the flush runs on its thread, not in record().
+    A crash can still lose the unflushed batch; reconcile() repairs that from
+    the stored orders.
+    """
+
+    def __init__(self, dm=None, flush_interval=5.0, flush_size=100, writer=None):
+        self.__dm = dm  # None keeps the counts in memory only
+        self.__flush_interval = flush_interval
+        self.__flush_size = flush_size
+        self.__writer = writer
+        self.__lock = threading.Lock()
+        self.__deltas = {}  # day -> tickets not yet added to storage (all of them without a dm)
+        self.__pending = 0  # sales recorded since the last successful flush
+        self.__last_error = None  # why the last background flush failed, if it did
+        self.__timer = None
+        self.__closed = False
+        self.__schedule()
+
+    def set_writer(self, writer):
+        self.__writer = writer
+
+    # ---------- Recording ----------
+    def record(self, quantity=1, day=None):
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        with self.__lock:
+            self.__deltas[day] = self.__deltas.get(day, 0) + quantity
+            self.__pending += abs(quantity)
+            due = self.__dm is not None and self.__pending >= self.__flush_size
+        if due:  # the timer covers flush_interval
+            self.__flush_in_background()
+
+    def get_counts(self):
+        # Stored counts (every process's flushed sales) plus this one's unflushed deltas
+        with self.__lock:
+            counts = dict(self.__dm.load_sales() or {}) if self.__dm is not None else {}
+            for day, delta in self.__deltas.items():
+                counts[day] = counts.get(day, 0) + delta
+            return counts
+
+    def reconcile(self, recounted):
+        # recounted: {day: tickets in the stored orders}. Sales lost in a crash are
+        # still in the orders, so a day stored with fewer is raised to that;
+        # cancelled orders are not, so the stored count wins wherever it is higher.
+        # Call it while no sale is being recorded, as it counts every pending one.
+        if self.__dm is None:
+            return
+        self.flush()
+        self.__dm.raise_sales(recounted)
+
+    def get_pending(self):
+        return self.__pending
+
+    def get_last_error(self):
+        return self.__last_error
+
+    # ---------- Persistence ----------
+    def flush(self):
+        with self.__lock:
+            if self.__dm is None or not self.__deltas:
+                self.__pending = 0
+                return
+            # Added under the lock so get_counts() never sees a batch both stored and
+            # pending; the deltas are only cleared once the write went through
+            self.__dm.add_sales({day: delta for day, delta in self.__deltas.items() if delta})
+            self.__deltas = {}
+            self.__pending = 0
+            self.__last_error = None
+
+    def __flush_in_background(self):
+        # record() and the timer: on the writer thread when there is one. Repeated
+        # requests collapse into one queued flush; a failed one stays pending.
+        if self.__writer is not None:
+            try:
+                self.__writer.submit("sales-counter-flush", self.__flush_quietly)
+                return
+            except RuntimeError:
+                pass  # writer already closed: flush here
+        self.__flush_quietly()
+
+    def __flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            self.__last_error = e
+
+    def close(self):
+        self.__closed = True
+        if self.__timer is not None:
+            self.__timer.cancel()
+        self.flush()
+
+    def __schedule(self):
+        # Background timer so a quiet period still gets its sales written
+        if self.__dm is None or not self.__flush_interval or self.__closed:
+            return
+        self.__timer = threading.Timer(self.__flush_interval, self.__on_timer)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def __on_timer(self):
+        self.__flush_in_background()
+        self.__schedule()
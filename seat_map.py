@@ -0,0 +1,329 @@
+# seat_map.py
+# Assigned seating per venue section. Group tickets promise adjacent seats, so
+# a sale holds one block of consecutive seats in a single row per ticket.
+# The search runs on an in-memory index; SQLite (the inventory database) keeps
+# the blocks, so seats survive restarts and processes cannot double-sell.
+
+import sqlite3
+import threading
+import time
+import heapq
+
+from inventory import ImmediateTransaction
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seat_sections (
+    section TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    seats_per_row INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seat_blocks (
+    section TEXT NOT NULL,
+    row_no INTEGER NOT NULL,
+    seat_from INTEGER NOT NULL,
+    seat_count INTEGER NOT NULL,
+    hold_id TEXT NOT NULL,
+    expires_at REAL,  -- NULL once sold
+    PRIMARY KEY (section, row_no, seat_from)
+);
+CREATE INDEX IF NOT EXISTS idx_seat_blocks_hold ON seat_blocks(hold_id);
+CREATE INDEX IF NOT EXISTS idx_seat_blocks_expiry ON seat_blocks(expires_at);
+"""
+
+
+def seat_id(section, row, seat):
+    # Row and seat are 0-based inside the index, 1-based on the ticket
+    return f"{section}:R{row + 1}:S{seat + 1}"
+
+
+def parse_seat_id(value):
+    section, row, seat = value.rsplit(":", 2)
+    return section, int(row[1:]) - 1, int(seat[1:]) - 1
+
+
+class SeatSection:
+    """
+    Seat index for one section: a bytearray per row (0 free, 1 taken) plus
+    every maximal run of free seats, bucketed by length. A bitmask of the
+    non-empty buckets gives the shortest run that fits n seats in O(1), so
+    the search cost does not grow with the venue or its fragmentation.
+    """
+
+    def __init__(self, name, rows, seats_per_row):
+        if rows < 1 or seats_per_row < 1:
+            raise ValueError("A section needs at least one row and one seat")
+        self.__name = name
+        self.__seats_per_row = seats_per_row
+        self.__rows = [bytearray(seats_per_row) for _ in range(rows)]
+        self.__run_at = [{0: seats_per_row} for _ in range(rows)]  # per row: start -> length
+        self.__run_ending = [{seats_per_row: 0} for _ in range(rows)]  # per row: end -> start
+        self.__buckets = [{} for _ in range(seats_per_row + 1)]  # length -> {(row, start): None}
+        self.__buckets[seats_per_row] = dict.fromkeys((row, 0) for row in range(rows))
+        self.__mask = 1 << seats_per_row  # bit L set while some run has length L
+        self.__free = rows * seats_per_row
+
+    def get_name(self):
+        return self.__name
+
+    def get_shape(self):
+        return len(self.__rows), self.__seats_per_row
+
+    def get_free(self):
+        return self.__free
+
+    def get_largest_block(self):
+        return self.__mask.bit_length() - 1
+
+    def get_run_count(self):
+        # Number of separate free runs; higher means more fragmented
+        return sum(len(runs) for runs in self.__run_at)
+
+    # ---------- Search ----------
+    def find(self, count):
+        # (row, start) of the best-fitting free block of count seats, or None
+        if count < 1 or count > self.__seats_per_row:
+            return None
+        fits = self.__mask >> count
+        if not fits:
+            return None
+        length = count + (fits & -fits).bit_length() - 1
+        return next(iter(self.__buckets[length]))
+
+    def is_free(self, row, start, count):
+        return self.__rows[row].find(1, start, start + count) == -1
+
+    def is_taken(self, row, start, count):
+        return self.__rows[row].find(0, start, start + count) == -1
+
+    # ---------- Updates ----------
+    def take(self, row, start, count):
+        # Marks seats taken; they must all be free
+        if not self.is_free(row, start, count):
+            raise ValueError("Seats are already taken.")
+        run_start = self.__rows[row].rfind(1, 0, start) + 1
+        run_length = self.__run_at[row][run_start]
+        self.__remove_run(row, run_start, run_length)
+        if start > run_start:
+            self.__add_run(row, run_start, start - run_start)
+        end, run_end = start + count, run_start + run_length
+        if run_end > end:
+            self.__add_run(row, end, run_end - end)
+        self.__rows[row][start:end] = b"\x01" * count
+        self.__free -= count
+
+    def free(self, row, start, count):
+        # Gives taken seats back, merging with free runs on either side
+        if not self.is_taken(row, start, count):
+            raise ValueError("Seats are not taken.")
+        self.__rows[row][start:start + count] = bytes(count)
+        self.__free += count
+        end = start + count
+        left = self.__run_ending[row].get(start)
+        if left is not None:
+            self.__remove_run(row, left, start - left)
+            start = left
+        right = self.__run_at[row].get(end)
+        if right is not None:
+            self.__remove_run(row, end, right)
+            end += right
+        self.__add_run(row, start, end - start)
+
+    def __add_run(self, row, start, length):
+        self.__run_at[row][start] = length
+        self.__run_ending[row][start + length] = start
+        self.__buckets[length][(row, start)] = None
+        self.__mask |= 1 << length
+
+    def __remove_run(self, row, start, length):
+        del self.__run_at[row][start]
+        del self.__run_ending[row][start + length]
+        bucket = self.__buckets[length]
+        del bucket[(row, start)]
+        if not bucket:
+            self.__mask &= ~(1 << length)
+
+
+class SeatMap:
+    """
+    Sections of numbered seats and which ticket types sit in them. hold()
+    finds and takes one adjacent block per ticket for a checkout hold id;
+    commit() keeps them, release() (or the hold expiring) frees them.
+    Seats freed by another process become available here after a restart.
+    """
+
+    def __init__(self, path="inventory.db", hold_seconds=600):
+        self.__path = path
+        self.__hold_seconds = hold_seconds
+        self.__lock = threading.RLock()
+        self.__conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.executescript(_SCHEMA)
+        self.__sections = {}  # name -> SeatSection, loaded from the database on first use
+        self.__assignments = {}  # ticket type -> (section, seats per ticket)
+        self.__holds = {}  # hold_id -> [(section, row, start, count)] not yet committed
+        self.__expiries = []  # heap of (expires_at, hold_id)
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+    # ---------- Configuration ----------
+    def add_section(self, name, rows, seats_per_row):
+        # Keeps the stored shape if the section already exists
+        with self.__lock, self.__transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO seat_sections VALUES (?, ?, ?)", (name, rows, seats_per_row))
+
+    def assign(self, ticket_type, section, seats_per_ticket=1):
+        self.__assignments[ticket_type] = (section, seats_per_ticket)
+
+    def get_assignment(self, ticket_type):
+        return self.__assignments.get(ticket_type)
+
+    def get_section(self, name):
+        with self.__lock:
+            return self.__section(name)
+
+    def __section(self, name):
+        section = self.__sections.get(name)
+        if section is None:
+            shape = self.__conn.execute("SELECT rows, seats_per_row FROM seat_sections WHERE section = ?",
+                                        (name,)).fetchone()
+            if shape is None:
+                raise ValueError(f"Unknown section: {name}")
+            section = SeatSection(name, *shape)
+            now = time.time()
+            for row, start, count, hold_id, expires_at in self.__conn.execute(
+                    "SELECT row_no, seat_from, seat_count, hold_id, expires_at FROM seat_blocks WHERE section = ?",
+                    (name,)):
+                if expires_at is not None and expires_at < now:
+                    continue  # expired hold, deleted by the next purge
+                section.take(row, start, count)
+            self.__sections[name] = section
+        return section
+
+    # ---------- Hold / Commit / Release ----------
+    def hold(self, hold_id, ticket_type, quantity=1):
+        # One block of adjacent seats per ticket, all or nothing. Returns a tuple
+        # of seat ids per ticket ([] for ticket types without assigned seating).
+        assignment = self.__assignments.get(ticket_type)
+        if assignment is None:
+            return []
+        name, per_ticket = assignment
+        with self.__lock:
+            self.__purge_expired()
+            section = self.__section(name)
+            expires_at = time.time() + self.__hold_seconds
+            blocks = []
+            try:
+                with self.__transaction() as conn:
+                    # Holds abandoned by any process stop counting once expired
+                    conn.execute("DELETE FROM seat_blocks WHERE expires_at < ?", (time.time(),))
+                    for _ in range(quantity):
+                        blocks.append(self.__claim(conn, section, per_ticket, hold_id, expires_at))
+            except Exception:
+                for _, row, start, count in blocks:
+                    section.free(row, start, count)  # the transaction was rolled back
+                raise
+            self.__holds.setdefault(hold_id, []).extend(blocks)
+            heapq.heappush(self.__expiries, (expires_at, hold_id))
+            return [self.__seat_ids(block) for block in blocks]
+
+    def __claim(self, conn, section, count, hold_id, expires_at):
+        name = section.get_name()
+        while True:
+            spot = section.find(count)
+            if spot is None:
+                raise ValueError(f"Not enough adjacent seats left in {name}.")
+            row, start = spot
+            # Another process may have taken seats our index still shows as free
+            taken = conn.execute(
+                "SELECT seat_from, seat_count FROM seat_blocks WHERE section = ? AND row_no = ? "
+                "AND seat_from < ? AND seat_from + seat_count > ?",
+                (name, row, start + count, start)).fetchall()
+            if not taken:
+                conn.execute("INSERT INTO seat_blocks VALUES (?, ?, ?, ?, ?, ?)",
+                             (name, row, start, count, hold_id, expires_at))
+                section.take(row, start, count)
+                return name, row, start, count
+            for other_start, other_count in taken:  # catch the index up, then search again
+                for seat in range(other_start, other_start + other_count):
+                    if section.is_free(row, seat, 1):
+                        section.take(row, seat, 1)
+
+    def commit(self, hold_id):
+        # Makes held seats permanent; returns their seat ids per ticket.
+        # Raises ValueError if the hold expired (its seats may be resold).
+        with self.__lock:
+            self.__purge_expired()
+            blocks = self.__holds.pop(hold_id, None)
+            if blocks is None:
+                raise ValueError("Seat reservation expired. Please try again.")
+            with self.__transaction() as conn:
+                conn.execute("UPDATE seat_blocks SET expires_at = NULL WHERE hold_id = ?", (hold_id,))
+            return [self.__seat_ids(block) for block in blocks]
+
+    def is_held(self, hold_id):
+        with self.__lock:
+            self.__purge_expired()
+            return hold_id in self.__holds
+
+    def release(self, hold_id):
+        with self.__lock:
+            blocks = self.__holds.pop(hold_id, None)
+            if blocks is None:
+                return False
+            self.__free_blocks(blocks)
+            return True
+
+    def release_seats(self, seat_ids):
+        # Frees sold seats (e.g. a deleted order); ids as returned by hold()/commit()
+        by_row = {}
+        for value in seat_ids:
+            section, row, seat = parse_seat_id(value)
+            by_row.setdefault((section, row), []).append(seat)
+        blocks = []
+        for (section, row), seats in by_row.items():
+            seats.sort()
+            start = previous = seats[0]
+            for seat in seats[1:] + [None]:
+                if seat != previous + 1:
+                    blocks.append((section, row, start, previous - start + 1))
+                    start = seat
+                previous = seat
+        with self.__lock:
+            self.__free_blocks(blocks)
+
+    def __free_blocks(self, blocks):
+        with self.__transaction() as conn:
+            for name, row, start, count in blocks:
+                conn.execute("DELETE FROM seat_blocks WHERE section = ? AND row_no = ? "
+                             "AND seat_from >= ? AND seat_from < ?", (name, row, start, start + count))
+        for name, row, start, count in blocks:
+            section = self.__sections.get(name)
+            if section is not None and section.is_taken(row, start, count):
+                section.free(row, start, count)
+
+    def __purge_expired(self):
+        now = time.time()
+        while self.__expiries and self.__expiries[0][0] < now:
+            _, hold_id = heapq.heappop(self.__expiries)
+            blocks = self.__holds.pop(hold_id, None)
+            if blocks is not None:
+                self.__free_blocks(blocks)
+
+    @staticmethod
+    def __seat_ids(block):
+        name, row, start, count = block
+        return tuple(seat_id(name, row, seat) for seat in range(start, start + count))
+
+    def __transaction(self):
+        return ImmediateTransaction(self.__conn)  # the overlap check and insert can't interleave
+
+    # ---------- Metrics ----------
+    def get_section_stats(self, name):
+        with self.__lock:
+            section = self.__section(name)
+            rows, seats_per_row = section.get_shape()
+            return {"seats": rows * seats_per_row, "free": section.get_free(),
+                    "largest_block": section.get_largest_block(), "free_runs": section.get_run_count()}
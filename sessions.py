@@ -0,0 +1,199 @@
+# sessions.py
+# Opaque login tokens for the HTTP API: the password is checked once at login,
+# after which every request is a dictionary lookup on its token. Server
+# processes that share a port also share their sessions through SQLite.
+
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_expiry ON sessions(expires_at);
+"""
+
+
+class SharedSessionStore:
+    """
+    Session rows in SQLite, so a token created by one process is valid in
+    every process using the same file. Expiry times are wall-clock seconds.
+    SessionManager serializes all calls, so one connection is enough.
+    """
+
+    def __init__(self, path="sessions.db"):
+        self.__conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.executescript(_SCHEMA)
+
+    def put(self, token, user_id, expires_at):
+        self.__conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (token, user_id, expires_at))
+
+    def get(self, token):
+        # (user_id, expires_at), or None for an unknown or revoked token
+        return self.__conn.execute("SELECT user_id, expires_at FROM sessions WHERE token = ?",
+                                   (token,)).fetchone()
+
+    def renew(self, token, expires_at):
+        self.__conn.execute("UPDATE sessions SET expires_at = MAX(expires_at, ?) WHERE token = ?",
+                            (expires_at, token))
+
+    def delete(self, token):
+        self.__conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def delete_user(self, user_id):
+        self.__conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def purge_expired(self, now):
+        self.__conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def close(self):
+        self.__conn.close()
+
+
+class SessionManager:
+    """
+    Maps random tokens to user ids. A session expires ttl seconds after it was
+    last used (each validate() renews it). At most max_sessions are kept; beyond
+    that the least recently used one is dropped. Because every use moves a
+    session to the end, the front of the table is always the next to expire.
+
+    With a SharedSessionStore the table becomes a cache of the shared rows
+    (use a wall clock such as time.time): an unknown token is looked up in
+    the store, and a cached one is checked against it again (and its renewed
+    expiry written back) at most every recheck_seconds. A session
+    revoked in another process therefore stops working here within
+    recheck_seconds, and evicting it from the cache does not end it.
+    """
+
+    def __init__(self, ttl=3600.0, max_sessions=100_000, clock=time.monotonic, store=None,
+                 recheck_seconds=5.0):
+        if ttl <= 0 or max_sessions < 1:
+            raise ValueError("ttl and max_sessions must be positive")
+        self.__ttl = ttl
+        self.__max_sessions = max_sessions
+        self.__clock = clock
+        self.__store = store
+        self.__recheck = recheck_seconds
+        # token -> [user_id, expires_at, next store check], least recently used first
+        self.__sessions = OrderedDict()
+        self.__tokens_by_user = {}  # user_id -> set of tokens, for revoke_user()
+        self.__lock = threading.Lock()
+        self.__expired = 0
+        self.__evicted = 0
+
+    # ---------- Sessions ----------
+    def create(self, user_id):
+        token = secrets.token_urlsafe(32)
+        with self.__lock:
+            now = self.__clock()
+            self.__purge_expired()
+            if self.__store is not None:
+                self.__store.put(token, user_id, now + self.__ttl)
+            self.__cache(token, user_id, now + self.__ttl, now)
+        return token
+
+    def validate(self, token):
+        # The session's user id, or None for an unknown, revoked or expired token
+        with self.__lock:
+            now = self.__clock()
+            session = self.__sessions.get(token)
+            checked = self.__store is not None and (session is None or session[2] <= now or session[1] <= now)
+            if checked:
+                session = self.__check_store(token, session, now)  # may be renewed elsewhere
+            if session is None:
+                return None
+            if session[1] <= now:
+                self.__drop(token)
+                if self.__store is not None:
+                    self.__store.delete(token)
+                self.__expired += 1
+                return None
+            session[1] = now + self.__ttl
+            self.__sessions.move_to_end(token)
+            if checked:
+                self.__store.renew(token, session[1])  # other processes see the renewal
+            return session[0]
+
+    def revoke(self, token):
+        with self.__lock:
+            if token in self.__sessions:
+                self.__drop(token)
+            if self.__store is not None:
+                self.__store.delete(token)
+
+    def revoke_user(self, user_id):
+        # Ends every session of one user (e.g. after a password change)
+        with self.__lock:
+            for token in list(self.__tokens_by_user.get(user_id, ())):
+                self.__drop(token)
+            if self.__store is not None:
+                self.__store.delete_user(user_id)
+
+    def close(self):
+        if self.__store is not None:
+            self.__store.close()
+
+    def __cache(self, token, user_id, expires_at, now):
+        # Called with the lock held
+        self.__sessions[token] = [user_id, expires_at, now + self.__recheck]
+        self.__tokens_by_user.setdefault(user_id, set()).add(token)
+        while len(self.__sessions) > self.__max_sessions:
+            self.__drop(next(iter(self.__sessions)))
+            self.__evicted += 1
+
+    def __check_store(self, token, session, now):
+        # Called with the lock held: the shared row decides whether the session still exists
+        row = self.__store.get(token)
+        if row is None:
+            if session is not None:
+                self.__drop(token)  # revoked by another process
+            return None
+        user_id, expires_at = row
+        if session is None:
+            self.__cache(token, user_id, expires_at, now)
+            return self.__sessions[token]
+        session[1] = max(session[1], expires_at)  # another process may have renewed it
+        session[2] = now + self.__recheck
+        return session
+
+    def __drop(self, token):
+        user_id = self.__sessions.pop(token)[0]
+        tokens = self.__tokens_by_user[user_id]
+        tokens.discard(token)
+        if not tokens:
+            del self.__tokens_by_user[user_id]
+
+    def __purge_expired(self):
+        # Amortized O(1) per create(): expired sessions are all at the front
+        now = self.__clock()
+        while self.__sessions:
+            token, (_, expires_at, _) = next(iter(self.__sessions.items()))
+            if expires_at > now:
+                break
+            self.__drop(token)
+            self.__expired += 1
+        if self.__store is not None:
+            self.__store.purge_expired(now)
+
+    # ---------- Metrics ----------
+    def get_ttl(self):
+        return self.__ttl
+
+    def get_max_sessions(self):
+        return self.__max_sessions
+
+    def get_stats(self):
+        with self.__lock:
+            return {"active": len(self.__sessions), "users": len(self.__tokens_by_user),
+                    "expired": self.__expired, "evicted": self.__evicted}
+
+    def __len__(self):
+        return len(self.__sessions)
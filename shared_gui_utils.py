@@ -9,3 +9,34 @@ def clear_screen(root):
     """
     for widget in root.winfo_children():
         widget.destroy()
+
+
+# ----------------------------------------
+# LOGOUT (FLUSH PENDING SAVES, THEN QUIT)
+# ----------------------------------------
+def logout(root, svc):
+    """
+    Waits for the background writer to finish queued saves before leaving
+    the main loop, so quitting right after a purchase or edit loses nothing.
+    """
+    svc.get_writer().flush()
+    root.quit()
+
+
+# ----------------------------------------
+# WAIT FOR BACKGROUND WORK (E.G. LOGIN CHECK)
+# ----------------------------------------
+def when_done(root, future, on_done, on_error, interval_ms=20):
+    """
+    Polls a concurrent.futures.Future from the Tk thread and then calls
+    on_done(result) or on_error(exception) there; Tk must never be called
+    from the worker thread itself.
+    """
+    if not future.done():
+        root.after(interval_ms, when_done, root, future, on_done, on_error, interval_ms)
+        return
+    error = future.exception()
+    if error is not None:
+        on_error(error)
+    else:
+        on_done(future.result())
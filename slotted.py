@@ -0,0 +1,45 @@
+# slotted.py
+# Pickle helpers for the model classes that use __slots__ (no per-instance __dict__).
+
+
+_slot_names_cache = {}  # key: class, value: list of mangled slot names
+
+
+def slot_names(cls):
+    # Every slot declared along the class hierarchy (already name-mangled)
+    cached = _slot_names_cache.get(cls)
+    if cached is not None:
+        return cached
+    names = []
+    for klass in cls.__mro__:
+        for name in klass.__dict__.get("__slots__", ()):
+            if name.startswith("__") and not name.endswith("__"):
+                name = f"_{klass.__name__.lstrip('_')}{name}"
+            names.append(name)
+    _slot_names_cache[cls] = names
+    return names
+
+
+def get_slot_state(obj, exclude=()):
+    state = {}
+    for name in slot_names(type(obj)):
+        if name not in exclude and hasattr(obj, name):
+            state[name] = getattr(obj, name)
+    return state
+
+
+def state_as_dict(state):
+    # Our own dict state, a plain __dict__ from pickles made before __slots__,
+    # or the default (dict, slots) tuple all become one flat dict
+    if isinstance(state, tuple):
+        dict_state, slot_state = state
+        return {**(dict_state or {}), **(slot_state or {})}
+    return dict(state)
+
+
+def set_slot_state(obj, state):
+    # Unknown (retired) attribute names are ignored
+    known = set(slot_names(type(obj)))
+    for name, value in state.items():
+        if name in known:
+            setattr(obj, name, value)
@@ -0,0 +1,373 @@
+import sqlite3
+import threading
+
+import record_codec
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    customer_id TEXT NOT NULL,
+    total_fils INTEGER NOT NULL,
+    payment_method TEXT NOT NULL,
+    purchase_time TEXT NOT NULL,
+    purchase_date TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_time ON orders(customer_id, purchase_time);
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(purchase_date);
+
+CREATE TABLE IF NOT EXISTS order_tickets (
+    order_id TEXT NOT NULL REFERENCES orders(order_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    ticket_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    price_fils INTEGER NOT NULL,
+    PRIMARY KEY (order_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_order_tickets_ticket ON order_tickets(ticket_id);
+
+CREATE TABLE IF NOT EXISTS discounts (
+    name TEXT PRIMARY KEY,
+    percentage REAL NOT NULL,
+    ticket_type TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+
+-- Discount usage counts, claimed here so processes sharing the database
+-- enforce one cap; customer_id '' holds a discount's total
+CREATE TABLE IF NOT EXISTS discount_uses (
+    discount TEXT NOT NULL,
+    customer_id TEXT NOT NULL,
+    uses INTEGER NOT NULL,
+    PRIMARY KEY (discount, customer_id)
+);
+
+CREATE TABLE IF NOT EXISTS sales (
+    sale_date TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+# One account per email, compared the way UserRegistry.normalize_email does
+# (SQLite's lower() only folds ASCII). Replaces the plain idx_users_email
+# index of older databases.
+_USER_EMAIL_INDEX = """
+DROP INDEX IF EXISTS idx_users_email;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_key ON users(lower(trim(email)));
+"""
+
+
+# get_orders_page sort key -> SQL expression (same keys as purchase_order.ORDER_SORT_KEYS)
+_PAGE_SORT_COLUMNS = {
+    "date": "purchase_time",
+    "total": "total_fils",
+    "payment_method": "payment_method",
+    "ticket_type": "COALESCE((SELECT name FROM order_tickets t WHERE t.order_id = orders.order_id "
+                   "AND t.position = 0), '')",
+}
+
+
+class SQLiteStore:
+    """
+    SQLite storage for DataManager (WAL mode). Objects are kept as blobs next
+    to the indexed columns used for lookups (encoded with record_codec), so
+    loads return the same objects the pickle backend does. Rows still
+    pickled by an older version are refused until migrate_legacy_rows() (or
+    migrate_legacy=True) has re-encoded them.
+    """
+
+    def __init__(self, path, migrate_legacy=False):
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.execute("PRAGMA foreign_keys=ON")
+        self.__conn.executescript(_SCHEMA)
+        try:
+            self.__conn.executescript(_USER_EMAIL_INDEX)
+        except sqlite3.IntegrityError:
+            self.__conn.close()
+            raise ValueError(f"{path} has several accounts with the same email; "
+                             "merge or rename them before opening it")
+        if migrate_legacy:
+            self.migrate_legacy_rows()
+
+    def get_path(self):
+        return self.__path
+
+    def close(self):
+        self.__conn.close()
+
+    # ---------- Generic Helpers ----------
+    def __query(self, sql, params=()):
+        with self.__lock:
+            return self.__conn.execute(sql, params).fetchall()
+
+    def __write(self, statements):
+        # statements: list of (sql, params) run in one transaction
+        with self.__lock, self.__conn:
+            for sql, params in statements:
+                self.__conn.execute(sql, params)
+
+    @staticmethod
+    def __dump(obj):
+        return record_codec.dumps(obj)
+
+    @staticmethod
+    def __blobs(rows):
+        # record_codec.loads raises ValueError on anything else, e.g. a legacy pickle
+        return [record_codec.loads(row[0]) for row in rows]
+
+    def migrate_legacy_rows(self):
+        # One-time upgrade: re-encode blobs pickled before record_codec.
+        # Unpickling runs code, so only do this on a database you trust.
+        import pickle
+        converted = 0
+        for table in ("users", "orders", "discounts"):
+            rows = self.__query(f"SELECT rowid, data FROM {table}")
+            updates = [(f"UPDATE {table} SET data = ? WHERE rowid = ?",
+                        (self.__dump(pickle.loads(data)), rowid))
+                       for rowid, data in rows if not record_codec.is_encoded(data)]
+            self.__write(updates)
+            converted += len(updates)
+        return converted
+
+    # ---------- Users ----------
+    def __user_rows(self, user):
+        return [(
+            # Not INSERT OR REPLACE: that would delete another account holding the email
+            "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+            "email = excluded.email, name = excluded.name, role = excluded.role, "
+            "created_at = excluded.created_at, data = excluded.data",
+            (user.get_user_id(), user.get_email(), user.get_name(), type(user).__name__,
+             user.get_created_at().isoformat(), self.__dump(user)),
+        )]
+
+    def load_users(self):
+        return self.__blobs(self.__query("SELECT data FROM users ORDER BY rowid"))
+
+    def save_users(self, users):
+        statements = [("DELETE FROM users", ())]
+        for user in users:
+            statements += self.__user_rows(user)
+        self.__write_users(statements)
+
+    def upsert_user(self, user):
+        self.__write_users(self.__user_rows(user))
+
+    def __write_users(self, statements):
+        # Another account (possibly saved by another process) already has the email
+        try:
+            self.__write(statements)
+        except sqlite3.IntegrityError as e:
+            if "idx_users_email_key" in str(e):
+                raise ValueError("Email already exists.") from e
+            raise
+
+    def get_user_by_email(self, email):
+        found = self.__blobs(self.__query("SELECT data FROM users WHERE lower(trim(email)) = lower(trim(?))",
+                                          (email,)))
+        return found[0] if found else None
+
+    def get_user_by_id(self, user_id):
+        found = self.__blobs(self.__query("SELECT data FROM users WHERE user_id = ?", (user_id,)))
+        return found[0] if found else None
+
+    # ---------- Orders ----------
+    def __order_rows(self, order):
+        order_id = order.get_order_id()
+        purchase_time = order.get_purchase_time()
+        rows = [
+            ("DELETE FROM order_tickets WHERE order_id = ?", (order_id,)),
+            ("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)",
+             (order_id, order.get_customer_id(), order.get_total_fils(), order.get_payment_method(),
+              purchase_time.isoformat(), purchase_time.strftime("%Y-%m-%d"), self.__dump(order))),
+        ]
+        for position, ticket in enumerate(order.get_tickets()):
+            rows.append((
+                "INSERT INTO order_tickets VALUES (?, ?, ?, ?, ?)",
+                (order_id, position, ticket.get_ticket_id(), ticket.get_name(), ticket.get_price_fils()),
+            ))
+        return rows
+
+    def load_orders(self):
+        return self.__blobs(self.__query("SELECT data FROM orders ORDER BY rowid"))
+
+    def iter_orders(self, batch_size=1000):
+        # Every order in rowid order, fetched batch_size rows at a time, so the
+        # lock is never held across the caller's work
+        last_rowid = 0
+        while True:
+            rows = self.__query("SELECT rowid, data FROM orders WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                (last_rowid, batch_size))
+            for _, data in rows:
+                yield record_codec.loads(data)
+            if len(rows) < batch_size:
+                return
+            last_rowid = rows[-1][0]
+
+    def save_orders(self, orders):
+        statements = [("DELETE FROM order_tickets", ()), ("DELETE FROM orders", ())]
+        for order in orders:
+            statements += self.__order_rows(order)
+        self.__write(statements)
+
+    def upsert_order(self, order):
+        self.__write(self.__order_rows(order))
+
+    def upsert_orders(self, orders):
+        statements = []
+        for order in orders:
+            statements += self.__order_rows(order)
+        self.__write(statements)
+
+    def remove_order(self, order_id):
+        self.__write([
+            ("DELETE FROM order_tickets WHERE order_id = ?", (order_id,)),
+            ("DELETE FROM orders WHERE order_id = ?", (order_id,)),
+        ])
+
+    def get_order_by_id(self, order_id):
+        found = self.__blobs(self.__query("SELECT data FROM orders WHERE order_id = ?", (order_id,)))
+        return found[0] if found else None
+
+    def get_orders_for_customer(self, customer_id):
+        return self.__blobs(self.__query(
+            "SELECT data FROM orders WHERE customer_id = ? ORDER BY purchase_time", (customer_id,)))
+
+    def get_orders_page(self, customer_id, page=0, page_size=50, sort_by="date", descending=True,
+                        ticket_type=None, payment_method=None):
+        # (orders on that page, total matching), sorted and filtered in SQL so
+        # only the page's blobs are read; dates use idx_orders_customer_time
+        if sort_by not in _PAGE_SORT_COLUMNS:
+            raise ValueError(f"Unknown sort key: {sort_by}")
+        where, params = "customer_id = ?", [customer_id]
+        if payment_method is not None:
+            where += " AND payment_method = ?"
+            params.append(payment_method)
+        if ticket_type is not None:
+            where += (" AND EXISTS (SELECT 1 FROM order_tickets t"
+                      " WHERE t.order_id = orders.order_id AND t.name = ?)")
+            params.append(ticket_type)
+        direction = "DESC" if descending else "ASC"
+        order_by = f"{_PAGE_SORT_COLUMNS[sort_by]} {direction}"
+        if sort_by != "date":
+            order_by += ", purchase_time"  # ties stay in purchase order, as in page_orders
+        total = self.__query(f"SELECT COUNT(*) FROM orders WHERE {where}", params)[0][0]
+        orders = self.__blobs(self.__query(
+            f"SELECT data FROM orders WHERE {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+            params + [page_size, page * page_size]))
+        return orders, total
+
+    def get_revenue_fils_between(self, start_date, end_date):
+        rows = self.__query(
+            "SELECT COALESCE(SUM(total_fils), 0) FROM orders WHERE purchase_date BETWEEN ? AND ?",
+            (start_date, end_date))
+        return rows[0][0]
+
+    def get_orders_between(self, start_date, end_date):
+        # Dates are inclusive "YYYY-MM-DD" strings
+        return self.__blobs(self.__query(
+            "SELECT data FROM orders WHERE purchase_date BETWEEN ? AND ? ORDER BY purchase_time",
+            (start_date, end_date)))
+
+    # ---------- Discounts ----------
+    def load_discounts(self):
+        # Usage counts come from discount_uses, which is newer than the blobs
+        discounts = self.__blobs(self.__query("SELECT data FROM discounts ORDER BY rowid"))
+        counts = {}
+        for name, customer_id, uses in self.__query("SELECT discount, customer_id, uses FROM discount_uses"):
+            counts.setdefault(name, {})[customer_id] = uses
+        for discount in discounts:
+            stored = counts.get(discount.get_name())
+            if stored:
+                total = stored.pop("", discount.get_uses())
+                discount.set_uses(total, stored)
+        return discounts
+
+    def claim_discount_use(self, name, quantity, caps, seeds):
+        # caps / seeds: {customer id or '' for the total: cap or None, count to start from}.
+        # Every cap is checked and bumped in one transaction, so two processes
+        # can't both take the last use. Returns (claimed, {key: stored uses}).
+        with self.__lock, self.__conn:
+            for key in caps:
+                self.__conn.execute("INSERT OR IGNORE INTO discount_uses VALUES (?, ?, ?)", (name, key, seeds[key]))
+            claimed = []
+            for key, cap in caps.items():
+                cursor = self.__conn.execute(
+                    "UPDATE discount_uses SET uses = uses + ? "
+                    "WHERE discount = ? AND customer_id = ? AND (? IS NULL OR uses + ? <= ?)",
+                    (quantity, name, key, cap, quantity, cap))
+                if cursor.rowcount != 1:
+                    break
+                claimed.append(key)
+            else:
+                return True, self.__discount_uses(name, caps)
+            for key in claimed:  # one cap was full: give back what this claim took
+                self.__add_discount_uses(name, key, -quantity)
+            return False, self.__discount_uses(name, caps)
+
+    def release_discount_use(self, name, quantity, keys):
+        # Gives back uses claimed for a sale that failed
+        with self.__lock, self.__conn:
+            for key in keys:
+                self.__add_discount_uses(name, key, -quantity)
+            return self.__discount_uses(name, keys)
+
+    def __add_discount_uses(self, name, key, quantity):
+        self.__conn.execute("UPDATE discount_uses SET uses = MAX(uses + ?, 0) WHERE discount = ? AND customer_id = ?",
+                            (quantity, name, key))
+
+    def __discount_uses(self, name, keys):
+        return {key: self.__conn.execute("SELECT uses FROM discount_uses WHERE discount = ? AND customer_id = ?",
+                                         (name, key)).fetchone()[0] for key in keys}
+
+    def save_discounts(self, discounts):
+        statements = [("DELETE FROM discounts", ())]
+        for d in discounts:
+            statements.append((
+                "INSERT OR REPLACE INTO discounts VALUES (?, ?, ?, ?, ?)",
+                (d.get_name(), d.get_percentage(), d.get_ticket_type(), int(d.is_active()), self.__dump(d)),
+            ))
+        self.__write(statements)
+
+    # ---------- Sales Log ----------
+    def load_sales(self):
+        return dict(self.__query("SELECT sale_date, count FROM sales ORDER BY sale_date"))
+
+    def save_sales(self, sales):
+        statements = [("DELETE FROM sales", ())]
+        statements += [("INSERT INTO sales VALUES (?, ?)", (day, count)) for day, count in sales.items()]
+        self.__write(statements)
+
+    def add_sales(self, deltas):
+        self.__write([("INSERT INTO sales VALUES (?, ?) "
+                       "ON CONFLICT(sale_date) DO UPDATE SET count = count + excluded.count", (day, tickets))
+                      for day, tickets in deltas.items()])
+
+    def raise_sales(self, counts):
+        self.__write([("INSERT INTO sales VALUES (?, ?) "
+                       "ON CONFLICT(sale_date) DO UPDATE SET count = MAX(count, excluded.count)", (day, tickets))
+                      for day, tickets in counts.items()])
+
+    def count_tickets_by_day(self):
+        return dict(self.__query(
+            "SELECT o.purchase_date, COUNT(*) FROM order_tickets t JOIN orders o ON o.order_id = t.order_id "
+            "GROUP BY o.purchase_date"))
+
+    def get_sales_between(self, start_date, end_date):
+        return dict(self.__query(
+            "SELECT sale_date, count FROM sales WHERE sale_date BETWEEN ? AND ? ORDER BY sale_date",
+            (start_date, end_date)))
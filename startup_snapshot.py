@@ -0,0 +1,48 @@
+# startup_snapshot.py
+# One compact file with what the login screen needs (users + discount table),
+# so a cold start reads a single file instead of replaying every storage log.
+
+import os
+
+import record_codec
+
+SNAPSHOT_VERSION = 2
+
+
+def storage_signature(paths):
+    # (path, size, mtime) per file; any write to storage changes it
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def load_snapshot(path, sources):
+    # Returns {"users": [...], "discounts": [...]}, or None when the snapshot is
+    # missing, unreadable or older than the storage files it was built from
+    try:
+        with open(path, "rb") as f:
+            snapshot = record_codec.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    if snapshot.get("signature") != storage_signature(sources):
+        return None
+    return snapshot
+
+
+def save_snapshot(path, sources, users, discounts):
+    # Call after storage is closed, so the recorded signature is final
+    snapshot = {"version": SNAPSHOT_VERSION, "signature": storage_signature(sources),
+                "users": list(users), "discounts": list(discounts)}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(record_codec.dumps(snapshot))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
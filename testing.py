@@ -2,6 +2,8 @@ import os
 import shutil
 import uuid
 import pickle
+import random
+import time
 import unittest
 from datetime import datetime, timedelta
 
@@ -14,6 +16,41 @@ from ticket_types import (
     SingleRaceTicket, WeekendPackage, SeasonPass, GroupDiscountTicket
 )
 from data_manager import DataManager
+from log_store import LogStore
+from user_registry import UserRegistry
+from money import to_fils, from_fils, format_aed, apply_percentage_off
+from purchase_order import total_revenue_fils, page_orders
+from ticket_catalog import catalog_entry
+import order_stream
+from sales_analytics import SalesAnalytics, period_key
+from sales_counter import SalesCounter
+from inventory import Inventory
+from checkout import CheckoutService
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+from ticketing_service import TicketingService
+from http_api import ApiServer
+import threading
+from background_writer import BackgroundWriter
+from history_cache import HistoryCache
+from startup_snapshot import load_snapshot, save_snapshot
+import struct
+import zlib
+import record_codec
+from order_archive import OrderArchive
+import passwords
+from sessions import SessionManager, SharedSessionStore
+from seat_map import SeatMap, SeatSection, parse_seat_id
+from discount_schedule import DiscountSchedule
+from pricing_engine import PricingEngine, PriceCurve
+from pricing_rules import PricingRules, PricingRule
+import gate_index
+from gate_index import GateIndex, BloomFilter, default_windows
+
+# Tests create many users; a minimal-cost hash keeps them fast (TestPasswords uses real settings)
+FAST_HASHER = passwords.PasswordHasher("scrypt", n=2, r=1, p=1)
+passwords.set_default_hasher(FAST_HASHER)
 
 class TestTicketManager(unittest.TestCase):
     def setUp(self):
@@ -76,6 +113,51 @@ class TestTicketManager(unittest.TestCase):
         self.assertEqual(rep2[today], 5)
 
 
+    def test_best_active_discount_wins(self):
+        better = Discount("Flash Sale", 20, self.t2.get_name())
+        equal = Discount("Also 20", 20, self.t2.get_name())
+        self.tm.add_discount(better)
+        self.tm.add_discount(equal)
+        self.assertIs(self.tm.find_discount_for_ticket(self.t2.get_name()), better)
+
+        better.deactivate()
+        self.assertIs(self.tm.find_discount_for_ticket(self.t2.get_name()), equal)
+        equal.set_percentage(5)
+        self.assertIs(self.tm.find_discount_for_ticket(self.t2.get_name()), self.d1)
+
+    def test_index_follows_discount_changes(self):
+        self.d3.activate()
+        self.assertIs(self.tm.find_discount_for_ticket(self.t1.get_name()), self.d3)
+        self.assertEqual(self.tm.calculate_final_price(self.t1), round(self.t1.get_price() * 0.5, 2))
+
+        self.d3.set_ticket_type(self.g5.get_name())
+        self.assertIsNone(self.tm.find_discount_for_ticket(self.t1.get_name()))
+        self.assertIs(self.tm.find_discount_for_ticket(self.g5.get_name()), self.d3)
+
+        self.assertIn(self.d3, self.tm.get_active_discounts())
+        self.d3.deactivate()
+        self.assertNotIn(self.d3, self.tm.get_active_discounts())
+        self.assertIsNone(self.tm.find_discount_for_ticket(self.g5.get_name()))
+
+        self.tm.remove_discount(self.d1)
+        self.assertIsNone(self.tm.find_discount_for_ticket(self.t2.get_name()))
+
+    def test_bulk_prices_match_scalar_path(self):
+        tickets = [self.t1, self.t2, self.t3, self.g5, self.t2] * 20
+        self.assertEqual(self.tm.calculate_final_prices(tickets),
+                         [self.tm.calculate_final_price(t) for t in tickets])
+
+    def test_quote_cart(self):
+        quote = self.tm.quote_cart([(self.t2.get_name(), 3), (self.t1.get_name(), 1)])
+        unit = self.tm.calculate_final_price(self.t2)
+        self.assertEqual(quote["lines"][0], (self.t2.get_name(), 3, unit, unit * 3))
+        self.assertEqual(quote["total"], round(unit * 3 + self.t1.get_price(), 2))
+        with self.assertRaises(ValueError):
+            self.tm.quote_cart([("No Such Ticket", 1)])
+        with self.assertRaises(ValueError):
+            self.tm.quote_cart([(self.t1.get_name(), 0)])
+
+
 class TestCustomerAndPurchase(unittest.TestCase):
     def setUp(self):
         self.cust = Customer("Hamdan", "hamdan@example.com", "pass123")
@@ -147,7 +229,10 @@ class TestPurchaseOrder(unittest.TestCase):
     def test_getters_and_str(self):
         oid = uuid.UUID(self.order.get_order_id())  # valid uuid
         self.assertEqual(self.order.get_customer_id(), "cust123")
-        self.assertEqual(self.order.get_tickets(), [self.t])
+        lines = self.order.get_tickets()
+        self.assertEqual([line.get_name() for line in lines], [self.t.get_name()])
+        self.assertEqual(lines[0].get_price(), self.t.get_price())
+        self.assertNotEqual(lines[0].get_ticket_id(), self.t.get_ticket_id())  # one id per sold ticket
         self.assertEqual(self.order.get_total_price(), self.t.get_price())
         self.assertEqual(self.order.get_payment_method(), "Debit Card")
         # purchase time recent
@@ -205,5 +290,1673 @@ class TestDataManager(unittest.TestCase):
         self.assertIsInstance(loaded, dict)
         self.assertEqual(loaded.get("2025-05-10"), 8)
 
+class TestLogStore(unittest.TestCase):
+    TEST_DIR = "log_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.path = os.path.join(self.TEST_DIR, "orders.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_put_delete_and_replay(self):
+        store = LogStore(self.path)
+        store.put("a", 1)
+        store.put("b", 2)
+        store.put("a", 3)
+        store.delete("b")
+        store.close()
+
+        reopened = LogStore(self.path)
+        self.assertEqual(reopened.items(), [("a", 3)])
+        self.assertEqual(reopened.get_record_count(), 4)
+        reopened.close()
+
+    def test_unchanged_put_appends_nothing(self):
+        store = LogStore(self.path)
+        store.put("a", {"x": 1})
+        size = os.path.getsize(self.path)
+        store.put("a", {"x": 1})
+        store.replace_all([("a", {"x": 1})])
+        self.assertEqual(os.path.getsize(self.path), size)
+        store.close()
+
+    def test_compaction_keeps_live_records(self):
+        store = LogStore(self.path, min_compact_records=10)
+        for i in range(50):
+            store.put("k", i)
+        self.assertLess(store.get_record_count(), 10)
+        self.assertEqual(store.get("k"), 49)
+        store.close()
+
+    def test_torn_tail_is_dropped(self):
+        store = LogStore(self.path)
+        store.put("a", 1)
+        store.close()
+        good_size = os.path.getsize(self.path)
+        with open(self.path, "ab") as f:
+            f.write(b"\x00\x00\x01\x00garbage")
+
+        reopened = LogStore(self.path)
+        self.assertEqual(reopened.items(), [("a", 1)])
+        self.assertEqual(os.path.getsize(self.path), good_size)
+        reopened.close()
+
+
+class TestDataManagerLogBackend(unittest.TestCase):
+    TEST_DIR = "dm_log_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.dm = self.make_dm()
+
+    def make_dm(self, migrate_legacy=False):
+        dm = DataManager(backend="log", migrate_legacy=migrate_legacy)
+        dm._DataManager__user_file = os.path.join(self.TEST_DIR, "users.pkl")
+        dm._DataManager__order_file = os.path.join(self.TEST_DIR, "orders.pkl")
+        dm._DataManager__discount_file = os.path.join(self.TEST_DIR, "discounts.pkl")
+        dm._DataManager__sales_file = os.path.join(self.TEST_DIR, "sales.pkl")
+        return dm
+
+    def tearDown(self):
+        self.dm.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_upsert_and_remove_orders(self):
+        o1 = PurchaseOrder("c", [SingleRaceTicket()], 300.0, "card")
+        o2 = PurchaseOrder("c", [WeekendPackage()], 750.0, "card")
+        self.dm.upsert_order(o1)
+        self.dm.upsert_order(o2)
+        self.dm.remove_order(o1.get_order_id())
+        self.dm.close()
+
+        self.dm = self.make_dm()
+        loaded = self.dm.load_orders()
+        self.assertEqual([o.get_order_id() for o in loaded], [o2.get_order_id()])
+
+    def test_save_load_users_and_sales(self):
+        users = [Customer("A", "a@x.com", "pw"), Customer("B", "b@x.com", "pw2")]
+        self.dm.save_users(users)
+        self.dm.save_users(users[1:])
+        self.dm.save_sales({"2025-05-10": 8})
+        self.assertEqual([u.get_email() for u in self.dm.load_users()], ["b@x.com"])
+        self.assertEqual(self.dm.load_sales(), {"2025-05-10": 8})
+
+    def test_imports_existing_pickle_file(self):
+        with open(os.path.join(self.TEST_DIR, "users.pkl"), "wb") as f:
+            pickle.dump([Customer("A", "a@x.com", "pw")], f)
+        with self.assertRaises(ValueError):  # unpickling is an explicit migration step
+            self.dm.load_users()
+        dm = self.make_dm(migrate_legacy=True)
+        self.assertEqual(dm.load_users()[0].get_email(), "a@x.com")
+        dm.close()
+
+
+class TestDataManagerSQLiteBackend(unittest.TestCase):
+    TEST_DIR = "dm_sqlite_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+
+    def tearDown(self):
+        self.dm.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_user_lookups(self):
+        a, b = Customer("A", "a@x.com", "pw"), Admin("B", "b@x.com", "pw2")
+        self.dm.save_users([a, b])
+        self.assertEqual(len(self.dm.load_users()), 2)
+        self.assertEqual(self.dm.get_user_by_email("b@x.com").get_user_id(), b.get_user_id())
+        self.assertIsInstance(self.dm.get_user_by_id(b.get_user_id()), Admin)
+        self.assertIsNone(self.dm.get_user_by_email("nobody@x.com"))
+
+        a.set_name("A2")
+        self.dm.upsert_user(a)
+        self.assertEqual(self.dm.get_user_by_id(a.get_user_id()).get_name(), "A2")
+
+    def test_email_is_unique_across_processes(self):
+        self.dm.upsert_user(Customer("A", "a@x.com", "pw"))
+        other = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+        with self.assertRaises(ValueError):
+            other.upsert_user(Customer("A again", " A@X.com", "pw"))
+        other.close()
+        self.assertEqual([u.get_name() for u in self.dm.load_users()], ["A"])
+        self.assertEqual(self.dm.get_user_by_email("A@x.com ").get_name(), "A")
+
+    def test_order_queries(self):
+        o1 = PurchaseOrder("c1", [SingleRaceTicket()], 300.0, "card")
+        o2 = PurchaseOrder("c2", [WeekendPackage(), SeasonPass()], 4750.0, "card")
+        self.dm.upsert_order(o1)
+        self.dm.upsert_order(o2)
+        self.assertEqual([o.get_order_id() for o in self.dm.get_orders_for_customer("c2")],
+                         [o2.get_order_id()])
+        self.assertEqual(self.dm.get_order_by_id(o1.get_order_id()).get_customer_id(), "c1")
+
+        self.dm.remove_order(o1.get_order_id())
+        self.assertIsNone(self.dm.get_order_by_id(o1.get_order_id()))
+        self.assertEqual(len(self.dm.load_orders()), 1)
+
+    def test_sales_range_and_migration(self):
+        source = DataManager(backend="log")
+        source._DataManager__user_file = os.path.join(self.TEST_DIR, "users.pkl")
+        source._DataManager__order_file = os.path.join(self.TEST_DIR, "orders.pkl")
+        source._DataManager__discount_file = os.path.join(self.TEST_DIR, "discounts.pkl")
+        source._DataManager__sales_file = os.path.join(self.TEST_DIR, "sales.pkl")
+        source.save_users([Customer("A", "a@x.com", "pw")])
+        source.save_discounts([Discount("Promo", 10, "Season Pass")])
+        source.save_sales({"2025-05-01": 2, "2025-05-10": 8, "2025-06-01": 1})
+        source.migrate_to(self.dm)
+        source.close()
+
+        self.assertEqual(self.dm.get_user_by_email("a@x.com").get_name(), "A")
+        self.assertEqual(self.dm.load_discounts()[0].get_percentage(), 10)
+        self.assertEqual(self.dm.get_sales_between("2025-05-01", "2025-05-31"),
+                         {"2025-05-01": 2, "2025-05-10": 8})
+
+
+class TestUserRegistry(unittest.TestCase):
+    def setUp(self):
+        self.alice = Customer("Alice", "Alice@Example.com", "pw1")
+        self.admin = Admin("Root", "admin@example.com", "pw2")
+        self.registry = UserRegistry([self.alice, self.admin])
+
+    def test_authenticate_is_case_insensitive(self):
+        self.assertIs(self.registry.authenticate("alice@example.com", "pw1"), self.alice)
+        self.assertIs(self.registry.authenticate(" ADMIN@example.com ", "pw2"), self.admin)
+        self.assertIsNone(self.registry.authenticate("alice@example.com", "wrong"))
+        self.assertIsNone(self.registry.authenticate("nobody@example.com", "pw1"))
+
+    def test_register_rejects_duplicates(self):
+        bob = self.registry.register("Bob", "bob@example.com", "pw3")
+        self.assertIsInstance(bob, Customer)
+        self.assertIs(self.registry.get_by_id(bob.get_user_id()), bob)
+        with self.assertRaises(ValueError):
+            self.registry.register("Bob 2", "BOB@example.com", "pw4")
+        self.assertEqual(len(self.registry), 3)
+
+    def test_set_email_keeps_index_consistent(self):
+        self.alice.set_email("alice@new.com")
+        self.assertIsNone(self.registry.get_by_email("alice@example.com"))
+        self.assertIs(self.registry.authenticate("alice@new.com", "pw1"), self.alice)
+
+        with self.assertRaises(ValueError):
+            self.alice.set_email("admin@example.com")
+        self.assertEqual(self.alice.get_email(), "alice@new.com")
+
+    def test_legacy_duplicates_keep_first(self):
+        dup = Admin("Root 2", "admin@example.com", "pw2")
+        registry = UserRegistry([self.admin, dup])
+        self.assertIs(registry.get_by_email("admin@example.com"), self.admin)
+
+    def test_listeners_not_pickled(self):
+        clone = pickle.loads(pickle.dumps(self.alice))
+        clone.set_email("admin@example.com")  # no registry attached to the copy
+        self.assertEqual(clone.get_email(), "admin@example.com")
+
+
+class TestMoney(unittest.TestCase):
+    def test_conversions(self):
+        self.assertEqual(to_fils(300), 30000)
+        self.assertEqual(to_fils(0.1), 10)
+        self.assertEqual(to_fils("19.995"), 2000)
+        self.assertEqual(from_fils(67500), 675.0)
+        self.assertEqual(format_aed(123405), "AED 1234.05")
+        self.assertEqual(format_aed(-5), "AED -0.05")
+
+    def test_percentage_off_rounds_half_up(self):
+        self.assertEqual(apply_percentage_off(75000, 10), 67500)
+        self.assertEqual(apply_percentage_off(999, 50), 500)  # 499.5 -> 500
+        self.assertEqual(apply_percentage_off(10000, 12.5), 8750)
+
+    def test_exact_revenue(self):
+        orders = [PurchaseOrder("c", [], 0.1, "card") for _ in range(1000)]
+        self.assertEqual(total_revenue_fils(orders), 10000)
+        self.assertNotEqual(sum(o.get_total_price() for o in orders), 100.0)
+
+    def test_legacy_float_records_are_migrated(self):
+        # Attribute layout written by versions before integer fils
+        t_state = {"_Ticket__ticket_id": str(uuid.uuid4()), "_Ticket__name": "Single Race Pass",
+                   "_Ticket__price": 300.0, "_Ticket__validity": "One Day", "_Ticket__features": []}
+        old_ticket = SingleRaceTicket.__new__(SingleRaceTicket)
+        old_ticket.__setstate__(t_state)
+        o_state = {"_PurchaseOrder__order_id": str(uuid.uuid4()), "_PurchaseOrder__customer_id": "c",
+                   "_PurchaseOrder__tickets": [old_ticket], "_PurchaseOrder__total_price": 250.5,
+                   "_PurchaseOrder__payment_method": "card", "_PurchaseOrder__purchase_time": datetime.now()}
+        old_order = PurchaseOrder.__new__(PurchaseOrder)
+        old_order.__setstate__(o_state)
+        self.assertEqual(old_ticket.get_price_fils(), 30000)
+        self.assertEqual(old_order.get_total_fils(), 25050)
+        self.assertEqual(old_order.get_tickets()[0].get_price_fils(), 25050)
+
+
+class TestCompactOrders(unittest.TestCase):
+    def test_models_have_no_instance_dict(self):
+        for obj in (SingleRaceTicket(), GroupDiscountTicket(5), Customer("A", "a@x.com", "pw"),
+                    Admin("B", "b@x.com", "pw"), Discount("D", 10, "Season Pass"),
+                    PurchaseOrder("c", [SeasonPass()], 4000.0, "card")):
+            self.assertFalse(hasattr(obj, "__dict__"), type(obj).__name__)
+
+    def test_lines_share_catalog_entry_after_pickling(self):
+        ticket = WeekendPackage()
+        orders = [PurchaseOrder("c", [ticket], 675.0, "card") for _ in range(3)]
+        loaded = [pickle.loads(pickle.dumps(o)) for o in orders]
+        entries = {id(o.get_tickets()[0].get_type_entry()) for o in orders + loaded}
+        self.assertEqual(len(entries), 1)
+        ids = {o.get_tickets()[0].get_ticket_id() for o in orders}
+        self.assertEqual(len(ids), 3)
+        self.assertEqual([o.get_tickets()[0].get_ticket_id() for o in loaded],
+                         [o.get_tickets()[0].get_ticket_id() for o in orders])
+        self.assertEqual(loaded[0].get_tickets()[0].get_features(), ticket.get_features())
+
+    def test_total_is_split_over_lines(self):
+        order = PurchaseOrder("c", [SingleRaceTicket(), WeekendPackage()], 100.0, "card")
+        self.assertEqual(sum(line.get_price_fils() for line in order.get_tickets()), 10000)
+
+    def test_edited_order_keeps_ticket_ids(self):
+        order = PurchaseOrder("c", [SeasonPass()], 3400.0, "card")
+        edited = PurchaseOrder("c", order.get_tickets(), order.get_total_price(), "Apple Pay")
+        self.assertEqual(edited.get_tickets()[0].get_ticket_id(), order.get_tickets()[0].get_ticket_id())
+
+    def test_customer_round_trip(self):
+        cust = Customer("A", "a@x.com", "pw")
+        cust.add_purchase(PurchaseOrder(cust.get_user_id(), [SeasonPass()], 3400.0, "card"))
+        clone = pickle.loads(pickle.dumps(cust))
+        self.assertEqual(clone.get_email(), "a@x.com")
+        self.assertTrue(clone.check_password("pw"))
+        self.assertEqual(clone.get_purchase_history()[0].get_total_fils(), 340000)
+
+
+class TestOrderPaging(unittest.TestCase):
+    def setUp(self):
+        base = datetime(2025, 3, 1, 12, 0)
+        methods = ("Credit Card", "Apple Pay")
+        self.orders = []
+        for i in range(120):
+            ticket = SeasonPass() if i % 3 == 0 else SingleRaceTicket()
+            template = PurchaseOrder("c", [ticket], ticket.get_price(), methods[i % 2])
+            self.orders.append(PurchaseOrder.restore(
+                f"o{i}", "c", template.get_tickets(), template.get_total_fils(),
+                methods[i % 2], base + timedelta(minutes=i)))
+
+    def test_default_pages_are_newest_first(self):
+        first, total = page_orders(self.orders, 0, 50)
+        self.assertEqual(total, 120)
+        self.assertEqual([o.get_order_id() for o in first[:2]], ["o119", "o118"])
+        last, _ = page_orders(self.orders, 2, 50)
+        self.assertEqual([o.get_order_id() for o in last], [f"o{i}" for i in range(19, -1, -1)])
+        self.assertEqual(page_orders(self.orders, 3, 50)[0], [])
+        oldest, _ = page_orders(self.orders, 0, 3, descending=False)
+        self.assertEqual([o.get_order_id() for o in oldest], ["o0", "o1", "o2"])
+
+    def test_filter_and_sort(self):
+        page, total = page_orders(self.orders, 0, 10, sort_by="total", descending=True,
+                                  ticket_type="Season Pass", payment_method="Apple Pay")
+        self.assertEqual(total, 20)  # i % 3 == 0 and i odd
+        self.assertTrue(all(o.get_payment_method() == "Apple Pay" for o in page))
+        self.assertEqual({o.get_tickets()[0].get_name() for o in page}, {"Season Pass"})
+        by_method, _ = page_orders(self.orders, 0, 120, sort_by="payment_method", descending=False)
+        self.assertEqual(by_method[0].get_payment_method(), "Apple Pay")
+        with self.assertRaises(ValueError):
+            page_orders(self.orders, sort_by="colour")
+
+    def test_storage_pages_match_in_memory_pages(self):
+        test_dir = "paging_test"
+        os.makedirs(test_dir, exist_ok=True)
+        try:
+            log_dm = DataManager(backend="log")
+            log_dm._DataManager__order_file = os.path.join(test_dir, "orders.pkl")
+            sqlite_dm = DataManager(backend="sqlite", db_file=os.path.join(test_dir, "tickets.db"))
+            views = [dict(page=0), dict(page=2), dict(page=1, descending=False),
+                     dict(page=0, sort_by="total", ticket_type="Season Pass", payment_method="Apple Pay"),
+                     dict(page=1, sort_by="payment_method", descending=False),
+                     dict(page=0, sort_by="ticket_type")]
+            for dm in (log_dm, sqlite_dm):
+                dm.upsert_orders(self.orders + [PurchaseOrder("other", [SeasonPass()], 3400.0, "Cash")])
+                for view in views:
+                    expected, expected_total = page_orders(self.orders, page_size=50, **view)
+                    got, total = dm.get_orders_page("c", page_size=50, **view)
+                    self.assertEqual(total, expected_total, (dm.get_backend(), view))
+                    self.assertEqual([o.get_order_id() for o in got],
+                                     [o.get_order_id() for o in expected], (dm.get_backend(), view))
+                dm.remove_order("o119")
+                self.assertEqual(dm.get_orders_page("c", 0, 1)[0][0].get_order_id(), "o118")
+                self.assertEqual(dm.get_orders_page("c", 0, 50, sort_by="ticket_type")[1], 119)
+                with self.assertRaises(ValueError):
+                    dm.get_orders_page("c", sort_by="colour")
+                dm.close()
+        finally:
+            shutil.rmtree(test_dir)
+
+
+class TestOrderStream(unittest.TestCase):
+    TEST_DIR = "stream_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.path = os.path.join(self.TEST_DIR, "orders.jsonl")
+        self.orders = [PurchaseOrder(f"c{i % 3}", [SingleRaceTicket(), SeasonPass()], 4300.0, "card")
+                       for i in range(9)]
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_round_trip(self):
+        self.assertEqual(order_stream.write_orders(self.path, iter(self.orders)), 9)
+        loaded = list(order_stream.read_orders(self.path))
+        self.assertEqual([o.get_order_id() for o in loaded], [o.get_order_id() for o in self.orders])
+        first, orig = loaded[0], self.orders[0]
+        self.assertEqual(first.get_purchase_time(), orig.get_purchase_time())
+        self.assertEqual(first.get_total_fils(), orig.get_total_fils())
+        self.assertEqual([l.get_ticket_id() for l in first.get_tickets()],
+                         [l.get_ticket_id() for l in orig.get_tickets()])
+        self.assertIs(first.get_tickets()[1].get_type_entry(), orig.get_tickets()[1].get_type_entry())
+
+    def test_filters(self):
+        order_stream.write_orders(self.path, self.orders)
+        self.assertEqual(len(list(order_stream.read_orders(self.path, customer_id="c1"))), 3)
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.assertEqual(len(list(order_stream.read_orders(self.path, start_date=today, end_date=today))), 9)
+        self.assertEqual(list(order_stream.read_orders(self.path, end_date="2000-01-01")), [])
+
+    def test_pickle_export_and_import(self):
+        pkl = os.path.join(self.TEST_DIR, "orders.pkl")
+        with open(pkl, "wb") as f:
+            pickle.dump(self.orders, f)
+        self.assertEqual(order_stream.export_pickle(pkl, self.path, customer_id="c2"), 3)
+
+        dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "t.db"))
+        self.assertEqual(order_stream.import_orders(self.path, dm, batch_size=2), 3)
+        self.assertEqual(len(dm.get_orders_for_customer("c2")), 3)
+        dm.close()
+
+    def test_export_streams_from_each_backend(self):
+        log_dm = DataManager(backend="log")
+        log_dm._DataManager__order_file = os.path.join(self.TEST_DIR, "orders.pkl")
+        sqlite_dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "t.db"))
+        for dm in (log_dm, sqlite_dm):
+            dm.save_orders(self.orders)
+            self.assertEqual(order_stream.export_orders(dm, self.path), len(self.orders))
+            self.assertEqual([o.get_order_id() for o in order_stream.read_orders(self.path)],
+                             [o.get_order_id() for o in dm.iter_orders()])
+            dm.close()
+
+
+class TestSalesAnalytics(unittest.TestCase):
+    def make_order(self, ticket, paid, method, when):
+        order = PurchaseOrder("c", [ticket], paid, method)
+        return PurchaseOrder.restore(order.get_order_id(), "c", order.get_tickets(),
+                                     order.get_total_fils(), method, when)
+
+    def setUp(self):
+        self.weekend = WeekendPackage()
+        self.season = SeasonPass()
+        self.o1 = self.make_order(self.weekend, 675.0, "Credit Card", datetime(2025, 5, 2, 10))
+        self.o2 = self.make_order(self.weekend, 750.0, "Apple Pay", datetime(2025, 5, 3, 10))
+        self.o3 = self.make_order(self.season, 3400.0, "Credit Card", datetime(2025, 6, 1, 10))
+        self.analytics = SalesAnalytics.from_orders([self.o1, self.o2, self.o3])
+
+    def test_totals_and_breakdowns(self):
+        may = self.analytics.totals("2025-05-01", "2025-05-31")
+        self.assertEqual(may, {"count": 2, "gross_fils": 150000, "discount_fils": 7500, "net_fils": 142500})
+        by_method = self.analytics.breakdown(by="payment_method")
+        self.assertEqual(by_method["Credit Card"]["net_fils"], 67500 + 340000)
+        self.assertEqual(self.analytics.breakdown(by="ticket_type")["Season Pass"]["discount_fils"], 60000)
+
+    def test_rollups(self):
+        months = self.analytics.rollup("month")
+        self.assertEqual(list(months), ["2025-05", "2025-06"])
+        self.assertEqual(self.analytics.season_totals(2025)["count"], 3)
+        week = period_key(datetime(2025, 5, 2).date(), "week")
+        self.assertEqual(self.analytics.rollup("week", week, week)[week]["count"], 2)
+        self.assertEqual(self.analytics.rollup("day", ticket_type="Season Pass"),
+                         {"2025-06-01": {"count": 1, "gross_fils": 400000,
+                                         "discount_fils": 60000, "net_fils": 340000}})
+
+    def test_delete_and_edit(self):
+        self.analytics.remove_order(self.o3)
+        self.assertEqual(list(self.analytics.rollup("month")), ["2025-05"])
+        edited = self.make_order(self.weekend, 675.0, "Google Pay", self.o1.get_purchase_time())
+        self.analytics.replace_order(self.o1, edited)
+        by_method = self.analytics.breakdown(by="payment_method")
+        self.assertNotIn("Credit Card", by_method)
+        self.assertEqual(by_method["Google Pay"]["count"], 1)
+
+    def test_ticket_manager_hooks(self):
+        tm = TicketManager()
+        tm.load_order_history([self.o1])
+        tm.record_order(self.o2)
+        tm.remove_order(self.o1)
+        self.assertEqual(tm.get_analytics().totals()["net_fils"], 75000)
+
+
+class TestSalesCounter(unittest.TestCase):
+    TEST_DIR = "counter_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.dm = DataManager()
+        self.dm._DataManager__sales_file = os.path.join(self.TEST_DIR, "sales.pkl")
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_write_behind_batches(self):
+        counter = SalesCounter(self.dm, flush_interval=None, flush_size=3)
+        counter.record(1, day="2025-05-10")
+        counter.record(1, day="2025-05-10")
+        self.assertEqual(self.dm.load_sales(), {})  # nothing written yet
+        counter.record(1, day="2025-05-11")
+        self.assertEqual(self.dm.load_sales(), {"2025-05-10": 2, "2025-05-11": 1})
+        self.assertEqual(counter.get_pending(), 0)
+
+    def test_close_flushes_and_reload_recovers(self):
+        self.dm.save_sales({"2025-05-10": 5})
+        counter = SalesCounter(self.dm, flush_interval=None, flush_size=100)
+        counter.record(2, day="2025-05-10")
+        counter.close()
+        reloaded = SalesCounter(self.dm, flush_interval=None)
+        self.assertEqual(reloaded.get_counts(), {"2025-05-10": 7})
+
+    def test_timer_flush(self):
+        counter = SalesCounter(self.dm, flush_interval=0.05, flush_size=100)
+        counter.record(4, day="2025-05-10")
+        deadline = datetime.now() + timedelta(seconds=2)
+        while self.dm.load_sales() == {} and datetime.now() < deadline:
+            time.sleep(0.01)
+        counter.close()
+        self.assertEqual(self.dm.load_sales(), {"2025-05-10": 4})
+
+    def test_reconcile_restores_sales_lost_in_a_crash(self):
+        self.dm.save_sales({"2025-05-10": 5})
+        counter = SalesCounter(self.dm, flush_interval=None, flush_size=100)
+        counter.record(1, day="2025-05-11")  # pending: its order is stored, so it is in the recount
+        counter.reconcile({"2025-05-10": 7, "2025-05-11": 2})  # 7 + 2 sold, only 5 flushed
+        self.assertEqual(self.dm.load_sales(), {"2025-05-10": 7, "2025-05-11": 2})
+        counter.reconcile({"2025-05-10": 1})  # a cancelled order is gone from the orders but stays sold
+        self.assertEqual(counter.get_counts(), {"2025-05-10": 7, "2025-05-11": 2})
+
+    def test_processes_add_to_the_stored_counts(self):
+        dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+        first = SalesCounter(dm, flush_interval=None)
+        second = SalesCounter(DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db")),
+                              flush_interval=None)
+        first.record(2, day="2025-05-10")
+        second.record(3, day="2025-05-10")
+        second.close()
+        self.assertEqual(first.get_counts(), {"2025-05-10": 5})  # stored 3 + its own pending 2
+        first.close()
+        self.assertEqual(dm.load_sales(), {"2025-05-10": 5})
+        dm.close()
+
+    def test_due_flush_runs_on_the_writer(self):
+        writer = BackgroundWriter()
+        counter = SalesCounter(self.dm, flush_interval=None, flush_size=1, writer=writer)
+        gate = threading.Event()
+        writer.submit(None, gate.wait)  # writer busy: record() must not wait for the save
+        counter.record(1, day="2025-05-10")
+        self.assertEqual(self.dm.load_sales(), {})
+        gate.set()
+        writer.close()
+        self.assertEqual(self.dm.load_sales(), {"2025-05-10": 1})
+
+    def test_failed_flush_is_retried(self):
+        counter = SalesCounter(self.dm, flush_interval=None, flush_size=1)
+        add_sales = self.dm.add_sales
+        self.dm.add_sales = lambda deltas: (_ for _ in ()).throw(OSError("disk full"))
+        counter.record(2, day="2025-05-10")
+        self.assertIsInstance(counter.get_last_error(), OSError)
+        self.assertEqual(counter.get_pending(), 2)
+        self.dm.add_sales = add_sales
+        counter.flush()
+        self.assertEqual(self.dm.load_sales(), {"2025-05-10": 2})
+        self.assertIsNone(counter.get_last_error())
+
+    def test_ticket_manager_uses_counter(self):
+        tm = TicketManager()
+        counter = SalesCounter(self.dm, flush_interval=None, flush_size=1)
+        tm.set_sales_counter(counter)
+        tm.record_sale(2)
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.assertEqual(tm.get_sales_report(), {today: 2})
+        self.assertEqual(self.dm.load_sales(), {today: 2})
+
+
+class TestCheckout(unittest.TestCase):
+    TEST_DIR = "checkout_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.inventory = Inventory(os.path.join(self.TEST_DIR, "inventory.db"))
+        self.dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+        self.tm = TicketManager()
+        self.season = SeasonPass()
+        self.tm.register_ticket_type(self.season)
+        self.tm.register_ticket_type(SingleRaceTicket())
+        self.tm.set_inventory(self.inventory)
+        self.inventory.set_capacity(self.season.get_name(), 5)
+        self.checkout = CheckoutService(self.tm, self.dm)
+        self.cust = Customer("A", "a@x.com", "pw")
+
+    def tearDown(self):
+        self.inventory.close()
+        self.dm.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_reserve_commit_release(self):
+        hold = self.checkout.reserve(self.season.get_name(), 3)
+        self.assertEqual(self.tm.get_remaining(self.season.get_name()), 2)
+        with self.assertRaises(ValueError):
+            self.checkout.reserve(self.season.get_name(), 3)
+        self.checkout.release(hold)
+        self.assertEqual(self.tm.get_remaining(self.season.get_name()), 5)
+
+        order = self.checkout.purchase(self.cust, self.season.get_name(), "card", quantity=2)
+        self.assertEqual(len(order.get_tickets()), 2)
+        self.assertEqual(self.inventory.get_sold(self.season.get_name()), 2)
+        self.assertEqual(self.dm.get_orders_for_customer(self.cust.get_user_id())[0].get_order_id(),
+                         order.get_order_id())
+        self.assertEqual(self.tm.get_sales_report()[datetime.now().strftime("%Y-%m-%d")], 2)
+
+    def test_unlimited_type_and_cancel(self):
+        order = self.checkout.purchase(self.cust, "Single Race Pass", "card")
+        self.assertIsNone(self.tm.get_remaining("Single Race Pass"))
+        season_order = self.checkout.purchase(self.cust, self.season.get_name(), "card")
+        self.checkout.cancel_order(self.cust, season_order)
+        self.assertEqual(self.tm.get_remaining(self.season.get_name()), 5)
+        self.assertEqual([o.get_order_id() for o in self.cust.get_purchase_history()], [order.get_order_id()])
+        self.assertIsNone(self.dm.get_order_by_id(season_order.get_order_id()))
+
+    def test_expired_hold_frees_capacity(self):
+        inventory = Inventory(os.path.join(self.TEST_DIR, "inventory.db"), hold_seconds=-1)
+        hold = inventory.reserve(self.season.get_name(), 5)
+        self.assertEqual(inventory.get_remaining(self.season.get_name()), 5)
+        with self.assertRaises(ValueError):
+            inventory.commit(hold)
+        inventory.close()
+
+    def test_failure_after_storing_the_order_takes_it_back(self):
+        def fail(*args):
+            raise OSError("disk full")
+        self.dm.upsert_user = fail  # the order is already stored when this fails
+        with self.assertRaises(OSError):
+            self.checkout.purchase(self.cust, self.season.get_name(), "card")
+        self.assertEqual((self.dm.load_orders(), self.cust.get_purchase_history()), ([], []))
+        self.assertEqual(self.tm.get_remaining(self.season.get_name()), 5)
+
+        self.dm.remove_order = fail  # can't take it back: its tickets must stay sold
+        with self.assertRaises(OSError):
+            self.checkout.purchase(self.cust, self.season.get_name(), "card")
+        self.assertEqual(len(self.dm.load_orders()), 1)
+        self.assertEqual(self.tm.get_remaining(self.season.get_name()), 4)
+
+    def test_rule_only_group_sizes_are_quote_only(self):
+        self.tm.set_pricing_rules(PricingRules())
+        self.tm.register_ticket_type(GroupDiscountTicket(5))
+        self.assertEqual(self.tm.quote_cart([("Group Ticket (7 people)", 1)])["total_fils"],
+                         GroupDiscountTicket(7).get_price_fils())
+        with self.assertRaises(ValueError):
+            self.checkout.purchase(self.cust, "Group Ticket (7 people)", "card")  # no capacity or seats
+        with self.assertRaises(ValueError):
+            self.checkout.commit(None, self.cust, "Group Ticket (7 people)", "card")
+        self.assertEqual(self.dm.load_orders(), [])
+        order = self.checkout.purchase(self.cust, "Group Ticket (5 people)", "card")
+        self.assertEqual(order.get_total_fils(), GroupDiscountTicket(5).get_price_fils())
+
+    def test_concurrent_buyers_never_oversell(self):
+        def buy(i):
+            try:
+                self.checkout.purchase(Customer(f"C{i}", f"c{i}@x.com", "pw"), self.season.get_name(), "card")
+                return True
+            except ValueError:
+                return False
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(buy, range(40)))
+        self.assertEqual(sum(results), 5)
+        self.assertEqual(self.inventory.get_sold(self.season.get_name()), 5)
+        self.assertEqual(len(self.dm.load_orders()), 5)
+
+
+class TestTicketingService(unittest.TestCase):
+    TEST_DIR = "service_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+        self.tm = TicketManager()
+        self.tm.register_ticket_type(SingleRaceTicket())
+        self.tm.register_ticket_type(WeekendPackage())
+        self.tm.set_inventory(Inventory(os.path.join(self.TEST_DIR, "inventory.db")))
+        self.tm.add_discount(Discount("Promo", 10, "Weekend Package"))
+        self.admin = Admin("Boss", "boss@x.com", "root")
+        self.svc = TicketingService(self.tm, self.dm, UserRegistry([self.admin]))
+
+    def tearDown(self):
+        self.svc.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_register_login_purchase_edit_delete(self):
+        cust = self.svc.register("A", "a@x.com", "pw")
+        with self.assertRaises(ValueError):
+            self.svc.register("B", "A@x.com", "pw")
+        with self.assertRaises(ValueError):
+            self.svc.login("a@x.com", "wrong")
+        self.assertIs(self.svc.login("a@x.com", "pw"), cust)
+
+        order = self.svc.purchase(cust, "Weekend Package", "Credit Card")
+        self.assertEqual(order.get_total_fils(), 67500)
+        with self.assertRaises(ValueError):
+            self.svc.purchase(cust, "Weekend Package", "Cash")
+        edited = self.svc.edit_order(cust, order.get_order_id(), "Apple Pay")
+        self.assertEqual([o.get_payment_method() for o in self.svc.get_orders(cust)], ["Apple Pay"])
+        self.assertIsNone(self.dm.get_order_by_id(order.get_order_id()))
+
+        report = self.svc.sales_report()
+        self.assertEqual(report["by_payment_method"]["Apple Pay"]["net_fils"], 67500)
+        self.svc.delete_order(cust, edited.get_order_id())
+        self.assertEqual(self.svc.get_orders(cust), [])
+        with self.assertRaises(ValueError):
+            self.svc.delete_order(cust, edited.get_order_id())
+
+    def test_discount_toggle_is_saved(self):
+        self.svc.set_discount_active("Promo", False)
+        self.assertFalse(self.dm.load_discounts()[0].is_active())
+        self.assertEqual(self.tm.calculate_final_price(WeekendPackage()), 750)
+        with self.assertRaises(ValueError):
+            self.svc.set_discount_active("Nope", True)
+
+    def test_http_round_trip(self):
+        async def call(reader, writer, method, path, body=None, token=None):
+            data = json.dumps(body).encode() if body is not None else b""
+            auth = f"Authorization: Bearer {token}\r\n" if token else ""
+            writer.write(f"{method} {path} HTTP/1.1\r\n{auth}Content-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length"):
+                    length = int(line.split(b":")[1])
+            return status, json.loads(await reader.readexactly(length))
+
+        async def scenario():
+            server = ApiServer(self.svc, port=0)
+            port = await server.start()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            results = [await call(reader, writer, "GET", "/ticket-types")]
+            creds = {"email": "h@x.com", "password": "pw"}
+            results.append(await call(reader, writer, "POST", "/register", dict(creds, name="H")))
+            results.append(await call(reader, writer, "POST", "/login", creds))
+            token = results[-1][1]["token"]
+            results.append(await call(reader, writer, "POST", "/purchase",
+                                      {"ticket_type": "Single Race Pass", "payment_method": "Debit Card"}, token))
+            results.append(await call(reader, writer, "POST", "/purchase",
+                                      {"ticket_type": "Single Race Pass", "payment_method": "Debit Card",
+                                       "quantity": None}, token))
+            results.append(await call(reader, writer, "GET", "/sales-report", None, token))
+            admin = (await call(reader, writer, "POST", "/login", {"email": "boss@x.com", "password": "root"}))[1]
+            results.append(await call(reader, writer, "GET", "/sales-report", None, admin["token"]))
+            results.append(await call(reader, writer, "POST", "/logout", {}, token))
+            results.append(await call(reader, writer, "GET", "/orders", None, token))
+            results.append(await call(reader, writer, "GET", "/nowhere"))
+            writer.close()
+            await server.stop()
+            return results
+
+        types, registered, login, bought, bad_quantity, forbidden, report, logout, expired, missing = asyncio.run(scenario())
+        self.assertEqual(types[0], 200)
+        self.assertIn("Single Race Pass", types[1]["ticket_types"])
+        self.assertEqual(registered[1]["role"], "customer")
+        self.assertEqual(login[0], 200)
+        self.assertEqual(bought[1]["total_fils"], 30000)
+        self.assertEqual(bad_quantity[0], 400)
+        self.assertEqual(forbidden[0], 403)
+        self.assertEqual(report[1]["by_ticket_type"]["Single Race Pass"]["count"], 1)
+        self.assertEqual(logout[0], 200)
+        self.assertEqual(expired[0], 401)
+        self.assertEqual(missing[0], 404)
+
+
+class TestBackgroundWriter(unittest.TestCase):
+    def setUp(self):
+        self.writer = BackgroundWriter()
+        self.gate = threading.Event()
+        self.writer.submit(None, self.gate.wait)  # holds the writer busy until released
+
+    def tearDown(self):
+        self.gate.set()
+        self.writer.close()
+
+    def test_same_key_saves_coalesce(self):
+        writes = []
+        done = []
+        for i in range(5):
+            self.writer.submit("users", lambda i=i: writes.append(i) or i, on_done=done.append)
+        self.writer.submit("orders", lambda: writes.append("orders"))
+        self.assertEqual(self.writer.get_pending(), 3)
+        self.gate.set()
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(writes, [4, "orders"])  # latest users save, original queue position
+        self.assertEqual(self.writer.get_coalesced(), 4)
+        self.assertEqual(done, [])  # callbacks wait for the GUI thread
+        self.assertEqual(self.writer.run_callbacks(), 1)
+        self.assertEqual(done, [4])
+
+    def test_errors_go_to_on_error(self):
+        errors = []
+        self.writer.submit(None, lambda: 1 / 0, on_error=errors.append)
+        self.writer.submit(None, lambda: {}["missing"])
+        self.gate.set()
+        self.writer.flush(timeout=5)
+        self.writer.run_callbacks()
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+        self.assertIsInstance(self.writer.get_errors()[0], KeyError)
+
+    def test_close_runs_queued_jobs(self):
+        writes = []
+        self.writer.submit("sales", lambda: writes.append("sales"))
+        self.gate.set()
+        self.writer.close(timeout=5)
+        self.assertEqual(writes, ["sales"])
+        with self.assertRaises(RuntimeError):
+            self.writer.submit(None, lambda: None)
+
+
+class TestHistoryCache(unittest.TestCase):
+    TEST_DIR = "history_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.dm = self.make_dm()
+
+    def make_dm(self, migrate_legacy=False):
+        dm = DataManager(backend="log", migrate_legacy=migrate_legacy)
+        dm._DataManager__user_file = os.path.join(self.TEST_DIR, "users.pkl")
+        dm._DataManager__order_file = os.path.join(self.TEST_DIR, "orders.pkl")
+        return dm
+
+    def tearDown(self):
+        self.dm.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_lru_loads_lazily_and_evicts(self):
+        customers = [Customer(f"C{i}", f"c{i}@x.com", "pw") for i in range(3)]
+        cache = HistoryCache(self.dm, max_customers=2)
+        for cust in customers:
+            cust.set_history_source(cache)
+            order = PurchaseOrder(cust.get_user_id(), [SingleRaceTicket()], 300.0, "card")
+            self.dm.upsert_order(order)  # storage first, then the (possibly cached) history
+            cust.add_purchase(order)
+        self.assertEqual(cache.get_stats()["size"], 0)  # nothing loaded yet
+
+        for cust in customers:
+            self.assertEqual(len(cust.get_purchase_history()), 1)
+        customers[2].get_purchase_history()
+        stats = cache.get_stats()
+        self.assertEqual((stats["size"], stats["misses"], stats["hits"], stats["evictions"]), (2, 3, 1, 1))
+        self.assertFalse(cache.is_loaded(customers[0].get_user_id()))
+
+        extra = PurchaseOrder(customers[0].get_user_id(), [SeasonPass()], 4000.0, "card")
+        self.dm.upsert_order(extra)
+        customers[0].add_purchase(extra)  # not loaded: storage already has it
+        self.assertEqual(len(customers[0].get_purchase_history()), 2)
+        customers[0].delete_purchase(extra.get_order_id())
+        self.dm.remove_order(extra.get_order_id())
+        cache.invalidate()
+        self.assertEqual(len(customers[0].get_purchase_history()), 1)
+
+    def test_attached_customer_pickles_without_orders(self):
+        cust = Customer("A", "a@x.com", "pw")
+        cust.add_purchase(PurchaseOrder(cust.get_user_id(), [SeasonPass()], 4000.0, "card"))
+        registry = UserRegistry([cust])
+        svc = TicketingService(TicketManager(), self.dm, registry, HistoryCache(self.dm))
+        try:
+            # the embedded order moved to the orders collection
+            self.assertEqual(len(self.dm.get_orders_for_customer(cust.get_user_id())), 1)
+            clone = pickle.loads(pickle.dumps(cust))
+            self.assertEqual(clone.get_purchase_history(), [])
+            self.assertEqual(len(cust.get_purchase_history()), 1)
+            self.assertEqual(self.dm.load_users()[0].get_purchase_history(), [])
+        finally:
+            svc.get_writer().close()
+
+    def test_log_customer_index_survives_reopen(self):
+        o1 = PurchaseOrder("c1", [SingleRaceTicket()], 300.0, "card")
+        o2 = PurchaseOrder("c2", [SingleRaceTicket()], 300.0, "card")
+        self.dm.upsert_orders([o1, o2])
+        self.dm.close()
+        self.dm = self.make_dm()
+        self.assertEqual([o.get_order_id() for o in self.dm.get_orders_for_customer("c1")], [o1.get_order_id()])
+        self.dm.remove_order(o1.get_order_id())
+        self.dm.upsert_order(PurchaseOrder("c1", [SeasonPass()], 4000.0, "card"))
+        self.assertEqual([o.get_tickets()[0].get_name() for o in self.dm.get_orders_for_customer("c1")],
+                         ["Season Pass"])
+
+
+class TestStartupSnapshot(unittest.TestCase):
+    TEST_DIR = "snapshot_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.path = os.path.join(self.TEST_DIR, "snapshot.pkl")
+        self.source = os.path.join(self.TEST_DIR, "users.log")
+        with open(self.source, "wb") as f:
+            f.write(b"v1")
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_snapshot_valid_until_storage_changes(self):
+        self.assertIsNone(load_snapshot(self.path, [self.source]))
+        save_snapshot(self.path, [self.source], [Customer("A", "a@x.com", "pw")], [Discount("D", 5, "Season Pass")])
+        snapshot = load_snapshot(self.path, [self.source])
+        self.assertEqual(snapshot["users"][0].get_email(), "a@x.com")
+        self.assertEqual(snapshot["discounts"][0].get_name(), "D")
+        with open(self.source, "ab") as f:
+            f.write(b"v2")
+        self.assertIsNone(load_snapshot(self.path, [self.source]))
+        with open(self.path, "wb") as f:
+            f.write(b"garbage")
+        self.assertIsNone(load_snapshot(self.path, [self.source]))
+
+    def test_order_history_loads_on_first_report(self):
+        tm = TicketManager()
+        order = PurchaseOrder("c", [SeasonPass()], 4000.0, "card")
+        calls = []
+        tm.defer_order_history(lambda: calls.append(1) or [order])
+        tm.record_order(order)  # skipped: the deferred load already includes it
+        self.assertEqual(calls, [])
+        self.assertEqual(tm.get_analytics().totals()["count"], 1)
+        tm.get_analytics()
+        self.assertEqual(calls, [1])
+        tm.record_order(PurchaseOrder("c", [SeasonPass()], 4000.0, "card"))
+        self.assertEqual(tm.get_analytics().totals()["count"], 2)
+
+    def test_sales_counts_load_lazily(self):
+        dm = DataManager(backend="log")
+        dm._DataManager__sales_file = os.path.join(self.TEST_DIR, "sales.pkl")
+        dm.save_sales({"2025-01-01": 3})
+        counter = SalesCounter(dm, flush_interval=None)
+        counter.record(2, day="2025-01-01")
+        self.assertEqual(counter.get_counts(), {"2025-01-01": 5})
+        counter.close()
+        dm.close()
+
+
+class TestRecordCodec(unittest.TestCase):
+    TEST_DIR = "codec_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_primitives_round_trip(self):
+        values = [None, True, False, 0, -5, 1 << 70, 2.5, "", "Yas Marina", "x" * 300, b"\x00\x01",
+                  [1, "a"], (1, (2, None)), {"k": [1, 2], 3: "v"}, datetime(2025, 12, 5, 14, 30, 1, 250)]
+        for value in values:
+            self.assertEqual(record_codec.loads(record_codec.dumps(value)), value)
+
+    def test_models_round_trip(self):
+        customer = Customer("Alice", "alice@example.com", "pw")
+        order = PurchaseOrder(customer.get_user_id(), [WeekendPackage(), GroupDiscountTicket(6)], 1200.0, "Credit Card")
+        customer.add_purchase(order)
+        loaded = record_codec.loads(record_codec.dumps(customer))
+        self.assertEqual(loaded.get_email(), "alice@example.com")
+        self.assertEqual(loaded.get_created_at(), customer.get_created_at())
+        loaded_order = loaded.get_purchase_history()[0]
+        self.assertEqual(loaded_order.get_order_id(), order.get_order_id())
+        self.assertEqual(loaded_order.get_total_fils(), order.get_total_fils())
+        self.assertEqual([t.get_name() for t in loaded_order.get_tickets()],
+                         [t.get_name() for t in order.get_tickets()])
+        self.assertEqual(loaded_order.get_purchase_time(), order.get_purchase_time())
+        self.assertEqual([t.get_admits() for t in loaded_order.get_tickets()], [1, 6])
+        legacy = catalog_entry("Group Ticket (4 people)", "One Day", [], 100000)  # saved before admits
+        self.assertEqual(legacy.get_admits(), 4)
+
+        discount = record_codec.loads(record_codec.dumps(Discount("Launch", 10, "Season Pass")))
+        self.assertEqual((discount.get_name(), discount.get_percentage()), ("Launch", 10))
+        admin = record_codec.loads(record_codec.dumps(Admin("Root", "root@example.com", "pw")))
+        self.assertIsInstance(admin, Admin)
+        ticket = record_codec.loads(record_codec.dumps(GroupDiscountTicket(6)))
+        self.assertEqual(ticket.get_group_size(), 6)
+
+    def test_rejects_foreign_data(self):
+        with self.assertRaises(TypeError):
+            record_codec.dumps(object())
+        with self.assertRaises(ValueError):
+            record_codec.loads(pickle.dumps({"a": 1}))
+        data = record_codec.dumps(Discount("Launch", 10, "Season Pass"))
+        for bad in (data[:-3], data + b"\x00", data[:2] + b"\xff" + data[3:]):
+            with self.assertRaises(ValueError):
+                record_codec.loads(bad)
+
+    def test_old_schema_version_is_migrated(self):
+        class Point:
+            def __init__(self, x, y, z):
+                self.x, self.y, self.z = x, y, z
+
+        record_codec.register_schema(record_codec.Schema(
+            900, Point, 1, "ii", lambda p: (p.x, p.y), lambda v: Point(v[0], v[1], 0)))
+        old = record_codec.dumps(Point(1, 2, 0))
+        schema = record_codec.register_schema(record_codec.Schema(
+            900, Point, 2, "iii", lambda p: (p.x, p.y, p.z), lambda v: Point(*v)))
+        schema.add_migration(1, "ii", lambda fields: fields + (7,))
+        point = record_codec.loads(old)
+        self.assertEqual((point.x, point.y, point.z), (1, 2, 7))
+
+    def test_legacy_pickle_log_is_converted(self):
+        path = os.path.join(self.TEST_DIR, "orders.log")
+        with open(path, "wb") as f:
+            for op, key, value in (("put", "a", {"x": 1}), ("put", "b", 2), ("del", "b", None)):
+                raw = pickle.dumps(value) if op == "put" else None
+                payload = pickle.dumps((op, key, raw))
+                f.write(struct.pack(">II", len(payload), zlib.crc32(payload)) + payload)
+        with self.assertRaises(ValueError):
+            LogStore(path)  # converting runs pickle, so it must be asked for
+        store = LogStore(path, migrate_legacy=True)
+        self.assertEqual(store.items(), [("a", {"x": 1})])
+        store.close()
+        with open(path, "rb") as f:
+            self.assertTrue(f.read().startswith(b"GPLOG"))
+        reopened = LogStore(path)
+        self.assertEqual(reopened.items(), [("a", {"x": 1})])
+        reopened.close()
+
+    def test_headerless_log_does_not_run_code(self):
+        marker = os.path.join(self.TEST_DIR, "pwned")
+
+        class Payload:
+            def __reduce__(self):
+                return os.mkdir, (marker,)
+
+        path = os.path.join(self.TEST_DIR, "users.log")
+        payload = pickle.dumps(("put", "a", pickle.dumps(Payload())))
+        with open(path, "wb") as f:
+            f.write(struct.pack(">II", len(payload), zlib.crc32(payload)) + payload)
+        with self.assertRaises(ValueError):
+            LogStore(path)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_pickled_sqlite_rows_need_migration(self):
+        import sqlite3
+        db_file = os.path.join(self.TEST_DIR, "tickets.db")
+        dm = DataManager(backend="sqlite", db_file=db_file)
+        dm.save_discounts([Discount("Promo", 10, "Season Pass")])
+        dm.close()
+        with sqlite3.connect(db_file) as conn:  # as written before record_codec
+            conn.execute("UPDATE discounts SET data = ?", (pickle.dumps(Discount("Promo", 10, "Season Pass")),))
+        dm = DataManager(backend="sqlite", db_file=db_file)
+        with self.assertRaises(ValueError):
+            dm.load_discounts()
+        dm.close()
+        dm = DataManager(backend="sqlite", db_file=db_file, migrate_legacy=True)
+        self.assertEqual(dm.load_discounts()[0].get_percentage(), 10)
+        dm.close()
+        dm = DataManager(backend="sqlite", db_file=db_file)  # converted in place
+        self.assertEqual(dm.load_discounts()[0].get_name(), "Promo")
+        dm.close()
+
+
+class TestOrderArchive(unittest.TestCase):
+    TEST_DIR = "archive_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        self.orders = [PurchaseOrder("c1", [WeekendPackage(), GroupDiscountTicket(5)], 1800.0, "Credit Card"),
+                       PurchaseOrder("c2", [SeasonPass()], 3400.0, "Apple Pay"),
+                       PurchaseOrder("c2", [SingleRaceTicket()], 300.0, "Cash")]
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_cells_match_incremental_analytics(self):
+        archive = OrderArchive(self.TEST_DIR)
+        analytics = SalesAnalytics()
+        for sink in (archive, analytics):
+            for order in self.orders:
+                sink.record_order(order)
+            sink.remove_order(self.orders[1])
+        edited = PurchaseOrder("c2", self.orders[2].get_tickets(), 300.0, "Apple Pay")
+        archive.replace_order(self.orders[2], edited)
+        analytics.replace_order(self.orders[2], edited)
+
+        self.assertEqual(archive.get_row_count(), 7)
+        rebuilt = archive.to_analytics()
+        for by in ("ticket_type", "payment_method"):
+            self.assertEqual(rebuilt.breakdown(by=by), analytics.breakdown(by=by))
+        self.assertEqual(rebuilt.rollup("month"), analytics.rollup("month"))
+        archive.close()
+
+    def test_reopen_trims_torn_columns(self):
+        archive = OrderArchive(self.TEST_DIR)
+        archive.append_orders(self.orders)
+        archive.close(source=[("orders.log", 10, 20)])
+        with open(os.path.join(self.TEST_DIR, "net.col"), "ab") as f:
+            f.write(b"\x01\x02\x03")  # half-written row from a crash
+
+        reopened = OrderArchive(self.TEST_DIR)
+        self.assertEqual(reopened.get_row_count(), 4)
+        self.assertTrue(reopened.matches_source([("orders.log", 10, 20)]))
+        self.assertFalse(reopened.matches_source([("orders.log", 11, 20)]))
+        self.assertEqual(reopened.to_analytics().totals()["count"], 4)
+        reopened.close()  # no source: the next open treats it as stale
+        self.assertIsNone(OrderArchive(self.TEST_DIR).get_source())
+
+    def test_ticket_manager_prefers_current_archive(self):
+        archive = OrderArchive(self.TEST_DIR)
+        calls = []
+        tm = TicketManager()
+        tm.defer_order_history(lambda: calls.append(1) or self.orders)
+        tm.set_order_archive(archive, current=False)
+        self.assertEqual(tm.get_analytics().totals()["count"], 4)
+        self.assertEqual((calls, archive.get_row_count()), ([1], 4))  # loaded once, archive rebuilt
+        self.assertTrue(tm.is_order_archive_current())
+
+        tm2 = TicketManager()
+        tm2.defer_order_history(lambda: calls.append(2) or [])
+        tm2.set_order_archive(archive, current=True)
+        self.assertEqual(tm2.get_analytics().totals()["count"], 4)
+        self.assertEqual(calls, [1])
+        archive.close()
+
+
+class TestPasswords(unittest.TestCase):
+    TEST_DIR = "password_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+
+    def tearDown(self):
+        passwords.set_default_hasher(FAST_HASHER)
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_hash_is_salted_and_verifies(self):
+        for hasher in (passwords.PasswordHasher("scrypt", n=2 ** 10),
+                       passwords.PasswordHasher("pbkdf2_sha256", iterations=1000)):
+            first, second = hasher.hash("s3cret"), hasher.hash("s3cret")
+            self.assertNotEqual(first, second)
+            self.assertNotIn("s3cret", first)
+            self.assertTrue(passwords.PasswordHasher.verify(first, "s3cret"))
+            self.assertFalse(passwords.PasswordHasher.verify(first, "s3cret!"))
+            self.assertFalse(hasher.needs_rehash(first))
+        self.assertFalse(passwords.is_hashed("scrypt$n=2$AA==$AA=="))  # r and p missing
+        with self.assertRaises(ValueError):
+            passwords.PasswordHasher("scrypt", n=1000)
+
+    def test_user_stores_only_the_hash(self):
+        customer = Customer("Bob", "bob@example.com", "hunter2")
+        self.assertNotIn(b"hunter2", record_codec.dumps(customer))
+        self.assertNotIn(b"hunter2", pickle.dumps(customer))
+        self.assertTrue(customer.check_password("hunter2"))
+        self.assertFalse(customer.check_password("hunter3"))
+        passwords.set_default_hasher(passwords.PasswordHasher("scrypt", n=4, r=1, p=1))
+        self.assertTrue(customer.password_needs_rehash())  # cost raised since it was hashed
+
+    def test_login_upgrades_legacy_plaintext(self):
+        legacy = Customer("Old", "old@example.com", "x")
+        legacy._User__password = "plain-pw"  # as loaded from a pre-hashing users.pkl
+        dm = DataManager(backend="log")
+        dm._DataManager__user_file = os.path.join(self.TEST_DIR, "users.pkl")
+        svc = TicketingService(TicketManager(), dm, UserRegistry([legacy]), auth_workers=2)
+        self.assertTrue(legacy.password_needs_rehash())
+        with self.assertRaises(ValueError):
+            svc.login("old@example.com", "wrong")
+        self.assertEqual(svc.login_async("old@example.com", "plain-pw").result(timeout=5), legacy)
+        self.assertFalse(legacy.password_needs_rehash())
+        stored = dm.get_user_by_id(legacy.get_user_id())
+        self.assertTrue(passwords.is_hashed(stored._User__password))
+        self.assertTrue(stored.check_password("plain-pw"))
+        with self.assertRaises(ValueError):
+            svc.login("nobody@example.com", "plain-pw")
+        svc.close()
+
+    def test_register_hashes_outside_the_service_lock(self):
+        dm = DataManager(backend="log")
+        dm._DataManager__user_file = os.path.join(self.TEST_DIR, "users.pkl")
+        svc = TicketingService(TicketManager(), dm, UserRegistry(), auth_workers=1)
+        lock = svc._TicketingService__lock
+        held = []
+
+        def lock_is_free():
+            if lock.acquire(blocking=False):
+                lock.release()
+                return True
+            return False
+
+        class ProbeHasher(passwords.PasswordHasher):
+            def hash(self, password):
+                with ThreadPoolExecutor(1) as pool:  # another thread, as a purchase would be
+                    held.append(not pool.submit(lock_is_free).result())
+                return super().hash(password)
+
+        passwords.set_default_hasher(ProbeHasher("scrypt", n=2 ** 4, r=1, p=1))
+        customer = svc.register("New", "new@example.com", "pw")
+        self.assertEqual(held, [False])
+        self.assertTrue(customer.check_password("pw"))
+        with self.assertRaises(ValueError):
+            svc.register("Again", "NEW@example.com", "pw")
+        svc.close()
+
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        self.now = [1000.0]
+        self.sessions = SessionManager(ttl=60, max_sessions=3, clock=lambda: self.now[0])
+
+    def test_validate_renews_until_ttl_passes(self):
+        token = self.sessions.create("u1")
+        self.now[0] += 50
+        self.assertEqual(self.sessions.validate(token), "u1")
+        self.now[0] += 50  # 100 s after creation, 50 s after last use
+        self.assertEqual(self.sessions.validate(token), "u1")
+        self.now[0] += 61
+        self.assertIsNone(self.sessions.validate(token))
+        self.assertIsNone(self.sessions.validate("made-up"))
+        self.assertEqual(self.sessions.get_stats()["expired"], 1)
+
+    def test_least_recently_used_session_is_evicted(self):
+        a, b, c = (self.sessions.create(user) for user in ("u1", "u2", "u3"))
+        self.sessions.validate(a)
+        self.sessions.create("u4")
+        self.assertIsNone(self.sessions.validate(b))
+        self.assertEqual(self.sessions.validate(a), "u1")
+        self.assertEqual(self.sessions.validate(c), "u3")
+        self.assertEqual(self.sessions.get_stats()["evicted"], 1)
+
+    def test_revoke_user_and_service_sessions(self):
+        tm = TicketManager()
+        admin = Admin("Boss", "boss@x.com", "root")
+        svc = TicketingService(tm, DataManager(backend="pickle"), UserRegistry([admin]),
+                               sessions=self.sessions)
+        token, user = svc.start_session("boss@x.com", "root")
+        self.assertIs(user, admin)
+        self.assertIs(svc.get_session_user(token), admin)
+        self.sessions.revoke_user(admin.get_user_id())
+        with self.assertRaises(ValueError):
+            svc.get_session_user(token)
+        with self.assertRaises(ValueError):
+            svc.start_session("boss@x.com", "wrong")
+        svc.get_writer().close()
+
+    def test_processes_share_sessions_through_the_store(self):
+        test_dir = "sessions_test"
+        os.makedirs(test_dir, exist_ok=True)
+        path = os.path.join(test_dir, "sessions.db")
+        clock = lambda: self.now[0]
+        # Two managers with their own connections, as two server processes would have
+        a = SessionManager(ttl=60, max_sessions=1, clock=clock, store=SharedSessionStore(path), recheck_seconds=5)
+        b = SessionManager(ttl=60, max_sessions=1, clock=clock, store=SharedSessionStore(path), recheck_seconds=5)
+        try:
+            token = a.create("u1")
+            self.assertEqual(b.validate(token), "u1")
+            other = a.create("u2")  # evicts token from a's cache only
+            self.assertEqual(a.validate(token), "u1")
+
+            self.now[0] += 40
+            self.assertEqual(b.validate(token), "u1")  # renewed by b...
+            self.now[0] += 40
+            self.assertEqual(a.validate(token), "u1")  # ...which a sees past its own expiry
+
+            b.revoke(token)
+            self.assertEqual(a.validate(token), "u1")  # cached until the next recheck
+            self.now[0] += 5
+            self.assertIsNone(a.validate(token))
+            b.revoke_user("u2")
+            self.now[0] += 5
+            self.assertIsNone(a.validate(other))
+            self.assertIsNone(b.validate("made-up"))
+        finally:
+            a.close()
+            b.close()
+            shutil.rmtree(test_dir)
+
+    def test_workers_accept_each_others_accounts_and_tokens(self):
+        test_dir = "sessions_test"
+        os.makedirs(test_dir, exist_ok=True)
+        services = [TicketingService(TicketManager(), DataManager(backend="sqlite",
+                                                                  db_file=os.path.join(test_dir, "t.db")),
+                                     UserRegistry(), auth_workers=1,
+                                     sessions=SessionManager(store=SharedSessionStore(
+                                         os.path.join(test_dir, "sessions.db")), clock=time.time))
+                    for _ in range(2)]
+        try:
+            first, second = services
+            customer = first.register("W", "w@x.com", "pw")
+            with self.assertRaises(ValueError):  # not in second's registry, but stored
+                second.register("W2", "W@x.com", "pw")
+            token, user = second.start_session("w@x.com", "pw")  # account made by the other worker
+            self.assertEqual(user.get_user_id(), customer.get_user_id())
+            self.assertEqual(first.get_session_user(token).get_user_id(), customer.get_user_id())
+            first.end_session(token)
+            with self.assertRaises(ValueError):
+                first.get_session_user(token)
+        finally:
+            for svc in services:
+                svc.close()
+            shutil.rmtree(test_dir)
+
+
+class TestSeatMap(unittest.TestCase):
+    TEST_DIR = "seat_map_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.path = os.path.join(self.TEST_DIR, "inventory.db")
+        self.seats = SeatMap(self.path)
+        self.seats.add_section("Stand", 3, 12)
+        self.group = GroupDiscountTicket(5)
+        self.seats.assign(self.group.get_name(), "Stand", 5)
+
+    def tearDown(self):
+        self.seats.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_best_fit_block_and_merge_on_free(self):
+        section = SeatSection("S", 2, 10)
+        section.take(0, 0, 6)  # row 0 keeps a run of 4, row 1 a run of 10
+        self.assertEqual(section.find(3), (0, 6))  # smallest run that fits
+        self.assertEqual(section.find(5), (1, 0))
+        self.assertIsNone(section.find(11))
+        section.take(1, 3, 4)
+        self.assertEqual((section.get_largest_block(), section.get_run_count()), (4, 3))
+        section.free(1, 3, 4)
+        self.assertEqual((section.get_largest_block(), section.get_free()), (10, 14))
+
+    def test_hold_commit_release_and_reopen(self):
+        blocks = self.seats.hold("h1", self.group.get_name(), 2)
+        for block in blocks:
+            sections, rows, seats = zip(*map(parse_seat_id, block))
+            self.assertEqual(len(set(rows)), 1)  # one row per ticket ...
+            self.assertEqual(list(seats), list(range(seats[0], seats[0] + 5)))  # ... adjacent seats
+        self.assertEqual(self.seats.hold("other", "Season Pass", 1), [])  # no assigned seating
+        self.assertEqual(self.seats.commit("h1"), blocks)
+        self.seats.hold("h2", self.group.get_name(), 1)
+        self.assertTrue(self.seats.release("h2"))
+        with self.assertRaises(ValueError):
+            self.seats.commit("h2")
+        with self.assertRaises(ValueError):
+            self.seats.hold("h3", self.group.get_name(), 5)  # 36 seats but only 4 blocks of 5 left
+        self.seats.close()
+
+        self.seats = SeatMap(self.path)
+        self.assertEqual(self.seats.get_section_stats("Stand")["free"], 26)
+        self.seats.release_seats(blocks[0])
+        self.assertEqual(self.seats.get_section_stats("Stand")["free"], 31)
+
+    def test_checkout_attaches_and_returns_seats(self):
+        dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+        tm = TicketManager()
+        tm.register_ticket_type(self.group)
+        tm.set_seat_map(self.seats)
+        checkout = CheckoutService(tm, dm)
+        cust = Customer("A", "a@x.com", "pw")
+        order = checkout.purchase(cust, self.group.get_name(), "card", quantity=2)
+        self.assertEqual(len(order.get_seat_ids()), 10)
+        stored = dm.get_order_by_id(order.get_order_id())
+        self.assertEqual([line.get_seat_ids() for line in stored.get_tickets()],
+                         [line.get_seat_ids() for line in order.get_tickets()])
+        self.assertEqual(self.seats.get_section_stats("Stand")["free"], 26)
+        checkout.cancel_order(cust, order)
+        self.assertEqual(self.seats.get_section_stats("Stand")["free"], 36)
+        dm.close()
+
+
+class TestDiscountSchedule(unittest.TestCase):
+    def setUp(self):
+        self.tm = TicketManager()
+        self.season = SeasonPass()
+        self.tm.register_ticket_type(self.season)
+        self.t0 = datetime(2030, 1, 1)
+
+    def at(self, days):
+        return self.t0 + timedelta(days=days)
+
+    def test_windows_pick_best_discount_at_each_time(self):
+        always = Discount("Always", 5, "Season Pass")
+        flash = Discount("Flash", 30, "Season Pass", starts_at=self.at(2), ends_at=self.at(3))
+        early = Discount("Early Bird", 20, "Season Pass", ends_at=self.at(10))
+        tie = Discount("Also 20", 20, "Season Pass", starts_at=self.at(1))
+        for discount in (always, flash, early, tie):
+            self.tm.add_discount(discount)
+        find = lambda days: self.tm.find_discount_for_ticket("Season Pass", when=self.at(days))
+        self.assertIs(find(0), early)
+        self.assertIs(find(2), flash)
+        self.assertIs(find(3), early)  # ends_at is exclusive
+        self.assertIs(find(10), tie)
+        self.assertEqual(self.tm.get_active_discounts(self.at(20)), [always, tie])
+        flash.set_window(self.at(20), None)
+        self.assertIs(find(2), early)
+        self.assertIs(find(25), flash)
+        self.assertEqual(flash.get_status(self.at(0)), "Scheduled")
+        self.assertEqual(early.get_status(self.at(10)), "Expired")
+        with self.assertRaises(ValueError):
+            flash.set_window(self.at(5), self.at(5))
+
+    def test_usage_caps(self):
+        capped = Discount("First 3", 50, "Season Pass", max_uses=3, per_customer_limit=2)
+        self.tm.add_discount(Discount("Base", 10, "Season Pass"))
+        self.tm.add_discount(capped)
+        self.assertIs(self.tm.find_discount_for_ticket("Season Pass", customer_id="a", quantity=2), capped)
+        capped.record_use("a", 2)
+        self.assertEqual(self.tm.find_discount_for_ticket("Season Pass", customer_id="a").get_name(), "Base")
+        self.assertIs(self.tm.find_discount_for_ticket("Season Pass", customer_id="b"), capped)
+        self.assertEqual(self.tm.find_discount_for_ticket("Season Pass", customer_id="b", quantity=2).get_name(),
+                         "Base")
+        capped.record_use("b")
+        self.assertEqual(capped.get_status(), "Used up")
+        self.assertEqual(self.tm.find_discount_for_ticket("Season Pass").get_name(), "Base")
+        restored = record_codec.loads(record_codec.dumps(capped))
+        self.assertEqual((restored.get_uses(), restored.get_customer_uses("a")), (3, 2))
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(3)
+        schedule = DiscountSchedule()
+        discounts = []
+        for i in range(300):
+            start = rng.choice([None, self.at(rng.randint(0, 50))])
+            end = rng.choice([None, (start or self.t0) + timedelta(days=rng.randint(1, 20))])
+            discounts.append(Discount(f"D{i}", rng.randint(1, 40), "Season Pass", start, end))
+            schedule.add(discounts[-1])
+        for discount in rng.sample(discounts, 30):
+            discount.deactivate()
+            schedule.update(discount)
+        for hours in range(0, 80 * 24, 7):
+            when = self.t0 + timedelta(hours=hours)
+            expected = None
+            for discount in discounts:
+                if discount.applies_at(when) and (expected is None or
+                                                  discount.get_percentage() > expected.get_percentage()):
+                    expected = discount
+            self.assertIs(schedule.best("Season Pass", when), expected)
+
+    def test_checkout_counts_uses(self):
+        test_dir = "discount_schedule_test"
+        os.makedirs(test_dir, exist_ok=True)
+        dm = DataManager(backend="sqlite", db_file=os.path.join(test_dir, "tickets.db"))
+        try:
+            self.tm.add_discount(Discount("Once", 50, "Season Pass", per_customer_limit=1))
+            dm.save_discounts(self.tm.get_all_discounts())
+            checkout = CheckoutService(self.tm, dm)
+            cust = Customer("A", "a@x.com", "pw")
+            price = self.season.get_price_fils()
+            self.assertEqual(checkout.purchase(cust, "Season Pass", "card").get_total_fils(), price // 2)
+            self.assertEqual(checkout.purchase(cust, "Season Pass", "card").get_total_fils(), price)
+            self.assertEqual(dm.load_discounts()[0].get_customer_uses(cust.get_user_id()), 1)
+        finally:
+            dm.close()
+            shutil.rmtree(test_dir)
+
+    def test_workers_share_one_usage_cap(self):
+        test_dir = "discount_schedule_test"
+        os.makedirs(test_dir, exist_ok=True)
+        db_file = os.path.join(test_dir, "tickets.db")
+        setup = DataManager(backend="sqlite", db_file=db_file)
+        setup.save_discounts([Discount("Last one", 50, "Season Pass", max_uses=1)])
+        workers = []
+        try:
+            for _ in range(2):  # each with its own storage connection and in-memory counts
+                dm = DataManager(backend="sqlite", db_file=db_file)
+                tm = TicketManager()
+                tm.register_ticket_type(SeasonPass())
+                for discount in dm.load_discounts():
+                    tm.add_discount(discount)
+                workers.append((dm, CheckoutService(tm, dm)))
+            price = self.season.get_price_fils()
+            totals = [checkout.purchase(Customer(f"C{i}", f"c{i}@x.com", "pw"), "Season Pass", "card")
+                      .get_total_fils() for i, (_, checkout) in enumerate(workers)]
+            self.assertEqual(totals, [price // 2, price])  # the second worker still thought it had a use
+            self.assertEqual(setup.load_discounts()[0].get_uses(), 1)
+        finally:
+            for dm, _ in workers:
+                dm.close()
+            setup.close()
+            shutil.rmtree(test_dir)
+
+
+class TestPricingEngine(unittest.TestCase):
+    TEST_DIR = "pricing_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.inventory = Inventory(os.path.join(self.TEST_DIR, "inventory.db"))
+        self.inventory.set_capacity("Season Pass", 4)
+        self.now = [datetime(2030, 3, 1, 12, 30)]
+        self.engine = PricingEngine(self.inventory, race_start=datetime(2030, 3, 10),
+                                    demand_curve=PriceCurve([(0.0, 2.0), (0.5, 1.0)]),
+                                    time_curve=PriceCurve([(0, 1.5), (5, 1.0)]),
+                                    clock=lambda: self.now[0])
+        self.season = SeasonPass()  # 4000 AED
+
+    def tearDown(self):
+        self.inventory.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_curve_interpolates_and_clamps(self):
+        curve = PriceCurve([(10, 2.0), (0, 1.0)])
+        self.assertEqual([curve.at(x) for x in (-5, 0, 2.5, 10, 99)], [1.0, 1.0, 1.25, 2.0, 2.0])
+        with self.assertRaises(ValueError):
+            PriceCurve([(0, 0)])
+
+    def test_price_follows_stock_and_time_and_is_cached(self):
+        self.assertEqual(self.engine.get_price_fils(self.season), to_fils(4000))
+        for _ in range(3):
+            self.inventory.commit(self.inventory.reserve("Season Pass"))
+        self.assertEqual(self.engine.get_price_fils(self.season), to_fils(4000))  # cached
+        self.assertEqual(self.engine.on_sale(self.season), to_fils(6000))  # 1/4 unsold: x1.5
+        refreshes = self.engine.get_refresh_count()
+        for _ in range(100):
+            self.engine.get_price_fils(self.season)
+        self.assertEqual(self.engine.get_refresh_count(), refreshes)
+        self.now[0] = datetime(2030, 3, 7, 12, 0)  # 2.5 days out: time x1.25
+        self.assertEqual(self.engine.get_price_fils(self.season), to_fils(7500))
+        self.now[0] = datetime(2030, 3, 7, 12, 59)  # same hour step, still cached
+        self.assertEqual(self.engine.get_refresh_count(), refreshes + 1)
+
+    def test_manager_applies_discount_to_dynamic_price(self):
+        dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+        tm = TicketManager()
+        tm.register_ticket_type(self.season)
+        tm.set_inventory(self.inventory)
+        tm.set_pricing_engine(self.engine)
+        tm.add_discount(Discount("Promo", 10, "Season Pass"))
+        checkout = CheckoutService(tm, dm)
+        cust = Customer("A", "a@x.com", "pw")
+        checkout.purchase(cust, "Season Pass", "card", quantity=3)
+        self.assertEqual(tm.calculate_final_price_fils(self.season), to_fils(5400))  # 6000 less 10%
+        order = checkout.purchase(cust, "Season Pass", "card")
+        self.assertEqual(order.get_total_fils(), to_fils(5400))
+        self.assertEqual(order.get_tickets()[0].get_type_entry().get_list_price_fils(), to_fils(6000))
+        self.assertEqual(self.engine.get_price_fils(self.season), to_fils(8000))  # sold out: x2
+        checkout.cancel_order(cust, order)
+        self.assertEqual(self.engine.get_price_fils(self.season), to_fils(6000))
+        dm.close()
+
+
+class TestPricingRules(unittest.TestCase):
+    TEST_DIR = "pricing_rules_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.path = os.path.join(self.TEST_DIR, "pricing_rules.json")
+        self.now = [0.0]
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def write_rules(self, rules):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(rules, f)
+        self.now[0] += 10  # past the check interval
+        os.utime(self.path, ns=(int(self.now[0] * 1e9), int(self.now[0] * 1e9)))
+
+    def test_default_rules_match_group_ticket_formula(self):
+        rules = PricingRules()
+        for size in range(4, 51):
+            self.assertEqual(rules.quote_fils("Group Ticket", size), GroupDiscountTicket(size).get_price_fils())
+        with self.assertRaises(ValueError):
+            rules.quote_fils("Group Ticket", 3)
+        with self.assertRaises(ValueError):
+            rules.quote_fils("Family Pass", 4)
+
+    def test_tiers_bundles_and_caps(self):
+        rule = PricingRule("Family", 100, min_quantity=2, max_quantity=12, step_off=2, floor=85,
+                           tiers=[(6, 95)], bundles={"4": 350}, max_total=900)
+        self.assertEqual([from_fils(f) for f in rule.compile()[:5]],
+                         [192.0, 282.0, 350.0, 450.0, 510.0])  # 2-6 people: bundle at 4, floor from 6
+        self.assertEqual(from_fils(rule.price_fils(8)), 680.0)  # floor: 85 x 8
+        self.assertEqual(from_fils(rule.price_fils(12)), 900.0)  # capped
+        with self.assertRaises(ValueError):
+            PricingRule.from_dict("Bad", {"unit_price": 1, "discount": 5})
+
+    def test_hot_reload_reprices_manager_quotes(self):
+        rules = PricingRules(self.path, clock=lambda: self.now[0])
+        tm = TicketManager()
+        tm.set_pricing_rules(rules)
+        quote = tm.quote_cart([("Group Ticket (7 people)", 2)])  # never registered
+        self.assertEqual(quote["total_fils"], 2 * GroupDiscountTicket(7).get_price_fils())
+        self.write_rules({"Group Ticket": {"unit_price": 200, "min_quantity": 2, "max_quantity": 8}})
+        self.assertEqual(tm.calculate_final_price_fils(tm.get_ticket_by_name("Group Ticket (7 people)")),
+                         to_fils(1400))
+        self.assertEqual(rules.get_generation(), 1)
+        self.assertIsNone(tm.get_ticket_by_name("Group Ticket (9 people)"))
+        self.write_rules({"Group Ticket": {"unit_price": "oops"}})
+        self.assertEqual(rules.quote_fils("Group Ticket", 7), to_fils(1400))  # broken file: old rules stay
+        self.assertIsNotNone(rules.get_last_error())
+
+
+class TestGateIndex(unittest.TestCase):
+    TEST_DIR = "gate_test"
+
+    def setUp(self):
+        if os.path.exists(self.TEST_DIR):
+            shutil.rmtree(self.TEST_DIR)
+        os.mkdir(self.TEST_DIR)
+        self.race = datetime(2030, 3, 10, 15, 0)
+        self.order = PurchaseOrder("c1", [SingleRaceTicket(), WeekendPackage(), SeasonPass()], 5050.0, "card")
+        self.single, self.weekend, self.season = [line.get_ticket_id() for line in self.order.get_tickets()]
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_windows_and_double_entry(self):
+        index = GateIndex(default_windows(self.race))
+        index.add_orders([self.order])
+        friday, race_day = datetime(2030, 3, 8, 9), datetime(2030, 3, 10, 9)
+        self.assertEqual(index.validate(self.single, friday), gate_index.NOT_YET_VALID)
+        self.assertEqual(index.validate(self.weekend, friday), gate_index.VALID)
+        self.assertEqual(index.validate(self.weekend, friday + timedelta(hours=3)), gate_index.ALREADY_ENTERED)
+        self.assertEqual(index.validate(self.weekend, race_day), gate_index.VALID)  # a new day
+        self.assertEqual(index.check(self.single, race_day), gate_index.VALID)
+        self.assertEqual(index.validate(self.single, race_day), gate_index.VALID)  # check() did not enter
+        self.assertEqual(index.validate(self.single, race_day + timedelta(days=1)), gate_index.EXPIRED)
+        self.assertEqual(index.validate(self.season, datetime(2031, 1, 1)), gate_index.VALID)  # no window
+        self.assertEqual(index.validate(str(uuid.uuid4()), race_day), gate_index.UNKNOWN)
+
+    def test_incremental_updates_and_entry_log(self):
+        log = os.path.join(self.TEST_DIR, "gate_entries.log")
+        index = GateIndex(entry_log=log)
+        index.record_order(self.order)
+        self.assertEqual(index.validate(self.single), gate_index.VALID)
+        with open(log, encoding="utf-8") as f:
+            self.assertIn(self.single, f.read())  # on file before close(), as after a kill
+        edited =PurchaseOrder("c1", self.order.get_tickets()[:2], 1050.0, "cash")
+        index.replace_order(self.order, edited)
+        self.assertEqual(index.validate(self.single), gate_index.ALREADY_ENTERED)  # entry survives the edit
+        self.assertEqual(index.validate(self.season), gate_index.UNKNOWN)
+        index.remove_order(edited)
+        self.assertEqual((len(index), index.validate(self.weekend)), (0, gate_index.UNKNOWN))
+        index.close()
+
+        reopened = GateIndex(entry_log=log)
+        reopened.add_orders([self.order])
+        self.assertEqual(reopened.validate(self.single), gate_index.ALREADY_ENTERED)
+        self.assertEqual(reopened.validate(self.season), gate_index.VALID)
+        reopened.close()
+
+    def test_group_ticket_admits_each_person_once_a_day(self):
+        log = os.path.join(self.TEST_DIR, "gate_entries.log")
+        party = GroupDiscountTicket(3)
+        party.set_name("VIP Party")  # the count is stored with the order, not read from the name
+        order = PurchaseOrder("c1", [GroupDiscountTicket(5), party], 2400.0, "card")
+        group, renamed = [line.get_ticket_id() for line in order.get_tickets()]
+        index = GateIndex(entry_log=log)
+        index.record_order(order)
+        day = datetime(2030, 3, 10, 9, 0)
+        valid, entered = gate_index.VALID, gate_index.ALREADY_ENTERED
+        self.assertEqual([index.validate(group, day) for _ in range(6)], [valid] * 5 + [entered])
+        self.assertEqual([index.validate(renamed, day) for _ in range(4)], [valid] * 3 + [entered])
+        index.close()
+
+        reopened = GateIndex(entry_log=log)
+        reopened.record_order(order)
+        self.assertEqual(reopened.validate(group, day), gate_index.ALREADY_ENTERED)
+        self.assertEqual(reopened.validate(group, day + timedelta(days=1)), gate_index.VALID)
+        reopened.close()
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        ids = [str(uuid.uuid4()) for _ in range(5000)]
+        bloom = BloomFilter.for_capacity(len(ids), 0.01)
+        for ticket_id in ids:
+            bloom.add(ticket_id)
+        copy = BloomFilter.from_bytes(bloom.to_bytes())
+        self.assertTrue(all(copy.might_contain(ticket_id) for ticket_id in ids))
+        false_positives = sum(copy.might_contain(str(uuid.uuid4())) for _ in range(5000))
+        self.assertLess(false_positives, 150)  # ~1% expected
+        self.assertLess(copy.get_size_bytes(), 7000)  # ~9.6 bits per id
+
+    def test_service_keeps_index_in_step_with_orders(self):
+        tm = TicketManager()
+        tm.register_ticket_type(SeasonPass())
+        dm = DataManager(backend="sqlite", db_file=os.path.join(self.TEST_DIR, "tickets.db"))
+        admin = Admin("Gate", "gate@x.com", "pw")
+        cust = Customer("A", "a@x.com", "pw")
+        svc = TicketingService(tm, dm, UserRegistry([admin, cust]))
+        dm.upsert_order(self.order)  # stored before the index exists
+        tm.set_gate_index(GateIndex(), dm.load_orders)
+        self.assertEqual(svc.validate_ticket(self.season, record_entry=False), gate_index.VALID)
+        order = svc.purchase(cust, "Season Pass", "Credit Card")
+        ticket_id = order.get_tickets()[0].get_ticket_id()
+        self.assertEqual(svc.validate_ticket(ticket_id), gate_index.VALID)
+        self.assertEqual(svc.validate_ticket(ticket_id), gate_index.ALREADY_ENTERED)
+        svc.delete_order(cust, order.get_order_id())
+        self.assertEqual(svc.validate_ticket(ticket_id), gate_index.UNKNOWN)
+        self.assertTrue(BloomFilter.from_bytes(svc.export_gate_bloom()).might_contain(self.single))
+        svc.close()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,10 +1,15 @@
 import uuid
 
+from money import to_fils, from_fils
+from slotted import get_slot_state, set_slot_state, state_as_dict
+
 class Ticket:
+    __slots__ = ("__ticket_id", "__name", "__price_fils", "__validity", "__features")
+
     def __init__(self, name, price, validity, features):
         self.__ticket_id = str(uuid.uuid4())
         self.__name = name
-        self.__price = price
+        self.__price_fils = to_fils(price)  # integer fils, see money.py
         self.__validity = validity  # e.g., "One Day", "Weekend", "Season"
         self.__features = features  # list of features (strings)
 
@@ -16,7 +21,10 @@ class Ticket:
         return self.__name
 
     def get_price(self):
-        return self.__price
+        return from_fils(self.__price_fils)
+
+    def get_price_fils(self):
+        return self.__price_fils
 
     def get_validity(self):
         return self.__validity
@@ -24,12 +32,16 @@ class Ticket:
     def get_features(self):
         return self.__features
 
+    def get_admits(self):
+        # People one ticket lets through the gate
+        return 1
+
     # Setters
     def set_name(self, name):
         self.__name = name
 
     def set_price(self, price):
-        self.__price = price
+        self.__price_fils = to_fils(price)  # integer fils, see money.py
 
     def set_validity(self, validity):
         self.__validity = validity
@@ -37,5 +49,15 @@ class Ticket:
     def set_features(self, features):
         self.__features = features
 
+    # Pickling (slots). Pickles from before integer fils stored a float AED price.
+    def __getstate__(self):
+        return get_slot_state(self)
+
+    def __setstate__(self, state):
+        state = state_as_dict(state)
+        if "_Ticket__price" in state:
+            state["_Ticket__price_fils"] = to_fils(state.pop("_Ticket__price"))
+        set_slot_state(self, state)
+
     def __str__(self):
-        return f"{self.__name} ({self.__validity}) - AED {self.__price}"
+        return f"{self.__name} ({self.__validity}) - AED {self.get_price()}"
@@ -0,0 +1,76 @@
+# ticket_catalog.py
+# Interned ticket-type entries shared by every order line of the same type.
+
+import re
+import sys
+
+_entries = {}  # key: (name, validity, features, list_price_fils, admits), value: CatalogEntry
+_LEGACY_GROUP_NAME = re.compile(r"\((\d+) people\)$")
+
+
+class CatalogEntry:
+    """
+    Immutable description of a ticket type (name, validity, features, list
+    price, people admitted per ticket). There is one instance per distinct
+    type, and unpickling goes through catalog_entry() so loaded orders share
+    it too.
+    """
+    __slots__ = ("__name", "__validity", "__features", "__list_price_fils", "__admits")
+
+    def __init__(self, name, validity, features, list_price_fils, admits=1):
+        self.__name = name
+        self.__validity = validity
+        self.__features = features
+        self.__list_price_fils = list_price_fils
+        self.__admits = admits
+
+    def get_name(self):
+        return self.__name
+
+    def get_validity(self):
+        return self.__validity
+
+    def get_features(self):
+        return list(self.__features)
+
+    def get_list_price_fils(self):
+        return self.__list_price_fils
+
+    def get_admits(self):
+        return self.__admits
+
+    def __reduce__(self):
+        return (catalog_entry, (self.__name, self.__validity, self.__features, self.__list_price_fils,
+                                self.__admits))
+
+    def __str__(self):
+        return f"{self.__name} ({self.__validity})"
+
+
+def catalog_entry(name, validity, features, list_price_fils, admits=None):
+    # admits=None only for records saved before entries kept it (see _legacy_admits)
+    if admits is None:
+        admits = _legacy_admits(name)
+    key = (sys.intern(name), sys.intern(validity),
+           tuple(sys.intern(f) for f in features), list_price_fils, admits)
+    entry = _entries.get(key)
+    if entry is None:
+        entry = _entries[key] = CatalogEntry(*key)
+    return entry
+
+
+def entry_for_ticket(ticket, list_price_fils=None):
+    return catalog_entry(ticket.get_name(), ticket.get_validity(), ticket.get_features(),
+                         ticket.get_price_fils() if list_price_fils is None else list_price_fils,
+                         ticket.get_admits())
+
+
+def _legacy_admits(name):
+    # Older records only had the name; every group ticket then was a
+    # GroupDiscountTicket named "... (N people)"
+    match = _LEGACY_GROUP_NAME.search(name)
+    return int(match.group(1)) if match else 1
+
+
+def catalog_size():
+    return len(_entries)
@@ -1,11 +1,27 @@
 from datetime import datetime
 
+from discount_schedule import DiscountSchedule
+from money import from_fils
+from sales_analytics import SalesAnalytics
+from sales_counter import SalesCounter
+
 
 class TicketManager:
     def __init__(self):
         self.__available_tickets = {}  # key: ticket_type name, value: Ticket subclass
         self.__discounts = []  # list of Discount objects
-        self.__sales_log = {}  # key: date (yyyy-mm-dd), value: count of tickets sold
+        self.__schedule = DiscountSchedule()  # discount timelines per ticket type
+        self.__sales_counter = SalesCounter()  # tickets sold per day (yyyy-mm-dd), in memory by default
+        self.__analytics = SalesAnalytics()  # revenue by day x ticket type x payment method
+        self.__history_loader = None  # returns all stored orders; run on first analytics use
+        self.__archive = None  # OrderArchive mirroring every order change, for report rebuilds
+        self.__archive_current = False  # archive matches storage, so the loader can be skipped
+        self.__inventory = None  # Inventory with per-type capacity; None means unlimited
+        self.__seat_map = None  # SeatMap for ticket types with assigned seating
+        self.__pricing = None  # PricingEngine for demand-based list prices; None means fixed prices
+        self.__rules = None  # PricingRules for group tickets of any size
+        self.__gate_index = None  # GateIndex of sold ticket ids for entry scanning
+        self.__gate_loader = None  # returns all stored orders; run on first gate index use
 
     # Register ticket type
     def register_ticket_type(self, ticket_obj):
@@ -14,33 +30,227 @@ class TicketManager:
     def get_available_ticket_types(self):
         return list(self.__available_tickets.keys())
 
+    # Only registered types have capacity and seating set up, so only they are sold;
+    # other group sizes the pricing rules cover can be quoted but not booked
+    def is_registered(self, name):
+        return name in self.__available_tickets
+
     def get_ticket_by_name(self, name):
+        # Group sizes covered by the pricing rules are priced by them, registered or not
+        if self.__rules is not None:
+            ticket = self.__rules.ticket_for(name)
+            if ticket is not None:
+                return ticket
         return self.__available_tickets.get(name)
 
+    # Parametric ticket families (see pricing_rules.py)
+    def set_pricing_rules(self, rules):
+        self.__rules = rules
+
+    def get_pricing_rules(self):
+        return self.__rules
+
+    # Capacity (see inventory.py)
+    def set_inventory(self, inventory):
+        self.__inventory = inventory
+
+    def get_inventory(self):
+        return self.__inventory
+
+    # Demand-based pricing (see pricing_engine.py)
+    def set_pricing_engine(self, engine):
+        self.__pricing = engine
+
+    def get_pricing_engine(self):
+        return self.__pricing
+
+    def get_list_price_fils(self, ticket):
+        # Price before discounts: the engine's current price, or the fixed one
+        if self.__pricing is None:
+            return ticket.get_price_fils()
+        return self.__pricing.get_price_fils(ticket)
+
+    def record_price_change(self, ticket):
+        # Stock of this type changed (sale, cancellation): refresh its cached price
+        if self.__pricing is not None:
+            self.__pricing.on_sale(ticket)
+
+    # Assigned seating (see seat_map.py)
+    def set_seat_map(self, seat_map):
+        self.__seat_map = seat_map
+
+    def get_seat_map(self):
+        return self.__seat_map
+
+    def get_remaining(self, name):
+        # None means no capacity limit for this ticket type
+        if self.__inventory is None:
+            return None
+        return self.__inventory.get_remaining(name)
+
     # Discount handling
+    # Precedence: of the discounts that apply at the time of sale (switched on,
+    # inside their window, within their usage caps) the highest percentage
+    # wins; ties go to the discount that was added first.
     def add_discount(self, discount):
         self.__discounts.append(discount)
+        self.__schedule.add(discount)
+        discount.add_listener(self.__on_discount_changed)
+
+    def remove_discount(self, discount):
+        if discount not in self.__discounts:
+            return
+        self.__discounts.remove(discount)
+        self.__schedule.remove(discount)
+        discount.remove_listener(self.__on_discount_changed)
+
+    def get_all_discounts(self):
+        return list(self.__discounts)
+
+    def get_active_discounts(self, when=None):
+        # Discounts that apply at when (default now), ignoring per-customer limits
+        when = when or datetime.now()
+        return [d for d in self.__discounts if d.applies_at(when)]
+
+    def find_discount_for_ticket(self, ticket_type_name, when=None, customer_id=None, quantity=1):
+        # O(log n) in the number of discounts scheduled for this type
+        return self.__schedule.best(ticket_type_name, when or datetime.now(), customer_id, quantity)
 
-    def get_active_discounts(self):
-        return [d for d in self.__discounts if d.is_active()]
+    def get_discount_timeline(self, ticket_type_name):
+        return self.__schedule.get_timeline(ticket_type_name)
 
-    def find_discount_for_ticket(self, ticket_type_name):
-        for discount in self.__discounts:
-            if discount.get_ticket_type() == ticket_type_name and discount.is_active():
-                return discount
-        return None
+    def __on_discount_changed(self, discount):
+        self.__schedule.update(discount)
 
-    # Calculate final price
+    # Calculate final price (AED)
     def calculate_final_price(self, ticket):
-        discount = self.find_discount_for_ticket(ticket.get_name())
+        return from_fils(self.calculate_final_price_fils(ticket))
+
+    # Calculate final price in integer fils: the current list price (see
+    # get_list_price_fils) less the discount at when (default now); pass the
+    # customer and quantity to respect usage caps
+    def calculate_final_price_fils(self, ticket, when=None, customer_id=None, quantity=1):
+        list_fils = self.get_list_price_fils(ticket)
+        discount = self.find_discount_for_ticket(ticket.get_name(), when, customer_id, quantity)
         if discount:
-            return discount.apply_discount(ticket.get_price())
-        return ticket.get_price()
+            return discount.apply_discount_fils(list_fils)
+        return list_fils
+
+    # Bulk pricing: discounts are resolved once per distinct ticket type, so every
+    # line gets exactly the price calculate_final_price would give it
+    def calculate_final_prices(self, tickets):
+        unit_prices = {}
+        prices = []
+        for ticket in tickets:
+            name = ticket.get_name()
+            price = unit_prices.get(name)
+            if price is None:
+                price = unit_prices[name] = self.calculate_final_price(ticket)
+            prices.append(price)
+        return prices
+
+    # Quote a cart of (ticket type name, quantity) items. Prices are returned in
+    # AED but computed and summed in integer fils, so totals are exact.
+    def quote_cart(self, items):
+        lines = []
+        total_fils = 0
+        for name, quantity in items:
+            ticket = self.get_ticket_by_name(name)
+            if ticket is None:
+                raise ValueError(f"Unknown ticket type: {name}")
+            if quantity < 1:
+                raise ValueError(f"Invalid quantity for {name}: {quantity}")
+            unit_fils = self.calculate_final_price_fils(ticket)
+            line_fils = unit_fils * quantity
+            total_fils += line_fils
+            lines.append((name, quantity, from_fils(unit_fils), from_fils(line_fils)))
+        return {"lines": lines, "total": from_fils(total_fils), "total_fils": total_fils}
+
+    # Record sales (the GUI and the admin report share this one counter)
+    def set_sales_counter(self, counter):
+        self.__sales_counter = counter
+
+    def get_sales_counter(self):
+        return self.__sales_counter
 
-    # Record sales
     def record_sale(self, quantity=1):
-        today = datetime.now().strftime("%Y-%m-%d")
-        self.__sales_log[today] = self.__sales_log.get(today, 0) + quantity
+        self.__sales_counter.record(quantity)
 
     def get_sales_report(self):
-        return self.__sales_log
+        return self.__sales_counter.get_counts()
+
+    # Sales analytics (keep in step with every order purchase, edit and delete).
+    # Until a deferred history is loaded, updates are skipped: orders are saved
+    # before they are recorded, so the load picks them up. The order archive,
+    # if any, gets every change either way.
+    def record_order(self, order):
+        if self.__history_loader is None:
+            self.__analytics.record_order(order)
+        if self.__archive is not None:
+            self.__archive.record_order(order)
+        if self.__gate_index is not None and self.__gate_loader is None:
+            self.__gate_index.record_order(order)
+
+    def remove_order(self, order):
+        if self.__history_loader is None:
+            self.__analytics.remove_order(order)
+        if self.__archive is not None:
+            self.__archive.remove_order(order)
+        if self.__gate_index is not None and self.__gate_loader is None:
+            self.__gate_index.remove_order(order)
+
+    def replace_order(self, old_order, new_order):
+        if self.__history_loader is None:
+            self.__analytics.replace_order(old_order, new_order)
+        if self.__archive is not None:
+            self.__archive.replace_order(old_order, new_order)
+        if self.__gate_index is not None and self.__gate_loader is None:
+            self.__gate_index.replace_order(old_order, new_order)
+
+    def load_order_history(self, orders):
+        self.__analytics = SalesAnalytics.from_orders(orders)
+        self.__history_loader = None
+
+    def defer_order_history(self, loader):
+        # loader() returns every stored order; called by the first get_analytics().
+        # Callers must not record orders while that load runs (TicketingService holds its lock).
+        self.__history_loader = loader
+
+    def set_order_archive(self, archive, current=False):
+        # current: the archive already holds every stored order (see OrderArchive.matches_source),
+        # so the first report sums its columns instead of loading the orders
+        self.__archive = archive
+        self.__archive_current = current
+
+    def get_order_archive(self):
+        return self.__archive
+
+    # Gate validation (see gate_index.py). With a loader, the index is filled
+    # from every stored order on first use and skips updates until then, like
+    # the deferred analytics.
+    def set_gate_index(self, index, loader=None):
+        self.__gate_index = index
+        self.__gate_loader = loader
+
+    def get_gate_index(self, load=True):
+        # load=False returns the index as it is, without running the loader
+        if load and self.__gate_index is not None and self.__gate_loader is not None:
+            self.__gate_index.add_orders(self.__gate_loader())
+            self.__gate_loader = None
+        return self.__gate_index
+
+    def is_order_archive_current(self):
+        return self.__archive is not None and self.__archive_current
+
+    def get_analytics(self):
+        if self.__history_loader is not None:
+            if self.__archive is not None and self.__archive_current:
+                self.__analytics = self.__archive.to_analytics()
+                self.__history_loader = None
+            else:
+                orders = self.__history_loader()
+                self.load_order_history(orders)
+                if self.__archive is not None:
+                    self.__archive.rebuild(orders)  # current from now on
+                    self.__archive_current = True
+        return self.__analytics
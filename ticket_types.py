@@ -1,7 +1,10 @@
 from ticket import Ticket
+from money import to_fils, from_fils
 
 # Single race pass
 class SingleRaceTicket(Ticket):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             name="Single Race Pass",
@@ -12,6 +15,8 @@ class SingleRaceTicket(Ticket):
 
 # Weekend package
 class WeekendPackage(Ticket):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             name="Weekend Package",
@@ -22,6 +27,8 @@ class WeekendPackage(Ticket):
 
 # Full season pass
 class SeasonPass(Ticket):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             name="Season Pass",
@@ -32,11 +39,17 @@ class SeasonPass(Ticket):
 
 # Group discount ticket (for 4+ people)
 class GroupDiscountTicket(Ticket):
-    def __init__(self, group_size):
-        discount_price = max(250.0, 300.0 - group_size * 5)  # discount per person
+    __slots__ = ("__group_size",)
+
+    # price_fils: total set by a pricing rule (see pricing_rules.py); by default
+    # 300 AED per person less 5 per person in the group, at least 250
+    def __init__(self, group_size, family="Group Ticket", price_fils=None):
+        if price_fils is None:
+            unit_fils = max(to_fils(250), to_fils(300) - group_size * to_fils(5))  # discount per person
+            price_fils = unit_fils * group_size
         super().__init__(
-            name=f"Group Ticket ({group_size} people)",
-            price=discount_price * group_size,
+            name=f"{family} ({group_size} people)",
+            price=from_fils(price_fils),
             validity="One Day",
             features=["Group access", "Discounted entry", "Adjacent seating"]
         )
@@ -44,3 +57,6 @@ class GroupDiscountTicket(Ticket):
 
     def get_group_size(self):
         return self.__group_size
+
+    def get_admits(self):
+        return self.__group_size
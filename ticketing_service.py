@@ -0,0 +1,413 @@
+# ticketing_service.py
+# GUI-independent business operations. The Tkinter views and the HTTP API
+# (http_api.py) both go through TicketingService, never through tm/dm directly.
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import passwords
+from ticket_manager import TicketManager
+from data_manager import DataManager
+from user_registry import UserRegistry
+from sales_counter import SalesCounter
+from inventory import Inventory
+from seat_map import SeatMap
+from pricing_engine import PricingEngine
+from pricing_rules import PricingRules
+from gate_index import GateIndex, default_windows
+from checkout import CheckoutService
+from background_writer import BackgroundWriter
+from history_cache import HistoryCache
+from sessions import SessionManager, SharedSessionStore
+from startup_snapshot import load_snapshot, save_snapshot, storage_signature
+from order_archive import OrderArchive
+from purchase_order import PurchaseOrder
+from customer import Customer
+from admin import Admin
+from discount import Discount
+from ticket_types import SingleRaceTicket, WeekendPackage, SeasonPass, GroupDiscountTicket
+
+PAYMENT_METHODS = ("Credit Card", "Debit Card", "Apple Pay", "Google Pay")
+
+DEFAULT_CAPACITIES = (("Single Race Pass", 60000), ("Weekend Package", 20000),
+                      ("Season Pass", 5000), ("Group Ticket (5 people)", 2000),
+                      ("Group Ticket (10 people)", 1000))
+# Every group ticket sits together here: 2000 x 5 + 1000 x 10 seats
+GROUP_STAND = ("Group Stand", 200, 100)  # name, rows, seats per row
+
+
+class TicketingService:
+    """
+    One object per process holding the ticket manager, storage and user
+    registry. Methods are thread-safe, raise ValueError for anything the
+    caller should show to the user, and never touch Tkinter.
+    """
+
+    def __init__(self, tm, dm, registry, histories=None, snapshot_file=None, auth_workers=None,
+                 sessions=None):
+        self.__tm = tm
+        self.__dm = dm
+        self.__registry = registry
+        self.__checkout = CheckoutService(tm, dm)
+        self.__lock = threading.RLock()  # guards in-memory users, orders and discounts
+        self.__writer = BackgroundWriter()  # runs GUI-triggered operations off the Tk thread
+        # Password checks (deliberately slow KDF) run here: at most one per core at a
+        # time, and never on the Tk thread, the event loop or under self.__lock
+        self.__auth_pool = ThreadPoolExecutor(max_workers=auth_workers or os.cpu_count() or 1,
+                                              thread_name_prefix="password-check")
+        self.__sessions = sessions if sessions is not None else SessionManager()  # HTTP API login tokens
+        self.__histories = histories  # None keeps each customer's orders inside the user record
+        self.__snapshot_file = snapshot_file  # users + discounts written here on close()
+        if histories is not None:
+            for customer in registry.get_customers():
+                self.__attach_history(customer)
+
+    def get_ticket_manager(self):
+        return self.__tm
+
+    def get_writer(self):
+        return self.__writer
+
+    def get_history_cache(self):
+        return self.__histories
+
+    def get_sessions(self):
+        return self.__sessions
+
+    def __attach_history(self, customer):
+        # Orders pickled inside older user records move to the orders collection once
+        embedded = customer.set_history_source(self.__histories)
+        if embedded:
+            self.__dm.upsert_orders(embedded)
+            self.__dm.upsert_user(customer)
+
+    def get_data_manager(self):
+        return self.__dm
+
+    # ---------- Accounts ----------
+    def register(self, name, email, password):
+        if not name or not email or not password:
+            raise ValueError("All fields are required.")
+        if self.__registry.email_exists(email):
+            raise ValueError("Email already exists.")  # before paying for the KDF
+        customer = Customer(name, email.strip(), password)  # hashes the password, outside the lock
+        with self.__lock:
+            self.__registry.add(customer)  # still raises if the email was taken meanwhile
+            if self.__histories is not None:
+                self.__attach_history(customer)
+            try:
+                self.__dm.upsert_user(customer)
+            except ValueError:
+                self.__registry.remove(customer)  # registered by another process first
+                raise
+        return customer
+
+    def login(self, email, password):
+        return self.login_async(email, password).result()
+
+    def login_async(self, email, password):
+        # Future resolving to the user (or raising ValueError); poll it from the GUI
+        return self.__auth_pool.submit(self.__login, email, password)
+
+    def __login(self, email, password):
+        if self.__registry.get_by_email(email) is None:
+            self.__adopt_stored_user(lambda dm: dm.get_user_by_email(email))
+        user = self.__registry.authenticate(email, password)
+        if user is None:
+            raise ValueError("Invalid email or password.")
+        if user.password_needs_rehash():
+            # Legacy plaintext record or an older cost setting: store a current hash
+            user.set_password(password)
+            with self.__lock:
+                self.__dm.upsert_user(user)
+        return user
+
+    def get_user(self, user_id):
+        return self.__registry.get_by_id(user_id)
+
+    # ---------- Sessions ----------
+    def start_session(self, email, password):
+        # (token, user); the only call that checks the password
+        user = self.login(email, password)
+        return self.__sessions.create(user.get_user_id()), user
+
+    def get_session_user(self, token):
+        user_id = self.__sessions.validate(token) if token else None
+        user = self.__registry.get_by_id(user_id) if user_id is not None else None
+        if user is None and user_id is not None:
+            user = self.__adopt_stored_user(lambda dm: dm.get_user_by_id(user_id))
+        if user is None:
+            raise ValueError("Session expired or invalid.")
+        return user
+
+    def __adopt_stored_user(self, lookup):
+        # An account this process has not loaded, e.g. registered through another
+        # HTTP worker. Only SQLite is shared by processes (and has indexed lookups).
+        if self.__dm.get_backend() != "sqlite":
+            return None
+        user = lookup(self.__dm)
+        if user is None:
+            return None
+        with self.__lock:
+            if not self.__registry.add(user, skip_duplicates=True):
+                return self.__registry.get_by_id(user.get_user_id())  # None if its email is taken here
+            if self.__histories is not None and isinstance(user, Customer):
+                self.__attach_history(user)
+        return user
+
+    def end_session(self, token):
+        self.__sessions.revoke(token)
+
+    def update_profile(self, user, name, email, password=None):
+        if not name or not email:
+            raise ValueError("Name and email cannot be empty.")
+        password_hash = passwords.get_default_hasher().hash(password) if password else None
+        with self.__lock:
+            old_email, old_name = user.get_email(), user.get_name()
+            user.set_email(email)  # raises ValueError if another account uses it
+            user.set_name(name)
+            try:
+                self.__dm.upsert_user(user)  # or if one stored by another process does
+            except ValueError:
+                user.set_email(old_email)
+                user.set_name(old_name)
+                raise
+            if password_hash:
+                user.set_password_hash(password_hash)
+                self.__sessions.revoke_user(user.get_user_id())  # log out other devices
+                self.__dm.upsert_user(user)
+        return user
+
+    # ---------- Catalog ----------
+    def get_ticket_types(self):
+        return self.__tm.get_available_ticket_types()
+
+    def get_payment_methods(self):
+        return list(PAYMENT_METHODS)
+
+    def quote(self, ticket_name, quantity=1):
+        return self.__tm.quote_cart([(ticket_name, quantity)])
+
+    # ---------- Orders ----------
+    def purchase(self, customer, ticket_name, payment_method, quantity=1):
+        self.__check_payment_method(payment_method)
+        with self.__lock:
+            return self.__checkout.purchase(customer, ticket_name, payment_method, quantity)
+
+    def get_orders(self, customer):
+        with self.__lock:
+            return list(customer.get_purchase_history())
+
+    def get_orders_page(self, customer, page=0, page_size=50, sort_by="date", descending=True,
+                        ticket_type=None, payment_method=None):
+        # (orders, total matching) for one page of the history, newest first by default.
+        # Read page by page from storage, which has every order before the history does.
+        with self.__lock:
+            return self.__dm.get_orders_page(customer.get_user_id(), page, page_size, sort_by,
+                                             descending, ticket_type, payment_method)
+
+    def edit_order(self, customer, order_id, payment_method):
+        # Orders are finalized records, so an edit replaces the order
+        self.__check_payment_method(payment_method)
+        with self.__lock:
+            order = self.__find_order(customer, order_id)
+            new_order = PurchaseOrder(customer.get_user_id(), order.get_tickets(),
+                                      order.get_total_price(), payment_method)
+            # Storage first, so a history evicted meanwhile reloads the new state
+            self.__dm.remove_order(order_id)
+            self.__dm.upsert_order(new_order)
+            customer.delete_purchase(order_id)
+            customer.add_purchase(new_order)
+            self.__tm.replace_order(order, new_order)
+            self.__dm.upsert_user(customer)
+        return new_order
+
+    def delete_order(self, customer, order_id):
+        with self.__lock:
+            self.__checkout.cancel_order(customer, self.__find_order(customer, order_id))
+
+    def __find_order(self, customer, order_id):
+        for order in customer.get_purchase_history():
+            if order.get_order_id() == order_id:
+                return order
+        raise ValueError("Order not found.")
+
+    @staticmethod
+    def __check_payment_method(payment_method):
+        if payment_method not in PAYMENT_METHODS:
+            raise ValueError(f"Unsupported payment method: {payment_method}")
+
+    # ---------- Admin ----------
+    def sales_report(self):
+        # Plain dicts (amounts in fils) so the GUI and the JSON API can share it
+        with self.__lock:  # the first call loads the order history; no purchase may interleave
+            analytics = self.__tm.get_analytics()
+        return {
+            "daily_tickets": self.__tm.get_sales_report(),
+            "monthly": analytics.rollup("month"),
+            "by_ticket_type": analytics.breakdown(by="ticket_type"),
+            "by_payment_method": analytics.breakdown(by="payment_method"),
+        }
+
+    def get_discounts(self):
+        return self.__tm.get_all_discounts()
+
+    def set_discount_active(self, name, active):
+        with self.__lock:
+            for discount in self.__tm.get_all_discounts():
+                if discount.get_name() == name:
+                    if active:
+                        discount.activate()
+                    else:
+                        discount.deactivate()
+                    self.__dm.save_discounts(self.__tm.get_all_discounts())
+                    return discount
+        raise ValueError(f"Unknown discount: {name}")
+
+    def reconcile_sales(self):
+        # Restores daily counts lost in a crash from the stored orders (see
+        # SalesCounter.reconcile). create_default_service queues it on the writer
+        # at start; sales wait on the lock while the orders are counted.
+        with self.__lock:
+            self.__tm.get_sales_counter().reconcile(self.__dm.count_tickets_by_day())
+
+    # ---------- Gates ----------
+    def validate_ticket(self, ticket_id, record_entry=True):
+        # One of the gate_index results (VALID, UNKNOWN, EXPIRED, ...); VALID
+        # records the entry unless record_entry is False
+        with self.__lock:  # the first scan loads every order into the index
+            index = self.__gate_index()
+            return index.validate(ticket_id) if record_entry else index.check(ticket_id)
+
+    def export_gate_bloom(self, false_positive_rate=0.001):
+        # Serialized Bloom filter of the valid ticket ids, for offline scanners
+        with self.__lock:
+            return self.__gate_index().export_bloom(false_positive_rate).to_bytes()
+
+    def __gate_index(self):
+        index = self.__tm.get_gate_index()
+        if index is None:
+            raise ValueError("Gate validation is not enabled.")
+        return index
+
+    # ---------- Lifecycle ----------
+    def close(self):
+        self.__auth_pool.shutdown()
+        self.__sessions.close()
+        self.__writer.close()  # finish queued saves before the stores close
+        self.__tm.get_sales_counter().close()
+        inventory = self.__tm.get_inventory()
+        if inventory is not None:
+            inventory.close()
+        seat_map = self.__tm.get_seat_map()
+        if seat_map is not None:
+            seat_map.close()
+        gate_index = self.__tm.get_gate_index(load=False)
+        if gate_index is not None:  # flushes the entry log
+            gate_index.close()
+        self.__dm.close()
+        archive = self.__tm.get_order_archive()
+        if archive is not None:  # marked current only if it held every order this session
+            archive.close(storage_signature(self.__dm.get_storage_files(("orders",)))
+                          if self.__tm.is_order_archive_current() else None)
+        if self.__snapshot_file:
+            save_snapshot(self.__snapshot_file, self.__dm.get_storage_files(("users", "discounts")),
+                          self.__registry.get_users(), self.__tm.get_all_discounts())
+
+
+# ----------------------------------------
+# DEFAULT SETUP (shared by main_gui and http_api)
+# ----------------------------------------
+def create_default_service(backend="log", inventory_file="inventory.db", history_cache_size=256,
+                           snapshot_file="startup_snapshot.pkl", archive_dir="order_archive",
+                           race_start=None, rules_file="pricing_rules.json", gate_log="gate_entries.log",
+                           sessions_db=None, migrate_legacy=False):
+    # Startup reads only users and discounts (from the snapshot when it is current);
+    # orders load on demand: per customer via the history cache, all of them on
+    # the first sales report (or just the order archive's columns when it is
+    # current). The daily sales counts are reconciled with the stored orders
+    # once, on the writer thread. archive_dir=None turns
+    # the archive off; it must not be shared by several running processes.
+    # Prices follow demand (share of capacity unsold) and, given race_start,
+    # the days left to the race; see pricing_engine.py. Group tickets of any
+    # size are priced by the rules in rules_file (built-in defaults if it is
+    # missing), which is re-read when it changes. The gate index loads all
+    # orders on the first scan and logs entries to gate_log; gate_log=None
+    # turns gate validation off (entry marks must live in one process).
+    # sessions_db shares login sessions with other processes through SQLite
+    # (several HTTP workers on one port); without it they stay in memory.
+    # migrate_legacy imports pickled data from an older version (see DataManager).
+    tm = TicketManager()
+    dm = DataManager(backend=backend, migrate_legacy=migrate_legacy)
+    snapshot = load_snapshot(snapshot_file, dm.get_storage_files(("users", "discounts"))) if snapshot_file else None
+
+    # Register available ticket types
+    tm.register_ticket_type(SingleRaceTicket())
+    tm.register_ticket_type(WeekendPackage())
+    tm.register_ticket_type(SeasonPass())
+    tm.register_ticket_type(GroupDiscountTicket(5))
+    tm.register_ticket_type(GroupDiscountTicket(10))  # Optional larger group
+    tm.set_pricing_rules(PricingRules(rules_file))  # any group size, e.g. "Group Ticket (7 people)"
+
+    # Capacity per ticket type, shared by every process selling tickets
+    inventory = Inventory(inventory_file)
+    for ticket_name, capacity in DEFAULT_CAPACITIES:
+        if inventory.get_capacity(ticket_name) is None:
+            inventory.set_capacity(ticket_name, capacity)
+    tm.set_inventory(inventory)
+    tm.set_pricing_engine(PricingEngine(inventory, race_start))
+
+    # Adjacent seats for group tickets, in the same database as the capacity
+    seat_map = SeatMap(inventory_file)
+    seat_map.add_section(*GROUP_STAND)
+    for ticket_name in tm.get_available_ticket_types():
+        ticket = tm.get_ticket_by_name(ticket_name)
+        if isinstance(ticket, GroupDiscountTicket):
+            seat_map.assign(ticket_name, GROUP_STAND[0], ticket.get_group_size())
+    tm.set_seat_map(seat_map)
+
+    # Daily sales counter shared by purchases and the admin report, saved in batches
+    # (on the service's writer thread, set below)
+    tm.set_sales_counter(SalesCounter(dm, flush_interval=5.0, flush_size=50))
+    tm.defer_order_history(dm.load_orders)  # revenue aggregates, built by the first report
+    if gate_log:
+        tm.set_gate_index(GateIndex(default_windows(race_start), gate_log), dm.load_orders)
+    if archive_dir:
+        archive = OrderArchive(archive_dir)
+        tm.set_order_archive(archive, archive.matches_source(
+            storage_signature(dm.get_storage_files(("orders",)))))
+
+    # Discounts: stored ones if any, otherwise the launch promotions
+    discounts = snapshot["discounts"] if snapshot else dm.load_discounts()
+    if not discounts:
+        launch = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        expired = Discount("Expired Offer", 50, "Single Race Pass",  # ran for the week before launch
+                           starts_at=launch - timedelta(days=7), ends_at=launch)
+        discounts = [Discount("Weekend Promo", 10, "Weekend Package"),
+                     Discount("Season Special", 15, "Season Pass"), expired]
+    for discount in discounts:
+        tm.add_discount(discount)
+
+    # Users, indexed for login/registration; the default admin is created once
+    registry = UserRegistry(snapshot["users"] if snapshot else dm.load_users())
+    if registry.get_by_email("admin@example.com") is None:
+        admin = registry.register("Dr. Andrew", "admin@example.com", "admin123", user_class=Admin)
+        try:
+            dm.upsert_user(admin)
+        except ValueError:  # another worker stored it first: use theirs
+            registry.remove(admin)
+            registry.add(dm.get_user_by_email("admin@example.com"))
+
+    # Purchase histories are loaded per customer on first access (LRU of history_cache_size)
+    sessions = None
+    if sessions_db:
+        sessions = SessionManager(store=SharedSessionStore(sessions_db), clock=time.time)
+    service = TicketingService(tm, dm, registry, HistoryCache(dm, history_cache_size), snapshot_file,
+                               sessions=sessions)
+    writer = service.get_writer()
+    tm.get_sales_counter().set_writer(writer)
+    writer.submit("sales-reconcile", service.reconcile_sales)  # counts lost in a crash, off the startup path
+    return service
@@ -1,13 +1,20 @@
+import hmac
 import uuid
 from datetime import datetime
 
+import passwords
+from slotted import get_slot_state, set_slot_state, state_as_dict
+
 class User:
+    __slots__ = ("__user_id", "__name", "__email", "__password", "__created_at", "__email_listeners")
+
     def __init__(self, name, email, password):
         self.__user_id = str(uuid.uuid4())
         self.__name = name
         self.__email = email
-        self.__password = password
+        self.__password = passwords.get_default_hasher().hash(password)  # never the plaintext
         self.__created_at = datetime.now()
+        self.__email_listeners = []  # callbacks(user, old_email, new_email), not persisted
 
     # Getters
     def get_user_id(self):
@@ -27,16 +34,48 @@ class User:
         self.__name = name
 
     def set_email(self, email):
+        # Listeners run first so an index (e.g. UserRegistry) can reject a taken email
+        for listener in self.__email_listeners:
+            listener(self, self.__email, email)
         self.__email = email
 
+    def add_email_listener(self, callback):
+        self.__email_listeners.append(callback)
+
+    def remove_email_listener(self, callback):
+        if callback in self.__email_listeners:
+            self.__email_listeners.remove(callback)
+
     def set_password(self, new_password):
-        self.__password = new_password
+        self.__password = passwords.get_default_hasher().hash(new_password)
+
+    def set_password_hash(self, password_hash):
+        # A hash made with passwords.PasswordHasher.hash (e.g. computed outside a lock)
+        if not passwords.is_hashed(password_hash):
+            raise ValueError("Not a password hash.")
+        self.__password = password_hash
 
     # None for created_at because we never want to change it 
 
-    # Password check
+    # Password check (slow on purpose: runs the key-derivation function)
     def check_password(self, input_password):
-        return self.__password == input_password
+        stored = self.__password
+        if passwords.is_hashed(stored):
+            return passwords.PasswordHasher.verify(stored, input_password)
+        # Records saved before hashing hold the plaintext; see password_needs_rehash()
+        return hmac.compare_digest(stored.encode("utf-8"), input_password.encode("utf-8"))
+
+    def password_needs_rehash(self):
+        # True for legacy plaintext and for hashes made with older cost settings
+        return passwords.get_default_hasher().needs_rehash(self.__password)
+
+    # Pickling: listeners belong to the running app, not to the saved record
+    def __getstate__(self):
+        return get_slot_state(self, exclude=("_User__email_listeners",))
+
+    def __setstate__(self, state):
+        set_slot_state(self, state_as_dict(state))
+        self.__email_listeners = []
 
     # For printing
     def __str__(self):
@@ -0,0 +1,89 @@
+import passwords
+from customer import Customer
+from admin import Admin
+
+
+class UserRegistry:
+    """
+    In-memory index of all loaded users, by normalized email and by user id,
+    so login and registration checks are dictionary lookups instead of scans.
+    """
+
+    def __init__(self, users=None):
+        self.__users_by_id = {}  # key: user_id, value: User
+        self.__users_by_email = {}  # key: normalized email, value: User
+        for user in users or []:
+            self.add(user, skip_duplicates=True)
+
+    @staticmethod
+    def normalize_email(email):
+        return email.strip().lower()
+
+    # ---------- Membership ----------
+    def add(self, user, skip_duplicates=False):
+        key = self.normalize_email(user.get_email())
+        if key in self.__users_by_email:
+            if skip_duplicates:
+                return False  # legacy data may hold repeats; the first one wins
+            raise ValueError("Email already exists.")
+        self.__users_by_email[key] = user
+        self.__users_by_id[user.get_user_id()] = user
+        user.add_email_listener(self.__on_email_change)
+        return True
+
+    def remove(self, user):
+        self.__users_by_id.pop(user.get_user_id(), None)
+        key = self.normalize_email(user.get_email())
+        if self.__users_by_email.get(key) is user:
+            del self.__users_by_email[key]
+        user.remove_email_listener(self.__on_email_change)
+
+    def __on_email_change(self, user, old_email, new_email):
+        old_key = self.normalize_email(old_email)
+        new_key = self.normalize_email(new_email)
+        if old_key == new_key:
+            return
+        owner = self.__users_by_email.get(new_key)
+        if owner is not None and owner is not user:
+            raise ValueError("Email already exists.")
+        if self.__users_by_email.get(old_key) is user:
+            del self.__users_by_email[old_key]
+        self.__users_by_email[new_key] = user
+
+    # ---------- Lookups ----------
+    def get_by_email(self, email):
+        return self.__users_by_email.get(self.normalize_email(email))
+
+    def get_by_id(self, user_id):
+        return self.__users_by_id.get(user_id)
+
+    def email_exists(self, email):
+        return self.normalize_email(email) in self.__users_by_email
+
+    def get_users(self):
+        return list(self.__users_by_id.values())
+
+    def get_customers(self):
+        return [u for u in self.__users_by_id.values() if isinstance(u, Customer)]
+
+    def get_admins(self):
+        return [u for u in self.__users_by_id.values() if isinstance(u, Admin)]
+
+    def __len__(self):
+        return len(self.__users_by_id)
+
+    # ---------- Login / Registration ----------
+    def authenticate(self, email, password):
+        # Returns the matching user, or None for a bad email or password
+        user = self.get_by_email(email)
+        if user is None:
+            passwords.get_default_hasher().dummy_verify(password)  # don't reveal unknown emails by timing
+            return None
+        return user if user.check_password(password) else None
+
+    def register(self, name, email, password, user_class=Customer):
+        if self.email_exists(email):
+            raise ValueError("Email already exists.")
+        user = user_class(name, email.strip(), password)
+        self.add(user)
+        return user